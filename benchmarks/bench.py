@@ -0,0 +1,276 @@
+"""Time `yap` commands end to end against a generated local package index.
+
+The index is a find-links directory of generated wheels whose dependency graph
+has `--depth` layers of `--width` packages, each package depending on
+`--fanout` packages of the next layer. pip only looks at that directory, so no
+network access is needed.
+
+    python benchmarks/bench.py --depth 4 --width 10 --repeat 3 -o results.json
+    python benchmarks/bench.py --baseline results.json
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tomllib
+import zipfile
+from typing import Any
+from typing import NamedTuple
+from typing import Sequence
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PACKAGE_PREFIX = "yapbench"
+
+ADDED_PACKAGE = f"{PACKAGE_PREFIX}-added"
+
+ZIP_DATE = (2020, 1, 1, 0, 0, 0)
+
+
+class Graph(NamedTuple):
+    depth: int
+    width: int
+    fanout: int
+    versions: int
+
+
+class Step(NamedTuple):
+    name: str
+    args: tuple[str, ...]
+
+
+STEPS = (
+    Step("compile-cold", ("compile",)),
+    Step("compile-fresh", ("compile",)),
+    Step("compile-warm", ("compile", "--force")),
+    Step("add", ("add", ADDED_PACKAGE)),
+    Step("rm", ("rm", ADDED_PACKAGE)),
+    Step("upgrade", ("upgrade",)),
+)
+
+
+def package_name(layer: int, index: int) -> str:
+    return f"{PACKAGE_PREFIX}-l{layer}-p{index}"
+
+
+def _record_line(path: str, data: bytes) -> str:
+    digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=")
+
+    return f"{path},sha256={digest.decode()},{len(data)}"
+
+
+def build_wheel(
+    wheel_dir: str, name: str, version: str, requires: Sequence[str]
+) -> str:
+    module = name.replace("-", "_")
+    dist_info = f"{module}-{version}.dist-info"
+    files = {
+        f"{module}/__init__.py": f'__version__ = "{version}"\n'.encode(),
+        f"{dist_info}/METADATA": "".join(
+            [
+                "Metadata-Version: 2.1\n",
+                f"Name: {name}\n",
+                f"Version: {version}\n",
+                *(f"Requires-Dist: {req}\n" for req in requires),
+            ]
+        ).encode(),
+        f"{dist_info}/WHEEL": (
+            b"Wheel-Version: 1.0\nGenerator: yapbench\n"
+            b"Root-Is-Purelib: true\nTag: py3-none-any\n"
+        ),
+    }
+    record = [_record_line(path, data) for path, data in files.items()]
+    files[f"{dist_info}/RECORD"] = "\n".join(
+        [*record, f"{dist_info}/RECORD,,\n"]
+    ).encode()
+
+    wheel_path = os.path.join(wheel_dir, f"{module}-{version}-py3-none-any.whl")
+
+    with zipfile.ZipFile(wheel_path, "w") as wheel:
+        for path, data in files.items():
+            wheel.writestr(zipfile.ZipInfo(path, ZIP_DATE), data)
+
+    return wheel_path
+
+
+def build_index(wheel_dir: str, graph: Graph) -> list[str]:
+    """Write the wheels of the graph and return the names of its first layer."""
+    os.makedirs(wheel_dir, exist_ok=True)
+
+    for layer in range(graph.depth):
+        for index in range(graph.width):
+            requires = []
+
+            if layer + 1 < graph.depth:
+                requires = [
+                    package_name(layer + 1, (index * graph.fanout + k) % graph.width)
+                    for k in range(graph.fanout)
+                ]
+
+            for version in range(1, graph.versions + 1):
+                build_wheel(
+                    wheel_dir, package_name(layer, index), f"{version}.0", requires
+                )
+
+    build_wheel(wheel_dir, ADDED_PACKAGE, "1.0", [package_name(graph.depth - 1, 0)])
+
+    return [package_name(0, index) for index in range(graph.width)]
+
+
+def write_project(project_dir: str, roots: Sequence[str]) -> None:
+    os.makedirs(project_dir, exist_ok=True)
+    dependencies = "".join(f'    "{root}",\n' for root in roots[1:])
+
+    with open(os.path.join(project_dir, "pyproject.toml"), "w") as f:
+        f.write(
+            "[project]\n"
+            'name = "yapbench-project"\n'
+            'version = "0.1.0"\n'
+            f"dependencies = [\n{dependencies}]\n\n"
+            "[project.optional-dependencies]\n"
+            f'test = [\n    "{roots[0]}",\n]\n\n'
+            "[tool.yapping]\n"
+            'cache-dir = "cache"\n'
+        )
+
+
+def offline_env(wheel_dir: str) -> dict[str, str]:
+    env = {
+        key: value for key, value in os.environ.items() if not key.startswith("PIP_")
+    }
+    env.update(
+        # Time this checkout rather than an installed yapping.
+        PYTHONPATH=os.pathsep.join(
+            path for path in (REPO_ROOT, os.environ.get("PYTHONPATH")) if path
+        ),
+        PIP_CONFIG_FILE=os.devnull,
+        PIP_NO_INDEX="1",
+        PIP_FIND_LINKS=wheel_dir,
+        PIP_DISABLE_PIP_VERSION_CHECK="1",
+    )
+
+    return env
+
+
+def run_step(step: Step, project_dir: str, env: dict[str, str]) -> float:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        (sys.executable, "-m", "yapping", *step.args),
+        cwd=project_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    if proc.returncode:
+        raise SystemExit(f"yap {' '.join(step.args)} failed:\n{proc.stderr}")
+
+    return elapsed
+
+
+def run(graph: Graph, repeat: int, work_dir: str) -> dict[str, list[float]]:
+    wheel_dir = os.path.join(work_dir, "wheels")
+    roots = build_index(wheel_dir, graph)
+    env = offline_env(wheel_dir)
+    timings: dict[str, list[float]] = {step.name: [] for step in STEPS}
+
+    for attempt in range(repeat):
+        project_dir = os.path.join(work_dir, f"project-{attempt}")
+        write_project(project_dir, roots)
+
+        for step in STEPS:
+            timings[step.name].append(run_step(step, project_dir, env))
+
+        shutil.rmtree(project_dir)
+
+    return timings
+
+
+def summarize(times: Sequence[float]) -> dict[str, Any]:
+    return {
+        "times": list(times),
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+    }
+
+
+def _yapping_version() -> str:
+    with open(os.path.join(REPO_ROOT, "pyproject.toml"), "rb") as f:
+        version: str = tomllib.load(f)["project"]["version"]
+
+    return version
+
+
+def print_table(results: dict[str, Any], baseline: dict[str, Any] | None) -> None:
+    for name, summary in results["results"].items():
+        line = f"{name:<14} {summary['median'] * 1000:9.1f} ms"
+
+        if baseline is not None and name in baseline["results"]:
+            before = baseline["results"][name]["median"]
+            line += f"  {(summary['median'] - before) / before:+8.1%}"
+
+        print(line)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=3, help="Layers of the graph.")
+    parser.add_argument("--width", type=int, default=8, help="Packages per layer.")
+    parser.add_argument(
+        "--fanout", type=int, default=2, help="Dependencies of each package."
+    )
+    parser.add_argument(
+        "--versions", type=int, default=2, help="Versions of each package."
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each command.")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare against an earlier results file.")
+    parser.add_argument(
+        "--keep", help="Build the index and projects in this directory."
+    )
+    args = parser.parse_args(argv)
+
+    graph = Graph(args.depth, args.width, args.fanout, args.versions)
+
+    if args.keep:
+        timings = run(graph, args.repeat, args.keep)
+    else:
+        with tempfile.TemporaryDirectory(prefix="yapbench-") as work_dir:
+            timings = run(graph, args.repeat, work_dir)
+
+    results = {
+        "python": sys.version.split()[0],
+        "yapping": _yapping_version(),
+        "graph": graph._asdict(),
+        "repeat": args.repeat,
+        "results": {name: summarize(times) for name, times in timings.items()},
+    }
+
+    baseline = None
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
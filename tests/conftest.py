@@ -10,3 +10,13 @@ TESTING_PYPROJECT = "testing/pyproject.toml"
 def setup_file(tmp_path: Path) -> Path:
     shutil.copy(TESTING_PYPROJECT, tmp_path)
     return tmp_path / "pyproject.toml"
+
+
+@pytest.fixture(autouse=True)
+def daemon_socket(
+    tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch
+) -> Path:
+    # Never hand the commands under test to a daemon running on the machine.
+    path = tmp_path_factory.mktemp("daemon") / "yap.sock"
+    monkeypatch.setenv("YAP_DAEMON_SOCKET", str(path))
+    return path
@@ -1,7 +1,16 @@
+import io
+import re
 import tomllib
+from unittest.mock import patch
+
+import pytest
 
 from yapping.commands import add_dependency
 from yapping.commands import add_optional_dependency
+from yapping.commands import parse_requirements
+from yapping.commands import read_requirements_file
+from yapping.exceptions import YappingException
+from yapping.tomledit import update
 
 
 def test_add_dependency_adds_dependency(setup_file):
@@ -75,3 +84,108 @@ def test_add_optional_dependency_is_idempotent(setup_file):
         data = tomllib.load(fp)
 
     assert data["project"]["optional-dependencies"]["test"].count("foo") == 1
+
+
+def test_add_optional_dependency_creates_missing_group(setup_file):
+    add_optional_dependency(setup_file, "docs", "sphinx")
+
+    with open(setup_file, "rb") as fp:
+        data = tomllib.load(fp)
+
+    assert data["project"]["optional-dependencies"]["docs"] == ["sphinx"]
+
+
+def test_add_dependency_keeps_comments(setup_file):
+    setup_file.write_text(
+        setup_file.read_text().replace('    "django",', '    "django",  # web')
+    )
+
+    add_dependency(setup_file, "attrs")
+
+    assert '    "attrs",\n    "django",  # web\n' in setup_file.read_text()
+
+
+def test_add_existing_dependency_does_not_write(setup_file):
+    with patch("yapping.tomledit.update") as m_update:
+        add_dependency(setup_file, "django")
+
+    m_update.assert_not_called()
+
+
+def test_add_dependency_replaces_the_same_package(setup_file):
+    add_dependency(setup_file, "Django>=5")
+
+    with open(setup_file, "rb") as fp:
+        data = tomllib.load(fp)
+
+    assert data["project"]["dependencies"][:2] == ["Django>=5", "djangorestframework"]
+
+
+def test_add_dependency_writes_the_file_once(setup_file):
+    packages = [f"package-{i}" for i in range(300)]
+
+    with patch("yapping.commands.tomledit.update", wraps=update) as m_update:
+        add_dependency(setup_file, *packages)
+
+    m_update.assert_called_once()
+
+    with open(setup_file, "rb") as fp:
+        data = tomllib.load(fp)
+
+    assert set(packages) <= set(data["project"]["dependencies"])
+
+
+def test_parse_requirements(tmp_path):
+    (tmp_path / "base.in").write_text("attrs\n-r requirements.in\n")
+    lines = [
+        "# Pinned for the legacy API\n",
+        "Django>=4.2,<5  # LTS\n",
+        "\n",
+        "requests[socks] \\\n",
+        "    >=2.31\n",
+        "--requirement base.in\n",
+        "tomli; python_version < '3.11' \\\n",
+    ]
+
+    assert list(parse_requirements(lines, str(tmp_path / "requirements.in"))) == [
+        "Django>=4.2,<5",
+        "requests[socks] >=2.31",
+        "attrs",
+        "tomli; python_version < '3.11'",
+    ]
+
+
+@pytest.mark.parametrize(
+    ("lines", "error"),
+    (
+        (["attrs\n", "foo bar\n"], "requirements.in:2: invalid requirement 'foo bar'"),
+        (["-e ./lib\n"], "requirements.in:1: -e cannot go in pyproject.toml"),
+        (
+            ["--index-url https://example.com\n"],
+            "requirements.in:1: --index-url cannot go in pyproject.toml",
+        ),
+        (["-r missing.in\n"], "requirements.in:1: no such file: missing.in"),
+    ),
+)
+def test_parse_requirements_rejects_invalid_lines(lines, error):
+    with pytest.raises(YappingException, match=f"^{re.escape(error)}"):
+        list(parse_requirements(lines, "requirements.in"))
+
+
+def test_parse_requirements_reads_lazily():
+    requirements = parse_requirements(iter(["attrs\n", "foo bar\n"]), "-")
+
+    assert next(requirements) == "attrs"
+
+
+def test_read_requirements_file(tmp_path, monkeypatch):
+    path = tmp_path / "requirements.in"
+    path.write_text("attrs\nsix\n")
+
+    assert read_requirements_file(str(path)) == ["attrs", "six"]
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("django\n"))
+    assert read_requirements_file("-") == ["django"]
+
+    with pytest.raises(YappingException, match="No such file: missing.in"):
+        read_requirements_file("missing.in")
@@ -0,0 +1,99 @@
+import tomllib
+from unittest.mock import patch
+
+import pytest
+import tomli_w
+
+from yapping import tomledit
+from yapping.commands import batch
+from yapping.commands import BatchResult
+from yapping.commands import Operation
+from yapping.commands import parse_operation
+from yapping.commands import parse_operations
+from yapping.exceptions import YappingException
+
+
+def test_batch_applies_all_operations(setup_file):
+    batch(
+        setup_file,
+        [
+            Operation("add", ("foo",)),
+            Operation("rm", ("django",)),
+            Operation("add-extra", ("test", "bar")),
+            Operation("version", ("patch",)),
+        ],
+    )
+
+    with open(setup_file, "rb") as fp:
+        data = tomllib.load(fp)
+
+    assert data["project"]["dependencies"] == [
+        "djangorestframework",
+        "foo",
+        "pip-tools",
+        "tomli-w",
+    ]
+    assert "bar" in data["project"]["optional-dependencies"]["test"]
+    assert data["project"]["version"] == "0.1.1"
+
+
+def test_batch_writes_the_file_once(setup_file):
+    with patch("yapping.tomledit.update", wraps=tomledit.update) as m_update:
+        batch(
+            setup_file,
+            [Operation("add", ("foo",)), Operation("add", ("bar",))],
+        )
+
+    m_update.assert_called_once()
+
+
+def test_batch_reports_what_changed(setup_file):
+    result = batch(
+        setup_file,
+        [Operation("rm-extra", ("test", "pytest")), Operation("version", ("minor",))],
+    )
+
+    assert result == BatchResult(
+        dependencies_changed=False, changed_extras=frozenset({"test"})
+    )
+
+
+def test_batch_does_not_write_when_an_operation_fails(setup_file):
+    with open(setup_file, "rb") as fp:
+        data = tomllib.load(fp)
+
+    data["project"]["version"] = "foo"
+    setup_file.write_bytes(tomli_w.dumps(data).encode())
+    before = setup_file.read_bytes()
+
+    with pytest.raises(YappingException):
+        batch(
+            setup_file,
+            [Operation("add", ("foo",)), Operation("version", ("patch",))],
+        )
+
+    assert setup_file.read_bytes() == before
+
+
+def test_parse_operation():
+    assert parse_operation("add-extra test 'foo>=1'") == Operation(
+        "add-extra", ("test", "foo>=1")
+    )
+
+
+@pytest.mark.parametrize(
+    "line",
+    ("", "foo bar", "add", "rm-extra test", "version", "version huge"),
+)
+def test_parse_operation_rejects_invalid_lines(line):
+    with pytest.raises(YappingException):
+        parse_operation(line)
+
+
+def test_parse_operations_skips_blank_lines_and_comments():
+    operations = parse_operations(["# bump", "", "version major", "  rm foo"])
+
+    assert operations == [
+        Operation("version", ("major",)),
+        Operation("rm", ("foo",)),
+    ]
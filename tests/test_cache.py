@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from yapping.cache import CacheStats
+from yapping.cache import format_size
+from yapping.cache import parse_size
+from yapping.cache import prune
+from yapping.cache import prune_if_due
+from yapping.cache import stats
+from yapping.exceptions import YappingException
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    for i, name in enumerate(("http/a", "http/b", "wheels/c/d.whl")):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (1_000 + i, 1_000 + i))
+
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (
+        ("0", 0),
+        ("100", 100),
+        ("2K", 2048),
+        ("1.5M", 1572864),
+        ("1GiB", 1024**3),
+        ("1 gb", 1024**3),
+        (4096, 4096),
+    ),
+)
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+
+def test_parse_size_rejects_invalid_sizes():
+    with pytest.raises(YappingException) as exc:
+        parse_size("lots")
+
+    assert exc.value.args == ("Invalid size: 'lots'",)
+
+
+@pytest.mark.parametrize("value", (-1, True, 1.5, ["1G"]))
+def test_parse_size_rejects_other_values(value):
+    with pytest.raises(YappingException, match="Invalid size"):
+        parse_size(value)
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    (
+        (12, "12 B"),
+        (2048, "2.0 KiB"),
+        (3 * 1024**3, "3.0 GiB"),
+        (5 * 1024**5, "5120.0 TiB"),
+    ),
+)
+def test_format_size(size, expected):
+    assert format_size(size) == expected
+
+
+def test_stats(cache_dir):
+    assert stats(cache_dir) == CacheStats(files=3, size=300)
+
+
+def test_prune_evicts_least_recently_used_files(cache_dir):
+    removed = prune(cache_dir, max_size=150)
+
+    assert removed == CacheStats(files=2, size=200)
+    assert os.listdir(cache_dir) == ["wheels"]
+
+
+def test_prune_without_size_empties_the_cache(cache_dir):
+    removed = prune(cache_dir)
+
+    assert removed == CacheStats(files=3, size=300)
+    assert os.listdir(cache_dir) == []
+
+
+def test_prune_within_size_keeps_everything(cache_dir):
+    assert prune(cache_dir, max_size=1000) == CacheStats(files=0, size=0)
+    assert stats(cache_dir).files == 3
+
+
+def test_prune_if_due_prunes_once_per_interval(cache_dir):
+    assert prune_if_due(cache_dir, 250) == CacheStats(files=1, size=100)
+    assert prune_if_due(cache_dir, 0) is None
+    assert stats(cache_dir).files == 2
+
+    assert prune_if_due(cache_dir, 0, interval=0) == CacheStats(files=2, size=200)
+    assert os.listdir(cache_dir) == [".yap-pruned"]
+
+
+def test_prune_if_due_without_cache(tmp_path):
+    assert prune_if_due(str(tmp_path / "cache"), 0) == CacheStats(files=0, size=0)
+    assert not (tmp_path / "cache").exists()
@@ -0,0 +1,139 @@
+import pytest
+
+from yapping import check
+from yapping import commands
+from yapping.exceptions import YappingException
+
+LOCKFILE = """\
+django==5.0 \\
+    --hash=sha256:aaa
+    # via awesome-python-project (pyproject.toml)
+djangorestframework==3.15 \\
+    --hash=sha256:bbb
+    # via awesome-python-project (pyproject.toml)
+pip-tools==7.4 \\
+    --hash=sha256:ccc
+    # via awesome-python-project (pyproject.toml)
+tomli-w==1.0 \\
+    --hash=sha256:ddd
+    # via awesome-python-project (pyproject.toml)
+"""
+
+
+def _lock(setup_file, text=LOCKFILE):
+    path = setup_file.parent / "requirements.txt"
+    path.write_text(text)
+
+    return str(path)
+
+
+def test_drift_none_when_the_pins_satisfy_the_requirements():
+    assert (
+        check.drift(
+            ["Django>=5", "six", 'tomli; python_version < "3"'],
+            {"django": "5.0", "six": "1.17"},
+            {"django", "six"},
+        )
+        == []
+    )
+
+
+def test_drift_reports_every_problem():
+    problems = check.drift(
+        ["django>=5.1", "six", "not a requirement"],
+        {"django": "5.0"},
+        {"django", "attrs"},
+    )
+
+    assert problems == [
+        "django==5.0 does not satisfy django>=5.1",
+        "six is not pinned",
+        "'not a requirement' is not a valid requirement",
+        "attrs is pinned but no longer required",
+    ]
+
+
+def test_drift_skips_the_project_and_direct_references():
+    assert (
+        check.drift(
+            ["awesome[test]", "pkg @ https://example.com/pkg-1.0.tar.gz"],
+            {},
+            {"pkg"},
+            project="awesome",
+        )
+        == []
+    )
+
+
+def test_drift_accepts_pinned_prereleases():
+    assert check.drift(["django>=5"], {"django": "5.1rc1"}, set()) == []
+
+
+def test_check_lock_missing(setup_file, tmp_path):
+    output = str(tmp_path / "requirements.txt")
+
+    assert check.check_lock(str(setup_file), output, None) == [
+        f"{output} does not exist"
+    ]
+
+
+def test_check_lock_trusts_the_fingerprint(setup_file):
+    output = _lock(setup_file, "django==1.0\n")
+    fingerprint = commands.inputs_fingerprint(
+        str(setup_file), None, ("--quiet", "--generate-hashes")
+    )
+    commands._write_fingerprint(output, fingerprint)
+
+    assert check.check_lock(str(setup_file), output, None) == []
+
+
+def test_check_lock_compares_pins_without_fingerprint(setup_file):
+    output = _lock(setup_file)
+
+    assert check.check_lock(str(setup_file), output, None) == []
+    assert check.check_lock(str(setup_file), output, "test") == [
+        f"{name} is not pinned"
+        for name in (
+            "covdefaults",
+            "pytest",
+            "pytest-cov",
+            "pytest-randomly",
+            "pytest-xdist",
+            "time-machine",
+        )
+    ]
+
+
+def test_check_lock_rejects_dynamic_dependencies(setup_file):
+    setup_file.write_text(
+        '[project]\nname = "x"\nversion = "0"\ndynamic = ["dependencies"]\n'
+    )
+    output = _lock(setup_file)
+
+    with pytest.raises(YappingException, match="are dynamic"):
+        check.check_lock(str(setup_file), output, None)
+
+
+def test_check_lock_of_each_python_version(setup_file):
+    output = _lock(
+        setup_file,
+        LOCKFILE.replace("django==5.0", 'django==5.0 ; python_version == "3.12"'),
+    )
+
+    assert check.check_lock(str(setup_file), output, None, ("3.11", "3.12")) == [
+        "Python 3.11: django is not pinned"
+    ]
+
+
+def test_check_lock_of_unmerged_python_versions(setup_file):
+    for python_version in ("3.11", "3.12"):
+        (setup_file.parent / f"requirements-py{python_version}.txt").write_text(
+            LOCKFILE
+        )
+
+    output = str(setup_file.parent / "requirements.txt")
+
+    assert check.check_lock(str(setup_file), output, None, ("3.11", "3.12")) == []
+    assert check.check_lock(str(setup_file), output, None, ("3.11", "3.13")) == [
+        f"{setup_file.parent}/requirements-py3.13.txt does not exist"
+    ]
@@ -1,37 +1,111 @@
+import io
+import os
+import re
+import sys
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock
 from unittest.mock import patch
 
+import click
+import pytest
+from pip._internal.req.constructors import install_req_from_line
+
+from yapping import timings
+from yapping.commands import _in_process_cli
+from yapping.commands import _IN_PROCESS_LOCK
+from yapping.commands import _save_hash_stores
+from yapping.commands import add_dependency
+from yapping.commands import add_optional_dependency
+from yapping.commands import Backend
 from yapping.commands import compile_dependencies
 from yapping.commands import compile_test_dependencies
+from yapping.commands import CompileOptions
+from yapping.commands import find_pip_compile_bin
+from yapping.commands import is_locked
+from yapping.commands import read_fingerprint
+from yapping.commands import remove_dependency
+from yapping.commands import resolve_backend
+from yapping.commands import set_metadata_ttl
+from yapping.commands import warm_up
+from yapping.exceptions import CompileError
+from yapping.exceptions import YappingException
+from yapping.hashes import HashStore
+from yapping.hashes import store_path
+from yapping.options import Pins
+
+SUBPROCESS = CompileOptions(backend=Backend.SUBPROCESS)
+IN_PROCESS = CompileOptions(backend=Backend.IN_PROCESS)
+
+
+def _compiling(effect=None, output="", returncode=0):
+    """A fake `subprocess.Popen` that runs `effect` with the command."""
+
+    def _popen(cmd, **kwargs):
+        if effect is not None:
+            effect(cmd)
+
+        process = MagicMock()
+        process.__enter__.return_value = process
+        process.stdout = io.StringIO(output)
+        process.wait.return_value = returncode
+
+        return process
+
+    return _popen
+
+
+def _pip_compile_args(cmd):
+    """The arguments of pip-compile, without the temporary output file."""
+    *args, output_file, src = cmd
+    assert re.fullmatch(
+        r"--output-file=\.requirements\.txt\.[0-9a-f]{8}\.tmp", output_file
+    )
+
+    return (*args, src)
 
 
 def test_compile_dependencies_calls_pip_compile():
-    with patch("subprocess.run") as m_run:
-        compile_dependencies("foo.toml")
+    with patch("subprocess.Popen", side_effect=_compiling()) as m_run:
+        compile_dependencies("foo.toml", options=SUBPROCESS)
 
     m_run.assert_called()
     args = m_run.call_args[0]
     assert "pip-compile" in args[0][0]
-    assert args[0][1:] == ("--quiet", "--generate-hashes", "foo.toml")
+    assert _pip_compile_args(args[0][1:]) == (
+        "--quiet",
+        "--generate-hashes",
+        "foo.toml",
+    )
 
 
 def test_compile_dependencies_accepts_extra_args():
-    with patch("subprocess.run") as m_run:
-        compile_dependencies("foo.toml", "--foo", "--bar")
+    with patch("subprocess.Popen", side_effect=_compiling()) as m_run:
+        compile_dependencies("foo.toml", "--foo", "--bar", options=SUBPROCESS)
 
     m_run.assert_called()
     args = m_run.call_args[0]
     assert "pip-compile" in args[0][0]
-    assert args[0][1:] == ("--quiet", "--generate-hashes", "--foo", "--bar", "foo.toml")
+    assert _pip_compile_args(args[0][1:]) == (
+        "--quiet",
+        "--generate-hashes",
+        "--foo",
+        "--bar",
+        "foo.toml",
+    )
 
 
 def test_compile_test_dependencies_calls_pip_compile():
-    with patch("subprocess.run") as m_run:
-        compile_test_dependencies("foo.toml", "test", "test-requirements.txt")
+    with patch("subprocess.Popen", side_effect=_compiling()) as m_run:
+        compile_test_dependencies(
+            "foo.toml", "test", "test-requirements.txt", options=SUBPROCESS
+        )
 
     m_run.assert_called()
     args = m_run.call_args[0]
     assert "pip-compile" in args[0][0]
-    assert args[0][1:] == (
+    *pip_compile_args, output_file, src = args[0][1:]
+    assert (*pip_compile_args, src) == (
         "--quiet",
         "--generate-hashes",
         "--extra=test",
@@ -39,3 +113,888 @@ def test_compile_test_dependencies_calls_pip_compile():
         "test-requirements.txt",
         "foo.toml",
     )
+    # The last output file wins.
+    assert output_file.startswith("--output-file=.test-requirements.txt.")
+
+
+def test_compile_dependencies_raises_compile_error_with_output():
+    failing = _compiling(output="Resolving\nNo matching dist\n", returncode=1)
+
+    with (
+        patch("subprocess.Popen", side_effect=failing),
+        pytest.raises(CompileError) as exc,
+    ):
+        compile_dependencies("foo.toml", options=SUBPROCESS)
+
+    assert exc.value.args == ("Resolving\nNo matching dist",)
+
+
+def _write_lockfile(cmd, **kwargs):
+    output_files = [arg for arg in cmd if arg.startswith("--output-file=")]
+    output = output_files[-1].removeprefix("--output-file=")
+
+    with open(output, "w") as f:
+        f.write("#\n# autogenerated\n#\ndjango==5.0\n")
+
+
+def test_compile_dependencies_stamps_inputs_fingerprint(setup_file):
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)):
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+
+    output = setup_file.parent / "requirements.txt"
+
+    assert read_fingerprint(output) is not None
+    assert output.read_text().endswith("django==5.0\n")
+
+
+def test_compile_dependencies_skips_when_inputs_did_not_change(setup_file):
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)) as m_run:
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+
+    m_run.assert_called_once()
+
+
+def test_compile_dependencies_recompiles_when_dependencies_change(setup_file):
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)) as m_run:
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+        add_dependency(str(setup_file), "foo")
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+
+    assert m_run.call_count == 2
+
+
+def test_compile_dependencies_force_recompiles(setup_file):
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)) as m_run:
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+        compile_dependencies(
+            str(setup_file),
+            options=CompileOptions(force=True, backend=Backend.SUBPROCESS),
+        )
+
+    assert m_run.call_count == 2
+
+
+@pytest.mark.parametrize("upgrade_arg", ("--upgrade", "--upgrade-package=django"))
+def test_compile_dependencies_upgrade_always_recompiles(setup_file, upgrade_arg):
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)) as m_run:
+        compile_dependencies(str(setup_file), upgrade_arg, options=SUBPROCESS)
+        compile_dependencies(str(setup_file), upgrade_arg, options=SUBPROCESS)
+
+    assert m_run.call_count == 2
+
+
+@pytest.mark.parametrize("upgrade_arg", ("--upgrade", "--upgrade-package=django"))
+def test_compile_dependencies_after_upgrade_is_a_no_op(setup_file, upgrade_arg):
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)) as m_run:
+        compile_dependencies(str(setup_file), upgrade_arg, options=SUBPROCESS)
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+
+    m_run.assert_called_once()
+    assert is_locked(str(setup_file), str(setup_file.parent / "requirements.txt"), None)
+
+
+def test_compile_test_dependencies_recompiles_when_extra_changes(
+    setup_file, monkeypatch
+):
+    monkeypatch.chdir(setup_file.parent)
+
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)) as m_run:
+        compile_test_dependencies(
+            str(setup_file), "test", "test-requirements.txt", options=SUBPROCESS
+        )
+        compile_test_dependencies(
+            str(setup_file), "test", "test-requirements.txt", options=SUBPROCESS
+        )
+        add_optional_dependency(str(setup_file), "test", "foo")
+        compile_test_dependencies(
+            str(setup_file), "test", "test-requirements.txt", options=SUBPROCESS
+        )
+
+    assert m_run.call_count == 2
+
+
+def test_compile_dependencies_recompiles_lockfile_without_fingerprint(setup_file):
+    output = setup_file.parent / "requirements.txt"
+    output.write_text("#\n# autogenerated\n#\ndjango==5.0\n")
+
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)) as m_run:
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+
+    m_run.assert_called_once()
+
+
+def test_compile_dependencies_never_skips_dynamic_dependencies(setup_file):
+    setup_file.write_text(
+        '[project]\nname = "foo"\nversion = "0.1.0"\ndynamic = ["dependencies"]\n'
+    )
+
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)) as m_run:
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+
+    assert m_run.call_count == 2
+    assert read_fingerprint(setup_file.parent / "requirements.txt") is None
+
+
+def test_compile_test_dependencies_never_skips_dynamic_extras(setup_file):
+    setup_file.write_text(
+        '[project]\nname = "foo"\nversion = "0.1.0"\ndependencies = []\n'
+        'dynamic = ["optional-dependencies"]\n'
+    )
+    output = str(setup_file.parent / "test-requirements.txt")
+
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)) as m_run:
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+        compile_dependencies(str(setup_file), options=SUBPROCESS)
+        compile_test_dependencies(str(setup_file), "test", output, options=SUBPROCESS)
+        compile_test_dependencies(str(setup_file), "test", output, options=SUBPROCESS)
+
+    assert m_run.call_count == 3
+    assert read_fingerprint(setup_file.parent / "requirements.txt") is not None
+    assert read_fingerprint(output) is None
+
+
+def test_compile_dependencies_logs_verbose_output(tmp_path):
+    log = tmp_path / "yap.log"
+    running = _compiling(output="ROUND 1\n", returncode=0)
+
+    with patch("subprocess.Popen", side_effect=running) as m_run:
+        compile_dependencies("foo.toml", options=SUBPROCESS._replace(log=str(log)))
+
+    assert _pip_compile_args(m_run.call_args[0][0][1:]) == (
+        "--verbose",
+        "--generate-hashes",
+        "foo.toml",
+    )
+    assert log.read_text() == "[requirements.txt] ROUND 1\n"
+
+
+def test_compile_dependencies_in_process_calls_pip_tools():
+    with patch("yapping.commands._in_process_cli") as m_cli:
+        compile_dependencies("foo.toml", options=IN_PROCESS)
+
+    m_cli.return_value.main.assert_called_once()
+    args = m_cli.return_value.main.call_args
+    assert _pip_compile_args(args.args[0]) == (
+        "--quiet",
+        "--generate-hashes",
+        "foo.toml",
+    )
+    assert args.kwargs == {"prog_name": "pip-compile", "standalone_mode": False}
+
+
+def test_compile_dependencies_auto_backend_runs_busy_compiles_as_subprocesses(tmp_path):
+    started = threading.Event()
+    release = threading.Event()
+
+    def _main(*args, **kwargs):
+        started.set()
+        release.wait()
+
+    with (
+        patch("yapping.commands._in_process_cli") as m_cli,
+        patch("subprocess.Popen", side_effect=_compiling()) as m_popen,
+    ):
+        m_cli.return_value.main.side_effect = _main
+        thread = threading.Thread(
+            target=compile_dependencies, args=(str(tmp_path / "a.toml"),)
+        )
+        thread.start()
+        started.wait()
+        compile_dependencies(str(tmp_path / "b.toml"))
+        release.set()
+        thread.join()
+
+    m_cli.return_value.main.assert_called_once()
+    m_popen.assert_called_once()
+    assert m_popen.call_args.args[0][-1].endswith("b.toml")
+
+
+def test_compile_dependencies_in_process_backend_waits_for_pip_tools():
+    with patch("yapping.commands._in_process_cli") as m_cli:
+        _IN_PROCESS_LOCK.acquire()
+        thread = threading.Thread(
+            target=compile_dependencies,
+            args=("foo.toml",),
+            kwargs={"options": IN_PROCESS},
+        )
+        thread.start()
+        thread.join(0.1)
+        m_cli.return_value.main.assert_not_called()
+        _IN_PROCESS_LOCK.release()
+        thread.join()
+
+    m_cli.return_value.main.assert_called_once()
+
+
+def test_compile_dependencies_in_process_leaves_other_threads_output(capsys):
+    started = threading.Event()
+    printed = threading.Event()
+
+    def _fail(*args, **kwargs):
+        started.set()
+        printed.wait()
+        print("Could not find a version that matches foo", file=sys.stderr)
+        raise SystemExit(2)
+
+    def _report():
+        started.wait()
+        print("yap: failed to compile test dependencies", file=sys.stderr)
+        printed.set()
+
+    thread = threading.Thread(target=_report)
+    thread.start()
+
+    with (
+        patch("yapping.commands._in_process_cli") as m_cli,
+        pytest.raises(CompileError) as exc,
+    ):
+        m_cli.return_value.main.side_effect = _fail
+        compile_dependencies("foo.toml", options=IN_PROCESS)
+
+    thread.join()
+
+    assert exc.value.args == ("Could not find a version that matches foo",)
+    assert capsys.readouterr().err == "yap: failed to compile test dependencies\n"
+
+
+def test_compile_dependencies_in_process_raises_compile_error_with_output():
+    def _fail(*args, **kwargs):
+        print("Could not find a version that matches foo", file=sys.stderr)
+        raise SystemExit(2)
+
+    with (
+        patch("yapping.commands._in_process_cli") as m_cli,
+        pytest.raises(CompileError) as exc,
+    ):
+        m_cli.return_value.main.side_effect = _fail
+        compile_dependencies("foo.toml", options=IN_PROCESS)
+
+    assert exc.value.args == ("Could not find a version that matches foo",)
+
+
+def test_compile_dependencies_in_process_reports_resolution_errors():
+    from pip._internal.exceptions import DistributionNotFound
+
+    def _fail(*args, **kwargs):
+        print("Resolving django>=5", file=sys.stderr)
+        raise DistributionNotFound("ResolutionImpossible: see the docs")
+
+    with (
+        patch("yapping.commands._in_process_cli") as m_cli,
+        pytest.raises(CompileError) as exc,
+    ):
+        m_cli.return_value.main.side_effect = _fail
+        compile_dependencies("foo.toml", options=IN_PROCESS)
+
+    assert exc.value.args == (
+        "Resolving django>=5\nResolutionImpossible: see the docs",
+    )
+
+
+def test_compile_dependencies_in_process_reports_usage_errors():
+    with (
+        patch("yapping.commands._in_process_cli") as m_cli,
+        pytest.raises(CompileError) as exc,
+    ):
+        m_cli.return_value.main.side_effect = click.BadParameter("bad extra")
+        compile_dependencies("foo.toml", options=IN_PROCESS)
+
+    assert "bad extra" in exc.value.args[0]
+
+
+def test_compile_dependencies_in_process_successful_exit():
+    with patch("yapping.commands._in_process_cli") as m_cli:
+        m_cli.return_value.main.side_effect = SystemExit(0)
+        compile_dependencies("foo.toml", options=IN_PROCESS)
+
+    m_cli.return_value.main.assert_called_once()
+
+
+def test_resolve_backend_prefers_in_process_when_pip_tools_is_installed():
+    assert resolve_backend.__wrapped__(Backend.AUTO) == Backend.IN_PROCESS
+
+
+def test_resolve_backend_falls_back_to_subprocess():
+    with patch("importlib.util.find_spec", return_value=None):
+        assert resolve_backend.__wrapped__(Backend.AUTO) == Backend.SUBPROCESS
+
+
+def test_resolve_backend_keeps_explicit_backend():
+    assert resolve_backend(Backend.SUBPROCESS) == Backend.SUBPROCESS
+
+
+def test_in_process_compiles_share_the_session(tmp_path):
+    from piptools.scripts import compile as pip_compile
+
+    _in_process_cli()
+
+    first = pip_compile.PyPIRepository([], str(tmp_path))
+    second = pip_compile.PyPIRepository([], str(tmp_path))
+
+    assert second.session is first.session
+    assert second.finder.find_links == first.finder.find_links
+
+
+def test_find_pip_compile_bin_looks_next_to_the_interpreter():
+    expected = os.path.join(os.path.dirname(sys.executable), "pip-compile")
+
+    with patch("os.path.exists", side_effect=lambda path: path == expected):
+        assert find_pip_compile_bin.__wrapped__() == expected
+
+
+def test_find_pip_compile_bin_defaults_to_site_packages_prefix():
+    with patch("os.path.exists", return_value=False):
+        assert find_pip_compile_bin.__wrapped__().endswith("bin/pip-compile")
+
+
+def test_read_fingerprint_of_comment_only_lockfile(tmp_path):
+    output = tmp_path / "requirements.txt"
+    output.write_text("#\n# autogenerated\n#\n")
+
+    assert read_fingerprint(output) is None
+
+
+def test_compile_dependencies_fixed_pins_constrains_existing_pins(setup_file):
+    output = setup_file.parent / "requirements.txt"
+    output.write_text(
+        "django==5.0 \\\n    --hash=sha256:abc\n"
+        "    # via awesome-python-project (pyproject.toml)\n"
+        "asgiref==3.8.1\nrequests[socks]==2.32.0 ; python_version >= '3.11'\n"
+    )
+    constraints = []
+
+    def _run(cmd, **kwargs):
+        (constraint,) = (arg for arg in cmd if arg.startswith("--constraint="))
+        with open(constraint.removeprefix("--constraint=")) as f:
+            constraints.append(f.read())
+        _write_lockfile(cmd)
+
+    with patch("subprocess.Popen", side_effect=_compiling(_run)):
+        compile_dependencies(
+            str(setup_file),
+            options=CompileOptions(
+                backend=Backend.SUBPROCESS, pins=Pins.FIX, unlocked=("Django>=5",)
+            ),
+        )
+
+    assert constraints == ["asgiref==3.8.1\nrequests==2.32.0\n"]
+
+
+def test_compile_dependencies_fixed_pins_falls_back_to_preferred_pins(setup_file):
+    output = setup_file.parent / "requirements.txt"
+    output.write_text("django==4.2\n")
+    failing = _compiling(output="ResolutionImpossible: ...\n", returncode=1)
+
+    with patch(
+        "subprocess.Popen", side_effect=[failing(()), _compiling()(())]
+    ) as m_run:
+        compile_dependencies(
+            str(setup_file),
+            options=CompileOptions(backend=Backend.SUBPROCESS, pins=Pins.FIX),
+        )
+
+    assert m_run.call_count == 2
+    assert not any(arg.startswith("--constraint") for arg in m_run.call_args[0][0])
+
+
+def test_compile_dependencies_fixed_pins_only_fall_back_on_conflicts(setup_file):
+    (setup_file.parent / "requirements.txt").write_text("django==4.2\n")
+    failing = _compiling(output="Could not fetch URL: timed out\n", returncode=1)
+
+    with (
+        patch("subprocess.Popen", side_effect=failing) as m_run,
+        pytest.raises(CompileError, match="timed out"),
+    ):
+        compile_dependencies(
+            str(setup_file),
+            options=CompileOptions(backend=Backend.SUBPROCESS, pins=Pins.FIX),
+        )
+
+    m_run.assert_called_once()
+
+
+def _write_constrained_lockfile(cmd, **kwargs):
+    (constraint,) = (arg for arg in cmd if arg.startswith("--constraint="))
+    output = [arg for arg in cmd if arg.startswith("--output-file=")][-1]
+
+    with open(output.removeprefix("--output-file="), "w") as f:
+        f.write(
+            "#\n"
+            f"#    pip-compile {constraint} {output} pyproject.toml\n"
+            "#\n"
+            "django==5.0\n"
+            "    # via\n"
+            f"    #   -c {constraint.removeprefix('--constraint=')}\n"
+            "    #   awesome-python-project (pyproject.toml)\n"
+        )
+
+
+def test_compile_dependencies_fixed_pins_leave_no_trace(setup_file, monkeypatch):
+    monkeypatch.chdir(setup_file.parent)
+    locks = []
+
+    for _ in range(2):
+        (setup_file.parent / "requirements.txt").write_text("django==5.0\n")
+
+        with patch(
+            "subprocess.Popen", side_effect=_compiling(_write_constrained_lockfile)
+        ):
+            compile_dependencies(
+                "pyproject.toml",
+                options=CompileOptions(backend=Backend.SUBPROCESS, pins=Pins.FIX),
+            )
+
+        locks.append((setup_file.parent / "requirements.txt").read_text())
+
+    assert locks[0] == locks[1]
+    assert locks[0].split("\n", 1)[1] == (
+        "#\n"
+        "#    pip-compile --output-file=requirements.txt pyproject.toml\n"
+        "#\n"
+        "django==5.0\n"
+        "    # via awesome-python-project (pyproject.toml)\n"
+    )
+
+
+def test_compile_dependencies_uses_cache_dir():
+    with patch("subprocess.Popen", side_effect=_compiling()) as m_run:
+        compile_dependencies(
+            "foo.toml",
+            options=CompileOptions(backend=Backend.SUBPROCESS, cache_dir="/cache"),
+        )
+
+    assert _pip_compile_args(m_run.call_args[0][0][1:]) == (
+        "--quiet",
+        "--generate-hashes",
+        "--cache-dir=/cache",
+        "foo.toml",
+    )
+
+
+def _hashing_repository(cache_dir):
+    from piptools.scripts import compile as pip_compile
+
+    _in_process_cli()
+    repository = pip_compile.PyPIRepository([], str(cache_dir))
+    candidates = [
+        SimpleNamespace(link=SimpleNamespace(filename=filename, url=f"/{filename}"))
+        for filename in ("six-1.17.0.tar.gz", "six-1.17.0-py3-none-any.whl")
+    ]
+
+    repository._get_matching_candidates = MagicMock(return_value=candidates)
+    repository._get_hashes_from_pypi = MagicMock(
+        return_value={"/six-1.17.0.tar.gz": "sha:a"}
+    )
+    repository._get_file_hash = MagicMock(return_value="sha:b")
+
+    return repository
+
+
+def test_in_process_hashes_are_stored_by_file(tmp_path):
+    ireq = install_req_from_line("six==1.17.0")
+
+    assert _hashing_repository(tmp_path).get_hashes(ireq) == {"sha:a", "sha:b"}
+
+    _save_hash_stores()
+    repository = _hashing_repository(tmp_path)
+
+    assert repository.get_hashes(ireq) == {"sha:a", "sha:b"}
+    repository._get_hashes_from_pypi.assert_not_called()
+    repository._get_file_hash.assert_not_called()
+
+
+def test_in_process_hashes_of_new_files_are_added(tmp_path):
+    store = HashStore(store_path(str(tmp_path)))
+    store.add("six", "1.17.0", "six-1.17.0.tar.gz", "sha:stored")
+    store.save()
+    repository = _hashing_repository(tmp_path)
+
+    assert repository.get_hashes(install_req_from_line("six==1.17.0")) == {
+        "sha:stored",
+        "sha:b",
+    }
+    repository._get_file_hash.assert_called_once()
+    _save_hash_stores()
+    assert HashStore(store_path(str(tmp_path))).files["six==1.17.0"] == {
+        "six-1.17.0.tar.gz": "sha:stored",
+        "six-1.17.0-py3-none-any.whl": "sha:b",
+    }
+
+
+def test_in_process_hashes_are_saved_once_per_compile(tmp_path):
+    def _main(*args, **kwargs):
+        repository = _hashing_repository(tmp_path)
+
+        for version in ("1.16.0", "1.17.0"):
+            repository.get_hashes(install_req_from_line(f"six=={version}"))
+
+        raise SystemExit(1)
+
+    with (
+        patch("yapping.commands._in_process_cli") as m_cli,
+        patch.object(HashStore, "save", autospec=True) as m_save,
+        pytest.raises(CompileError),
+    ):
+        m_cli.return_value.main.side_effect = _main
+        compile_dependencies("foo.toml", options=IN_PROCESS)
+
+    m_save.assert_called_once()
+
+
+def test_in_process_finding_candidates_is_timed(tmp_path):
+    from piptools.repositories import PyPIRepository
+
+    repository = _hashing_repository(tmp_path)
+    timings.enable()
+
+    try:
+        with patch.object(PyPIRepository, "find_all_candidates", return_value=[]):
+            assert repository.find_all_candidates("six") == []
+
+        (span,) = timings.spans()
+    finally:
+        timings.disable()
+
+    assert span.name == "find candidates"
+    assert span.args == {"package": "six"}
+
+
+def test_in_process_index_lookups_expire(tmp_path):
+    from piptools.scripts import compile as pip_compile
+
+    _in_process_cli()
+    set_metadata_ttl(-1)
+
+    try:
+        first = pip_compile.PyPIRepository([], str(tmp_path))
+        second = pip_compile.PyPIRepository([], str(tmp_path))
+    finally:
+        set_metadata_ttl(None)
+
+    assert second.session is not first.session
+
+
+def test_warm_up_imports_pip_tools():
+    with patch("yapping.commands._in_process_cli") as m_cli:
+        warm_up(Backend.SUBPROCESS)
+        m_cli.assert_not_called()
+
+        warm_up(Backend.IN_PROCESS)
+        m_cli.assert_called_once_with()
+
+
+MATRIX = CompileOptions(python_versions=("3.11", "3.12"))
+
+
+def _python_version_lock(pins):
+    def _lock(cmd):
+        python_version = cmd[0].removeprefix("/usr/bin/python")
+        output = next(
+            arg.removeprefix("--output-file=")
+            for arg in cmd
+            if arg.startswith("--output-file=")
+        )
+
+        with open(output, "w") as f:
+            f.write(
+                "#\n"
+                f"# This file is autogenerated by pip-compile with Python {python_version}\n"
+                f"#    pip-compile --output-file={output}\n"
+                "#\n"
+                f"{pins[python_version]}"
+            )
+
+    return _lock
+
+
+@pytest.fixture
+def pythons():
+    with patch("shutil.which", side_effect=lambda name: f"/usr/bin/{name}"):
+        yield
+
+
+def test_compile_python_versions_merges_identical_locks(setup_file, pythons):
+    lock = "django==5.0 \\\n    --hash=sha256:aaa\n    # via awesome (pyproject.toml)\n"
+    effect = _python_version_lock({"3.11": lock, "3.12": lock})
+
+    with patch("subprocess.Popen", side_effect=_compiling(effect)) as m_popen:
+        compile_dependencies(str(setup_file), options=MATRIX)
+
+    assert sorted(call.args[0][:4] for call in m_popen.call_args_list) == [
+        ("/usr/bin/python3.11", "-m", "piptools", "compile"),
+        ("/usr/bin/python3.12", "-m", "piptools", "compile"),
+    ]
+    assert sorted(os.listdir(setup_file.parent)) == [
+        "pyproject.toml",
+        "requirements.txt",
+    ]
+    output = setup_file.parent / "requirements.txt"
+    assert output.read_text().split("\n", 1)[1] == (
+        "#\n"
+        "# This file is autogenerated by pip-compile with Python 3.11, 3.12\n"
+        f"#    pip-compile --output-file={output}\n"
+        "#\n"
+        f"{lock}"
+    )
+
+    with patch("subprocess.Popen") as m_popen:
+        compile_dependencies(str(setup_file), options=MATRIX)
+
+    m_popen.assert_not_called()
+
+
+def test_compile_python_versions_marks_what_differs(setup_file, pythons):
+    effect = _python_version_lock(
+        {"3.11": "django==4.2\nsix==1.17\n", "3.12": "django==5.0\nsix==1.17\n"}
+    )
+
+    with patch("subprocess.Popen", side_effect=_compiling(effect)):
+        compile_test_dependencies(
+            str(setup_file),
+            "test",
+            str(setup_file.parent / "test-requirements.txt"),
+            options=MATRIX,
+        )
+
+    assert (
+        (setup_file.parent / "test-requirements.txt")
+        .read_text()
+        .endswith(
+            'django==4.2 ; python_version == "3.11"\n'
+            'django==5.0 ; python_version == "3.12"\n'
+            "six==1.17\n"
+        )
+    )
+
+
+def test_compile_python_versions_keeps_locks_markers_cannot_merge(setup_file, pythons):
+    output = setup_file.parent / "requirements.txt"
+    output.write_text("django==4.2\n")
+    effect = _python_version_lock({"3.11": "-e ./lib\n", "3.12": "six==1.17\n"})
+
+    with patch("subprocess.Popen", side_effect=_compiling(effect)):
+        compile_dependencies(str(setup_file), options=MATRIX)
+
+    assert not output.exists()
+
+    for python_version in MATRIX.python_versions:
+        version_output = setup_file.parent / f"requirements-py{python_version}.txt"
+        assert read_fingerprint(version_output) is not None
+
+
+def test_compile_python_versions_prefers_the_merged_pins(setup_file, pythons):
+    output = setup_file.parent / "requirements.txt"
+    output.write_text(
+        'django==4.2 ; python_version == "3.11"\n'
+        'django==5.0 ; python_version == "3.12"\n'
+    )
+    # Left by a compile whose lock files could not be merged.
+    (setup_file.parent / "requirements-py3.12.txt").write_text("django==5.1\n")
+    seeds = {}
+
+    def _seeded(cmd):
+        temporary = cmd[-2].removeprefix("--output-file=")
+        # Each version is compiled to a copy, `.<lock file>.<random>.tmp`.
+        version_output = os.path.basename(temporary)[1:].rsplit(".", 2)[0]
+        seeds[version_output] = open(temporary).read()
+        _python_version_lock({"3.11": "six==1.17\n", "3.12": "six==1.17\n"})(cmd)
+
+    with patch("subprocess.Popen", side_effect=_compiling(_seeded)):
+        compile_dependencies(str(setup_file), options=MATRIX)
+
+    assert seeds == {
+        "requirements-py3.11.txt": 'django==4.2 ; python_version == "3.11"\n',
+        "requirements-py3.12.txt": "django==5.1\n",
+    }
+
+
+def test_compile_python_versions_keeps_the_lock_files_on_failure(setup_file, pythons):
+    version_output = setup_file.parent / "requirements-py3.12.txt"
+    version_output.write_text("django==5.1\n")
+
+    def _partial(cmd):
+        with open(cmd[-2].removeprefix("--output-file="), "w") as f:
+            f.write("django==")
+
+    with (
+        patch(
+            "subprocess.Popen",
+            side_effect=_compiling(_partial, output="Killed\n", returncode=1),
+        ),
+        pytest.raises(CompileError),
+    ):
+        compile_dependencies(str(setup_file), options=MATRIX)
+
+    assert version_output.read_text() == "django==5.1\n"
+    assert sorted(os.listdir(setup_file.parent)) == [
+        "pyproject.toml",
+        "requirements-py3.12.txt",
+    ]
+
+
+def test_compile_python_versions_reports_each_failure(setup_file, pythons):
+    (setup_file.parent / "requirements.txt").write_text("django==5.0\n")
+
+    with (
+        patch(
+            "subprocess.Popen",
+            side_effect=_compiling(output="No matching distribution\n", returncode=1),
+        ),
+        pytest.raises(CompileError) as exc,
+    ):
+        compile_dependencies(str(setup_file), options=MATRIX)
+
+    assert str(exc.value) == (
+        "Python 3.11: No matching distribution\nPython 3.12: No matching distribution"
+    )
+    assert sorted(os.listdir(setup_file.parent)) == [
+        "pyproject.toml",
+        "requirements.txt",
+    ]
+
+
+def test_compile_python_versions_needs_the_interpreters(setup_file):
+    with (
+        patch("shutil.which", return_value=None),
+        pytest.raises(YappingException, match="python3.11 is not on the PATH"),
+    ):
+        compile_dependencies(str(setup_file), options=MATRIX)
+
+
+def _write_project_lockfile(cmd, **kwargs):
+    output_files = [arg for arg in cmd if arg.startswith("--output-file=")]
+    output = output_files[-1].removeprefix("--output-file=")
+
+    with open(output, "w") as f:
+        f.write("django==5.0\n    # via awesome-python-project (pyproject.toml)\n")
+
+
+@pytest.fixture
+def stored(setup_file, tmp_path, monkeypatch):
+    """A second project with the same dependencies, and the store they share.
+
+    Lock files record the paths pip-compile was given, yap runs from each project.
+    """
+    other = tmp_path / "other" / "pyproject.toml"
+    other.parent.mkdir()
+    other.write_text(
+        setup_file.read_text().replace("awesome-python-project", "other_project")
+    )
+    options = SUBPROCESS._replace(lock_store=str(tmp_path / "store"))
+
+    def _compile(pyproject, options):
+        monkeypatch.chdir(pyproject.parent)
+        compile_dependencies("pyproject.toml", options=options)
+
+    return other, options, _compile
+
+
+def test_compile_dependencies_reuses_the_lock_store(setup_file, stored):
+    other, options, _compile = stored
+
+    with patch(
+        "subprocess.Popen", side_effect=_compiling(_write_project_lockfile)
+    ) as m_run:
+        _compile(setup_file, options)
+        _compile(other, options)
+
+    m_run.assert_called_once()
+    lock = (other.parent / "requirements.txt").read_text()
+    assert lock.endswith("django==5.0\n    # via other_project (pyproject.toml)\n")
+    assert read_fingerprint(other.parent / "requirements.txt") is not None
+
+
+def test_compile_dependencies_force_publishes_to_the_lock_store(setup_file, stored):
+    other, options, _compile = stored
+    options = options._replace(force=True)
+
+    with patch(
+        "subprocess.Popen", side_effect=_compiling(_write_project_lockfile)
+    ) as m_run:
+        _compile(setup_file, options)
+        _compile(other, options)
+
+    assert m_run.call_count == 2
+    (entry,) = os.listdir(options.lock_store)
+    assert len(os.listdir(os.path.join(options.lock_store, entry))) == 1
+
+
+def test_compile_dependencies_fixed_pins_skip_the_lock_store(setup_file, stored):
+    other, options, _compile = stored
+    (other.parent / "requirements.txt").write_text("django==4.2\n")
+
+    with patch(
+        "subprocess.Popen", side_effect=_compiling(_write_project_lockfile)
+    ) as m_run:
+        _compile(setup_file, options)
+        _compile(other, options._replace(pins=Pins.FIX))
+
+    assert m_run.call_count == 2
+
+
+def _pinning_lockfile(cmd):
+    """Like pip-compile: keep the pins of the output file unless upgrading."""
+    output = [arg for arg in cmd if arg.startswith("--output-file=")][-1]
+    output = output.removeprefix("--output-file=")
+    pin = "yapbench==2.0\n" if "--upgrade" in cmd else "yapbench==1.0\n"
+
+    if os.path.exists(output) and "--upgrade" not in cmd:
+        with open(output) as f:
+            pin = f.read().split("\n# yap", 1)[0].splitlines()[-1] + "\n"
+
+    with open(output, "w") as f:
+        f.write(f"#\n# autogenerated\n#\n{pin}")
+
+
+def test_compile_dependencies_never_replaces_a_lock_file_from_the_store(
+    setup_file, stored
+):
+    _, options, _compile = stored
+    lock = setup_file.parent / "requirements.txt"
+
+    with patch("subprocess.Popen", side_effect=_compiling(_pinning_lockfile)) as m_run:
+        _compile(setup_file, options)
+        compile_dependencies("pyproject.toml", "--upgrade", options=SUBPROCESS)
+        add_dependency("pyproject.toml", "foo")
+        _compile(setup_file, options)
+        remove_dependency("pyproject.toml", "foo")
+        _compile(setup_file, options)
+
+    assert m_run.call_count == 4
+    assert lock.read_text().endswith("yapbench==2.0\n")
+
+
+def test_compile_dependencies_publishes_nothing_it_did_not_lock(setup_file, stored):
+    _, options, _compile = stored
+
+    with patch("subprocess.Popen", side_effect=_compiling()):
+        _compile(setup_file, options)
+
+    assert not os.path.exists(options.lock_store)
+
+
+def test_compile_dependencies_dynamic_dependencies_skip_the_lock_store(setup_file):
+    setup_file.write_text(
+        '[project]\nname = "foo"\nversion = "0.1.0"\ndynamic = ["dependencies"]\n'
+    )
+    lock_store = setup_file.parent / "store"
+    options = SUBPROCESS._replace(lock_store=str(lock_store))
+
+    with patch("subprocess.Popen", side_effect=_compiling(_write_lockfile)):
+        compile_dependencies(str(setup_file), options=options)
+
+    assert not lock_store.exists()
+
+
+def test_compile_python_versions_publishes_only_merged_locks(setup_file, pythons):
+    lock_store = setup_file.parent / "store"
+    effect = _python_version_lock({"3.11": "-e ./lib\n", "3.12": "six==1.17\n"})
+
+    with patch("subprocess.Popen", side_effect=_compiling(effect)):
+        compile_dependencies(
+            str(setup_file), options=MATRIX._replace(lock_store=str(lock_store))
+        )
+
+    assert not lock_store.exists()
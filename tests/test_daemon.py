@@ -0,0 +1,218 @@
+import os
+import socket
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from yapping import daemon
+from yapping.commands import CompileOptions
+from yapping.exceptions import YappingException
+
+
+def _start_daemon():
+    thread = threading.Thread(target=daemon.serve, args=(60.0,))
+
+    with patch("yapping.commands.warm_up"):
+        thread.start()
+
+        while daemon.status() is None:  # pragma: no cover (timing dependent)
+            time.sleep(0.01)
+
+    return thread
+
+
+@pytest.fixture
+def running_daemon(daemon_socket):
+    thread = _start_daemon()
+
+    yield daemon_socket
+
+    daemon.stop()
+    thread.join()
+
+
+def test_socket_path_from_environment(daemon_socket):
+    assert daemon.socket_path() == str(daemon_socket)
+
+
+def test_socket_path_defaults_to_runtime_dir(monkeypatch):
+    monkeypatch.delenv("YAP_DAEMON_SOCKET")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user/1000")
+
+    assert daemon.socket_path() == f"/run/user/1000/yap-{os.getuid()}/daemon.sock"
+
+
+def test_serve_creates_a_private_directory(tmp_path, monkeypatch):
+    path = tmp_path / "run" / "yap.sock"
+    monkeypatch.setenv("YAP_DAEMON_SOCKET", str(path))
+    thread = _start_daemon()
+
+    assert daemon.stop()
+    thread.join()
+    assert (tmp_path / "run").stat().st_mode & 0o777 == 0o700
+
+
+@pytest.mark.parametrize("mode", (0o755, 0o1777))
+def test_serve_refuses_a_shared_directory(daemon_socket, mode):
+    daemon_socket.parent.chmod(mode)
+
+    with pytest.raises(YappingException, match="only the current user can access"):
+        daemon.serve(60)
+
+    with pytest.raises(YappingException, match="only the current user can access"):
+        daemon.request(["compile"])
+
+
+def test_serve_refuses_a_directory_of_another_user(daemon_socket):
+    with (
+        patch("os.getuid", return_value=os.getuid() + 1),
+        pytest.raises(YappingException, match="only the current user can access"),
+    ):
+        daemon.serve(60)
+
+
+def test_request_refuses_a_daemon_of_another_user(running_daemon):
+    with (
+        patch("yapping.daemon._peer_uid", return_value=os.getuid() + 1),
+        pytest.raises(YappingException, match="run by another user"),
+    ):
+        daemon.request(["compile"])
+
+
+def test_request_without_socket_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("YAP_DAEMON_SOCKET", str(tmp_path / "run" / "yap.sock"))
+
+    assert daemon.request(["compile"]) is None
+    assert not (tmp_path / "run").exists()
+
+
+def test_request_without_daemon():
+    assert daemon.request(["compile"]) is None
+    assert daemon.status() is None
+    assert not daemon.stop()
+
+
+def test_request_runs_the_command_in_the_daemon(
+    running_daemon, setup_file, monkeypatch
+):
+    monkeypatch.chdir(setup_file.parent)
+
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_compile,
+        patch("yapping.cli.commands.compile_test_dependencies") as m_compile_test,
+    ):
+        response = daemon.request(["compile"])
+
+    assert response == daemon.Response(0, "", "")
+    m_compile.assert_called_once_with("pyproject.toml", options=CompileOptions())
+    m_compile_test.assert_called_once_with(
+        "pyproject.toml", "test", "test-requirements.txt", options=CompileOptions()
+    )
+
+
+def test_request_falls_back_for_other_pip_settings(running_daemon):
+    with patch(
+        "yapping.daemon._environment",
+        side_effect=[{"PIP_INDEX_URL": "https://example.com"}, {}],
+    ):
+        assert daemon.request(["compile"]) is None
+
+    assert daemon.status()["requests"] == 0
+
+
+def test_status(running_daemon):
+    status = daemon.status()
+
+    assert status["pid"] == os.getpid()
+    assert status["socket"] == str(running_daemon)
+    assert status["ttl"] == 60
+
+
+@pytest.mark.parametrize("data", (b"", b"{", b"\xff", b"[]"))
+def test_daemon_rejects_invalid_requests(running_daemon, capsys, data):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(running_daemon))
+        client.sendall(data)
+        client.shutdown(socket.SHUT_WR)
+
+        assert client.makefile("rb").read() == b'{"error": "Invalid request"}'
+
+    assert daemon.status()["requests"] == 0
+    assert capsys.readouterr() == ("", "")
+
+
+def test_serve_refuses_a_second_daemon(running_daemon):
+    with pytest.raises(YappingException, match="already listening"):
+        daemon.serve(60)
+
+
+def test_serve_replaces_a_stale_socket(daemon_socket):
+    daemon_socket.write_text("")
+    thread = _start_daemon()
+
+    assert daemon.stop()
+    thread.join()
+    assert not daemon_socket.exists()
+
+
+def test_request_when_the_daemon_closes_the_connection(daemon_socket):
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(daemon_socket))
+    server.listen()
+
+    def _close():
+        connection, _ = server.accept()
+
+        with connection:
+            connection.makefile("rb").read()
+
+    thread = threading.Thread(target=_close)
+    thread.start()
+
+    try:
+        with pytest.raises(YappingException, match="closed the connection"):
+            daemon.request(["compile"])
+    finally:
+        thread.join()
+        server.close()
+
+
+def test_run_captures_output(setup_file):
+    with patch("yapping.cli.commands.update_version"):
+        response = daemon.run(["version", "--help"], str(setup_file.parent))
+
+    assert response.code == 0
+    assert response.stdout.startswith("usage:")
+    assert os.getcwd() != str(setup_file.parent)
+
+
+def test_run_reports_usage_errors(tmp_path):
+    response = daemon.run(["compile", "--bogus"], str(tmp_path))
+
+    assert response.code == 2
+    assert "unrecognized arguments: --bogus" in response.stderr
+
+
+def test_run_reports_exit_messages(tmp_path):
+    with patch("yapping.cli.main", side_effect=SystemExit("boom")):
+        response = daemon.run(["compile"], str(tmp_path))
+
+    assert response == daemon.Response(1, "", "boom\n")
+
+
+def test_run_reports_errors(tmp_path):
+    with patch("yapping.cli.main", side_effect=RuntimeError("boom")):
+        response = daemon.run(["compile"], str(tmp_path))
+
+    assert response.code == 1
+    assert response.stderr.startswith("Traceback")
+    assert "RuntimeError: boom" in response.stderr
+
+
+def test_run_does_not_ask_the_daemon(tmp_path):
+    with patch("yapping.cli.main", return_value=0) as m_main:
+        daemon.run(["compile"], str(tmp_path))
+
+    m_main.assert_called_once_with(["--no-daemon", "compile"])
@@ -0,0 +1,67 @@
+from yapping.dependencies import DependencyIndex
+
+
+def test_dependency_index_sorts_by_normalized_name():
+    index = DependencyIndex(["Zope", "attrs>=23", "Django_Filter", "django"])
+
+    assert list(index) == ["attrs>=23", "django", "Django_Filter", "Zope"]
+
+
+def test_dependency_index_keeps_entries_of_the_same_project():
+    index = DependencyIndex(
+        [
+            "tomli; python_version < '3.11'",
+            "attrs",
+            "tomli>=2; python_version >= '3.11'",
+        ]
+    )
+
+    assert index.get("Tomli") == [
+        "tomli; python_version < '3.11'",
+        "tomli>=2; python_version >= '3.11'",
+    ]
+
+
+def test_dependency_index_add_replaces_the_project():
+    index = DependencyIndex(["django", "djangorestframework"])
+
+    index.add("Django>=5")
+
+    assert list(index) == ["Django>=5", "djangorestframework"]
+
+
+def test_dependency_index_remove_matches_the_project():
+    index = DependencyIndex(["Django[argon2]>=4", "django-filter"])
+
+    assert index.remove("django") == ["Django[argon2]>=4"]
+    assert index.remove("django") == []
+    assert list(index) == ["django-filter"]
+
+
+def test_dependency_index_contains():
+    index = DependencyIndex(["Django[argon2]>=4"])
+
+    assert "django>=5" in index
+    assert "flask" not in index
+    assert None not in index
+
+
+def test_dependency_index_update_keeps_one_entry_per_marker():
+    index = DependencyIndex(["attrs", "tomli; python_version < '3.11'"])
+
+    index.update(
+        [
+            "tomli>=2; python_version >= '3.11'",
+            "Tomli>=1; python_version < '3.11'",
+            "six",
+            "six>=1.16",
+            "tomli>=1.2; python_version < '3.11'",
+        ]
+    )
+
+    assert list(index) == [
+        "attrs",
+        "six>=1.16",
+        "tomli>=2; python_version >= '3.11'",
+        "tomli>=1.2; python_version < '3.11'",
+    ]
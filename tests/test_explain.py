@@ -0,0 +1,119 @@
+import pytest
+
+from yapping import explain
+from yapping.exceptions import YappingException
+from yapping.lockfile import read_index
+
+LOCKFILE = """\
+#
+# This file is autogenerated by pip-compile with Python 3.12
+#
+asgiref==3.8.1 \\
+    --hash=sha256:aaa
+    # via django
+django==5.0 \\
+    --hash=sha256:bbb \\
+    --hash=sha256:ccc
+    # via
+    #   awesome-python-project (pyproject.toml)
+    #   djangorestframework
+djangorestframework==3.15 \\
+    --hash=sha256:ddd
+    # via awesome-python-project (pyproject.toml)
+sqlparse==0.5.0 ; python_version >= "3.11"
+    # via django
+tomli==2.0.1 ; python_version < "3.11"
+    # via -r requirements.in
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text(LOCKFILE)
+
+    return read_index(str(path))
+
+
+def test_why(index):
+    assert explain.why(index, "ASGIRef") == [
+        "asgiref==3.8.1",
+        "  django==5.0",
+        "    awesome-python-project (pyproject.toml)",
+        "    djangorestframework==3.15",
+        "      awesome-python-project (pyproject.toml)",
+    ]
+
+
+def test_why_unknown_package(index):
+    with pytest.raises(YappingException, match="^flask is not locked in .*txt$"):
+        explain.why(index, "flask")
+
+
+def test_tree(index):
+    assert explain.tree(index) == [
+        "-r requirements.in",
+        '  tomli==2.0.1 ; python_version < "3.11"',
+        "awesome-python-project (pyproject.toml)",
+        "  django==5.0",
+        "    asgiref==3.8.1",
+        '    sqlparse==0.5.0 ; python_version >= "3.11"',
+        "  djangorestframework==3.15",
+        "    django==5.0 (see above)",
+    ]
+
+
+def test_tree_of_a_package(index):
+    assert explain.tree(index, "djangorestframework") == [
+        "djangorestframework==3.15",
+        "  django==5.0",
+        "    asgiref==3.8.1",
+        '    sqlparse==0.5.0 ; python_version >= "3.11"',
+    ]
+
+
+def test_tree_without_annotations(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text('django==4.2 ; python_version < "3.12"\ndjango==5.0\nsix==1.17.0\n')
+
+    assert explain.tree(read_index(str(path))) == [
+        'django==4.2 ; python_version < "3.12" | django==5.0',
+        "six==1.17.0",
+    ]
+
+
+def test_show(index):
+    assert explain.show(index, "django") == [
+        "name: django",
+        "version: 5.0",
+        "requires: asgiref, sqlparse",
+        "required by: awesome-python-project (pyproject.toml), djangorestframework",
+        "hashes:",
+        "  sha256:bbb",
+        "  sha256:ccc",
+    ]
+    assert explain.show(index, "sqlparse") == [
+        "name: sqlparse",
+        "version: 0.5.0",
+        'marker: python_version >= "3.11"',
+        "requires:",
+        "required by: django",
+    ]
+
+
+def test_show_every_pin(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text('django==4.2 ; python_version < "3.12"\ndjango==5.0\n')
+
+    assert explain.show(read_index(str(path)), "django") == [
+        "name: django",
+        "version: 4.2",
+        'marker: python_version < "3.12"',
+        "requires:",
+        "required by:",
+        "",
+        "name: django",
+        "version: 5.0",
+        "requires:",
+        "required by:",
+    ]
@@ -0,0 +1,53 @@
+from yapping.hashes import HashStore
+from yapping.hashes import store_path
+
+
+def test_store_path_expands_user(monkeypatch):
+    monkeypatch.setenv("HOME", "/home/yap")
+
+    assert store_path("~/.cache") == "/home/yap/.cache/yap-hashes.json"
+
+
+def test_hash_store_persists_file_hashes(tmp_path):
+    path = str(tmp_path / "cache" / "yap-hashes.json")
+    store = HashStore(path)
+    store.add("Django", "5.0", "django-5.0.tar.gz", "sha256:ccc")
+    store.save()
+
+    assert HashStore(path).get("django", "5.0", "django-5.0.tar.gz") == "sha256:ccc"
+    assert HashStore(path).get("django", "5.0", "django-5.0.whl") is None
+
+
+def test_hash_store_save_keeps_hashes_stored_by_others(tmp_path):
+    path = str(tmp_path / "yap-hashes.json")
+    first = HashStore(path)
+    second = HashStore(path)
+    first.add("six", "1.17.0", "six-1.17.0.tar.gz", "sha256:aaa")
+    first.save()
+    second.add("six", "1.17.0", "six-1.17.0-py3-none-any.whl", "sha256:bbb")
+    second.save()
+
+    assert HashStore(path).files == {
+        "six==1.17.0": {
+            "six-1.17.0.tar.gz": "sha256:aaa",
+            "six-1.17.0-py3-none-any.whl": "sha256:bbb",
+        }
+    }
+
+
+def test_hash_store_save_skips_unchanged_store(tmp_path):
+    path = tmp_path / "yap-hashes.json"
+    HashStore(str(path)).save()
+
+    assert not path.exists()
+
+
+def test_hash_store_ignores_invalid_file(tmp_path):
+    path = tmp_path / "yap-hashes.json"
+    path.write_text("[]")
+
+    assert HashStore(str(path)).files == {}
+
+    path.write_text("{")
+
+    assert HashStore(str(path)).files == {}
@@ -40,3 +40,13 @@ def test_init_command_raises_exception_if_file_exists(call_init, tmp_path):
         call_init()
 
     assert exc.value.args == ("Will not overwrite existing `pyproject.toml` file.",)
+
+
+def test_init_command_targets_the_python_versions(tmp_path):
+    init("foo", tmp_path, ("3.11", "3.12"))
+
+    with open(tmp_path / "pyproject.toml", "rb") as f:
+        data = tomllib.load(f)
+
+    assert data["project"]["requires-python"] == ">=3.11"
+    assert data["tool"]["yapping"]["python-versions"] == ["3.11", "3.12"]
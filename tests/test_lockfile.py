@@ -0,0 +1,280 @@
+from yapping.lockfile import LockedPackage
+from yapping.lockfile import LockedRequirement
+from yapping.lockfile import merge_python_versions
+from yapping.lockfile import python_version_lock
+from yapping.lockfile import read_direct
+from yapping.lockfile import read_index
+from yapping.lockfile import read_package_hashes
+from yapping.lockfile import read_pins
+from yapping.lockfile import read_requirements
+from yapping.lockfile import strip_constraint
+
+LOCKFILE = """\
+# yap-inputs: sha256:abc
+#
+# This file is autogenerated by pip-compile
+#
+django==5.0 \\
+    --hash=sha256:aaa \\
+    --hash=sha256:bbb
+    # via awesome-python-project (pyproject.toml)
+requests[socks]==2.32.0 ; python_version >= "3.11" \\
+    --hash=sha256:ccc
+    # via django
+--extra-index-url https://example.com
+six==1.17.0 \\
+"""
+
+
+def test_read_requirements(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text(LOCKFILE)
+
+    assert read_requirements(str(path)) == [
+        LockedRequirement(
+            "django", "5.0", "django==5.0 --hash=sha256:aaa --hash=sha256:bbb", None
+        ),
+        LockedRequirement(
+            "requests",
+            "2.32.0",
+            'requests[socks]==2.32.0 ; python_version >= "3.11" --hash=sha256:ccc',
+            'python_version >= "3.11"',
+        ),
+        LockedRequirement("six", "1.17.0", "six==1.17.0", None),
+    ]
+
+
+def test_read_requirements_of_direct_references(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text(
+        "--index-url https://example.com/simple\n"
+        "-c constraints.txt\n"
+        "unpinned>=1\n"
+        "My_Lib @ git+https://example.com/mylib.git@v1\n"
+        "    # via awesome-python-project (pyproject.toml)\n"
+        'other @ https://example.com/other-1.0.whl ; python_version < "3.12" \\\n'
+        "    --hash=sha256:ddd\n"
+        "-e file:///src/lib\n"
+        "--editable=git+https://example.com/tool.git#egg=Tool_Kit\n"
+    )
+
+    assert read_requirements(str(path)) == [
+        LockedRequirement(
+            "my-lib",
+            "",
+            "My_Lib @ git+https://example.com/mylib.git@v1",
+            None,
+            "git+https://example.com/mylib.git@v1",
+        ),
+        LockedRequirement(
+            "other",
+            "",
+            'other @ https://example.com/other-1.0.whl ; python_version < "3.12" '
+            "--hash=sha256:ddd",
+            'python_version < "3.12"',
+            "https://example.com/other-1.0.whl",
+        ),
+        LockedRequirement("", "", "-e file:///src/lib", None, "file:///src/lib"),
+        LockedRequirement(
+            "tool-kit",
+            "",
+            "--editable=git+https://example.com/tool.git#egg=Tool_Kit",
+            None,
+            "git+https://example.com/tool.git#egg=Tool_Kit",
+        ),
+    ]
+
+
+def test_read_direct(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text(
+        LOCKFILE
+        + "    --hash=sha256:ddd\n"
+        + "    # via\n"
+        + "    #   django\n"
+        + "    #   awesome-python-project (pyproject.toml)\n"
+    )
+
+    assert read_direct(str(path)) == {"django", "six"}
+
+
+def test_merge_python_versions_leaves_common_pins_alone():
+    lock = "#\n# autogenerated with Python 3.11\n#\ndjango==5.0\n    # via x\n"
+
+    assert merge_python_versions({"3.11": lock, "3.12": lock}) == (
+        "#\n# autogenerated with Python 3.11, 3.12\n#\ndjango==5.0\n    # via x\n"
+    )
+
+
+def test_merge_python_versions_marks_what_differs():
+    merged = merge_python_versions(
+        {
+            "3.10": (
+                "--index-url https://example.com\n\n"
+                'tomli==2.0 ; python_version < "3.11" \\\n'
+                "    --hash=sha256:aaa\n"
+                "six==1.17\n"
+                "# The following packages are considered to be unsafe\n"
+            ),
+            "3.11": "--index-url https://example.com\n\nsix==1.16\n",
+            "3.12": "--index-url https://example.com\n\nsix==1.16\n",
+        }
+    )
+
+    assert merged == (
+        "--index-url https://example.com\n"
+        "\n"
+        'six==1.17 ; python_version == "3.10"\n'
+        'six==1.16 ; python_version == "3.11" or python_version == "3.12"\n'
+        'tomli==2.0 ; (python_version < "3.11") and (python_version == "3.10") \\\n'
+        "    --hash=sha256:aaa\n"
+    )
+
+
+def test_merge_python_versions_needs_markers():
+    assert (
+        merge_python_versions({"3.11": "-e ./lib\nsix==1.17\n", "3.12": "six==1.17\n"})
+        is None
+    )
+    assert merge_python_versions(
+        {"3.11": "-e ./lib\nsix==1.17\n", "3.12": "-e ./lib\n"}
+    ) == ("-e ./lib\n" 'six==1.17 ; python_version == "3.11"\n')
+
+
+def test_python_version_lock():
+    merged = (
+        "# header\n"
+        "--index-url https://example.com\n"
+        "\n"
+        'six==1.17 ; python_version == "3.10"\n'
+        'six==1.16 ; python_version >= "3.11" \\\n'
+        "    --hash=sha256:aaa\n"
+        "django==5.0\n"
+    )
+
+    assert python_version_lock(merged, "3.12") == (
+        "# header\n"
+        "--index-url https://example.com\n"
+        "\n"
+        'six==1.16 ; python_version >= "3.11" \\\n'
+        "    --hash=sha256:aaa\n"
+        "django==5.0\n"
+    )
+
+
+def test_read_pins_of_a_python_version(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text(
+        'six==1.17 ; python_version == "3.10"\nsix==1.16 ; python_version == "3.11"\n'
+    )
+
+    assert read_pins(str(path), "3.10") == {"six": "1.17"}
+    assert read_pins(str(path)) == {"six": "1.16"}
+
+
+def test_read_index(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text(
+        LOCKFILE
+        + "    --hash=sha256:ddd\n"
+        + "    # via\n"
+        + "    #   Django\n"
+        + "    #   -r requirements.in\n"
+        + "-e file:///src/lib\n"
+        + "    # via awesome-python-project (pyproject.toml)\n"
+        + "\n"
+        + "# The following packages are considered to be unsafe:\n"
+        + "# setuptools\n"
+    )
+
+    index = read_index(str(path))
+
+    assert index.packages == {
+        "django": [
+            LockedPackage(
+                "django",
+                "5.0",
+                None,
+                ("awesome-python-project (pyproject.toml)",),
+                LOCKFILE.index("django=="),
+            )
+        ],
+        "requests": [
+            LockedPackage(
+                "requests",
+                "2.32.0",
+                'python_version >= "3.11"',
+                ("django",),
+                LOCKFILE.index("requests"),
+            )
+        ],
+        "six": [
+            LockedPackage(
+                "six",
+                "1.17.0",
+                None,
+                ("django", "-r requirements.in"),
+                LOCKFILE.index("six"),
+            )
+        ],
+    }
+    assert index.requires == {
+        "awesome-python-project (pyproject.toml)": ["django"],
+        "django": ["requests", "six"],
+        "-r requirements.in": ["six"],
+    }
+    assert read_package_hashes(str(path), index.packages["django"][0]) == [
+        "sha256:aaa",
+        "sha256:bbb",
+    ]
+    assert read_package_hashes(str(path), index.packages["six"][0]) == ["sha256:ddd"]
+
+
+def test_read_index_of_merged_python_versions(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text(
+        'django==4.2 ; python_version == "3.11"\n'
+        "    # not an annotation\n"
+        "    # via x (pyproject.toml)\n"
+        'django==5.0 ; python_version == "3.12"\n'
+        "    # via x (pyproject.toml)\n"
+        "six==1.17.0"
+    )
+
+    index = read_index(str(path))
+
+    assert [package.version for package in index.packages["django"]] == ["4.2", "5.0"]
+    assert index.requires == {"x (pyproject.toml)": ["django"]}
+    assert read_package_hashes(str(path), index.packages["six"][0]) == []
+
+
+def test_strip_constraint():
+    lock = (
+        "#    pip-compile --constraint=/tmp/pins.txt --output-file=x.txt x.toml\n"
+        "asgiref==3.8.1\n"
+        "    # via\n"
+        "    #   -c /tmp/pins.txt\n"
+        "    #   django\n"
+        "django==5.0\n"
+        "    # via\n"
+        "    #   -c /tmp/pins.txt\n"
+        "    #   -r requirements.in\n"
+        "    #   x (pyproject.toml)\n"
+        "six==1.17.0\n"
+        "    # via -c /tmp/pins.txt\n"
+        "tomli==2.0.1\n"
+        "    # via\n"
+        "    #   -c /tmp/pins.txt\n"
+    )
+
+    assert strip_constraint(lock, "/tmp/pins.txt") == (
+        "#    pip-compile --output-file=x.txt x.toml\n"
+        "asgiref==3.8.1\n"
+        "    # via django\n"
+        "django==5.0\n"
+        "    # via\n"
+        "    #   -r requirements.in\n"
+        "    #   x (pyproject.toml)\n"
+        "six==1.17.0\n"
+        "tomli==2.0.1\n"
+    )
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from yapping import locking
+from yapping.exceptions import YappingException
+
+
+def test_project_lock_is_exclusive(tmp_path):
+    with locking.project_lock(str(tmp_path)):
+        with pytest.raises(YappingException, match="Another yap command is running in"):
+            with locking.project_lock(str(tmp_path), timeout=0):
+                pass  # pragma: no cover
+
+    with locking.project_lock(str(tmp_path), timeout=0):
+        pass
+
+
+def test_project_lock_leaves_no_files(tmp_path):
+    with locking.project_lock(str(tmp_path)):
+        pass
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_project_lock_defaults_to_the_current_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with locking.project_lock(""):
+        with pytest.raises(YappingException):
+            with locking.project_lock(str(tmp_path), timeout=0):
+                pass  # pragma: no cover
+
+
+def test_project_lock_gives_up_after_the_timeout(tmp_path, capsys):
+    with (
+        locking.project_lock(str(tmp_path)),
+        patch("yapping.locking.POLL_INTERVAL", 0.01),
+        pytest.raises(YappingException, match=r"still running in .* after 0\.05s$"),
+    ):
+        with locking.project_lock(str(tmp_path), timeout=0.05):
+            pass  # pragma: no cover
+
+    assert "yap: waiting for another yap command in" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("timeout", (None, 5))
+def test_project_lock_waits_for_the_other_command(tmp_path, timeout):
+    locked = threading.Event()
+    release = threading.Event()
+
+    def _hold():
+        with locking.project_lock(str(tmp_path)):
+            locked.set()
+            release.wait()
+            time.sleep(0.1)
+
+    thread = threading.Thread(target=_hold)
+    thread.start()
+    locked.wait()
+    release.set()
+
+    with (
+        patch("yapping.locking.POLL_INTERVAL", 0.01),
+        locking.project_lock(str(tmp_path), timeout=timeout),
+    ):
+        assert not thread.is_alive()
+
+    thread.join()
+
+
+def test_atomic_write(tmp_path):
+    filename = tmp_path / "requirements.txt"
+    locking.atomic_write(str(filename), "django==5.0\n")
+    filename.chmod(0o640)
+
+    locking.atomic_write(str(filename), "django==5.1\n")
+
+    assert filename.read_text() == "django==5.1\n"
+    assert filename.stat().st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["requirements.txt"]
+
+
+def test_atomic_write_keeps_the_file_on_failure(tmp_path):
+    filename = tmp_path / "requirements.txt"
+    filename.write_text("django==5.0\n")
+
+    with patch("os.replace", side_effect=OSError("disk full")), pytest.raises(OSError):
+        locking.atomic_write(str(filename), "django==5.1\n")
+
+    assert filename.read_text() == "django==5.0\n"
+    assert os.listdir(tmp_path) == ["requirements.txt"]
+
+
+def test_atomic_write_exclusive_only_creates_the_file(tmp_path):
+    filename = tmp_path / "pyproject.toml"
+    locking.atomic_write(str(filename), "[project]\n", exclusive=True)
+
+    with pytest.raises(FileExistsError):
+        locking.atomic_write(str(filename), "[tool.yapping]\n", exclusive=True)
+
+    assert filename.read_text() == "[project]\n"
+    assert os.listdir(tmp_path) == ["pyproject.toml"]
+
+
+def test_temporary_path():
+    path = locking.temporary_path(os.path.join("a", "requirements.txt"))
+
+    assert os.path.dirname(path) == "a"
+    assert os.path.basename(path).startswith(".requirements.txt.")
+    assert path.endswith(".tmp")
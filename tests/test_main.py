@@ -1,10 +1,23 @@
+import io
+import json
+import os
 import re
 from contextlib import suppress
 from unittest.mock import patch
 
 import pytest
 
+from yapping import locking
 from yapping.cli import main
+from yapping.commands import add_optional_dependency
+from yapping.commands import BatchResult
+from yapping.commands import CompileOptions
+from yapping.commands import Operation
+from yapping.daemon import Response
+from yapping.exceptions import CompileError
+from yapping.exceptions import YappingException
+from yapping.workspace import ProjectResult
+from yapping.workspace import Status
 
 
 def test_main_add_command():
@@ -51,6 +64,56 @@ def test_main_add_extra_command_accepts_multiple_packages():
     m_add_dep.assert_called_with("pyproject.toml", "test", "foo", "bar")
 
 
+def test_main_add_requirements_files(tmp_path, monkeypatch):
+    requirements = tmp_path / "requirements.in"
+    requirements.write_text("django>=4.2\nrequests  # HTTP\n")
+    monkeypatch.setattr("sys.stdin", io.StringIO("six\n"))
+
+    with (
+        patch("yapping.cli.commands.add_dependency") as m_add_dep,
+        patch("yapping.cli.commands.compile_dependencies") as m_compile,
+        patch("yapping.cli.commands.compile_test_dependencies") as m_compile_test,
+    ):
+        main(["add", "foo", "-r", str(requirements), "--requirement", "-"])
+
+    m_add_dep.assert_called_once_with(
+        "pyproject.toml", "foo", "django>=4.2", "requests", "six"
+    )
+    m_compile.assert_called_once_with(
+        "pyproject.toml",
+        options=CompileOptions(unlocked=("foo", "django>=4.2", "requests", "six")),
+    )
+    m_compile_test.assert_called_once()
+
+
+def test_main_add_requirements_file_to_an_extra(tmp_path):
+    requirements = tmp_path / "requirements.in"
+    requirements.write_text("pytest\n")
+
+    with (
+        patch("yapping.cli.commands.add_optional_dependency") as m_add_dep,
+        patch("yapping.cli.commands.compile_dependencies") as m_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["add", "--extra", "-r", str(requirements)])
+
+    m_add_dep.assert_called_once_with("pyproject.toml", "test", "pytest")
+    m_compile.assert_not_called()
+
+
+def test_main_add_requirements_file_validates_before_writing(tmp_path):
+    requirements = tmp_path / "requirements.in"
+    requirements.write_text("django\nnot a requirement\n")
+
+    with (
+        patch("yapping.cli.commands.add_dependency") as m_add_dep,
+        pytest.raises(YappingException, match="requirements.in:2: invalid"),
+    ):
+        main(["add", "-r", str(requirements)])
+
+    m_add_dep.assert_not_called()
+
+
 def test_main_rm_command():
     with (
         patch("yapping.cli.commands.remove_dependency") as m_rm_dep,
@@ -95,8 +158,14 @@ def test_main_rm_extra_command_accepts_multiple_packages():
     m_rm_dep.assert_called_with("pyproject.toml", "test", "foo", "bar")
 
 
-@pytest.mark.parametrize("command", ("add", "rm"))
-def test_main_commands_call_compile(command, setup_file):
+@pytest.mark.parametrize(
+    "command, options",
+    (
+        ("add", CompileOptions(unlocked=("foo",))),
+        ("rm", CompileOptions()),
+    ),
+)
+def test_main_commands_call_compile(command, options, setup_file):
     with (
         patch("yapping.cli.commands.add_dependency"),
         patch("yapping.cli.commands.remove_dependency"),
@@ -105,9 +174,9 @@ def test_main_commands_call_compile(command, setup_file):
     ):
         main([command, "foo"])
 
-    m_pip_compile.assert_called_once_with("pyproject.toml")
+    m_pip_compile.assert_called_once_with("pyproject.toml", options=options)
     m_pip_compile_test.assert_called_once_with(
-        "pyproject.toml", "test", "test-requirements.txt"
+        "pyproject.toml", "test", "test-requirements.txt", options=options
     )
 
 
@@ -118,9 +187,9 @@ def test_main_compile_calls_compile():
     ):
         main(["compile"])
 
-    m_pip_compile.assert_called_once_with("pyproject.toml")
+    m_pip_compile.assert_called_once_with("pyproject.toml", options=CompileOptions())
     m_pip_compile_test.assert_called_once_with(
-        "pyproject.toml", "test", "test-requirements.txt"
+        "pyproject.toml", "test", "test-requirements.txt", options=CompileOptions()
     )
 
 
@@ -131,9 +200,35 @@ def test_main_upgrade_calls_compile_with_extra_args():
     ):
         main(["upgrade"])
 
-    m_pip_compile.assert_called_once_with("pyproject.toml", "--upgrade")
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml", "--upgrade", options=CompileOptions()
+    )
     m_pip_compile_test.assert_called_once_with(
-        "pyproject.toml", "test", "test-requirements.txt", "--upgrade"
+        "pyproject.toml",
+        "test",
+        "test-requirements.txt",
+        "--upgrade",
+        options=CompileOptions(),
+    )
+
+
+def test_main_upgrade_selected_packages():
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+    ):
+        main(["upgrade", "django", "requests<3"])
+
+    upgrade_args = ("--upgrade-package=django", "--upgrade-package=requests<3")
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml", *upgrade_args, options=CompileOptions()
+    )
+    m_pip_compile_test.assert_called_once_with(
+        "pyproject.toml",
+        "test",
+        "test-requirements.txt",
+        *upgrade_args,
+        options=CompileOptions(),
     )
 
 
@@ -146,7 +241,7 @@ def test_main_compile_only_extra_calls_compile():
 
     m_pip_compile.assert_not_called()
     m_pip_compile_test.assert_called_once_with(
-        "pyproject.toml", "test", "test-requirements.txt"
+        "pyproject.toml", "test", "test-requirements.txt", options=CompileOptions()
     )
 
 
@@ -162,7 +257,7 @@ def test_main_init():
     with patch("yapping.cli.commands.init") as m_init:
         main(["init", "foo-project", "--no-compile", "--no-compile-test"])
 
-    m_init.assert_called_once_with("foo-project", ".")
+    m_init.assert_called_once_with("foo-project", ".", ())
 
 
 def test_main_init_compile():
@@ -208,3 +303,886 @@ def test_main_no_args_prints_help(capsys):
 
     assert len(out) > 0
     assert err == ""
+
+
+def test_main_compile_reports_failures_separately(capsys):
+    with (
+        patch(
+            "yapping.cli.commands.compile_dependencies",
+            side_effect=CompileError("main resolution failed"),
+        ),
+        patch(
+            "yapping.cli.commands.compile_test_dependencies",
+            side_effect=CompileError("test resolution failed"),
+        ),
+    ):
+        ret = main(["compile"])
+
+    out, err = capsys.readouterr()
+
+    assert ret == 1
+    assert "failed to compile main dependencies" in err
+    assert "main resolution failed" in err
+    assert "failed to compile test dependencies" in err
+    assert "test resolution failed" in err
+
+
+def test_main_compile_raises_unexpected_errors(capsys):
+    with (
+        patch(
+            "yapping.cli.commands.compile_dependencies",
+            side_effect=KeyError("project"),
+        ),
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+        pytest.raises(KeyError, match="project"),
+    ):
+        main(["compile"])
+
+    m_pip_compile_test.assert_called_once()
+    assert "failed to compile" not in capsys.readouterr().err
+
+
+def test_main_compile_failure_does_not_stop_other_compile(capsys):
+    with (
+        patch(
+            "yapping.cli.commands.compile_dependencies",
+            side_effect=CompileError("boom"),
+        ),
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+    ):
+        ret = main(["compile", "--jobs", "1"])
+
+    out, err = capsys.readouterr()
+
+    assert ret == 1
+    m_pip_compile_test.assert_called_once()
+    assert "failed to compile test dependencies" not in err
+
+
+def test_main_compile_rejects_non_positive_jobs():
+    with pytest.raises(SystemExit) as exc:
+        main(["compile", "--jobs", "0"])
+
+    assert exc.value.code == 2
+
+
+def test_main_compile_force_is_passed_to_compile():
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+    ):
+        main(["compile", "--force"])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml", options=CompileOptions(force=True)
+    )
+    m_pip_compile_test.assert_called_once_with(
+        "pyproject.toml",
+        "test",
+        "test-requirements.txt",
+        options=CompileOptions(force=True),
+    )
+
+
+def test_main_compile_backend_is_passed_to_compile():
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["compile", "--backend", "subprocess"])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml", options=CompileOptions(backend="subprocess")
+    )
+
+
+def test_main_lock_timeout_is_passed_to_compile():
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["--lock-timeout", "2.5", "compile"])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml", options=CompileOptions(lock_timeout=2.5)
+    )
+
+
+def test_main_no_wait_fails_when_the_project_is_locked():
+    with (
+        locking.project_lock("."),
+        patch("yapping.cli.commands.add_dependency") as m_add_dep,
+        pytest.raises(YappingException, match="Another yap command is running in"),
+    ):
+        main(["--no-wait", "add", "foo"])
+
+    m_add_dep.assert_not_called()
+
+
+def test_main_init_waits_for_the_output_dir(tmp_path):
+    with (
+        locking.project_lock(str(tmp_path)),
+        patch("yapping.cli.commands.init") as m_init,
+        pytest.raises(YappingException, match="Another yap command is running in"),
+    ):
+        main(["--no-wait", "init", "foo", f"--output-dir={tmp_path}", "--no-compile"])
+
+    m_init.assert_not_called()
+
+
+def test_main_lock_options_are_exclusive():
+    with pytest.raises(SystemExit):
+        main(["--no-wait", "--lock-timeout", "1", "compile"])
+
+
+def test_main_batch_command_compiles_once():
+    with (
+        patch("yapping.cli.commands.batch") as m_batch,
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+    ):
+        m_batch.return_value = BatchResult(True, frozenset())
+        main(["batch", "add foo", "add-extra test bar"])
+
+    m_batch.assert_called_once_with(
+        "pyproject.toml",
+        [Operation("add", ("foo",)), Operation("add-extra", ("test", "bar"))],
+    )
+    m_pip_compile.assert_called_once()
+    m_pip_compile_test.assert_called_once()
+
+
+def test_main_batch_command_reads_stdin(monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("rm-extra test foo\nversion patch\n"))
+
+    with (
+        patch("yapping.cli.commands.batch") as m_batch,
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+    ):
+        m_batch.return_value = BatchResult(False, frozenset({"test"}))
+        main(["batch", "-"])
+
+    m_batch.assert_called_once_with(
+        "pyproject.toml",
+        [Operation("rm-extra", ("test", "foo")), Operation("version", ("patch",))],
+    )
+    m_pip_compile.assert_not_called()
+    m_pip_compile_test.assert_called_once()
+
+
+def test_main_batch_command_without_dependency_changes_does_not_compile():
+    with (
+        patch("yapping.cli.commands.batch") as m_batch,
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+    ):
+        m_batch.return_value = BatchResult(False, frozenset({"docs"}))
+        ret = main(["batch", "add-extra docs sphinx"])
+
+    assert ret == 0
+    m_pip_compile.assert_not_called()
+    m_pip_compile_test.assert_not_called()
+
+
+def test_main_add_fixed_pins_unlocks_added_packages():
+    with (
+        patch("yapping.cli.commands.add_dependency"),
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["add", "foo", "Bar>=2", "--pins", "fix"])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml",
+        options=CompileOptions(pins="fix", unlocked=("foo", "Bar>=2")),
+    )
+
+
+def test_main_batch_unlocks_added_packages():
+    with (
+        patch("yapping.cli.commands.batch") as m_batch,
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        m_batch.return_value = BatchResult(True, frozenset({"test"}))
+        main(["batch", "add foo", "rm bar", "add-extra test baz", "--pins", "fix"])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml",
+        options=CompileOptions(pins="fix", unlocked=("foo", "baz")),
+    )
+
+
+def test_main_compile_cache_dir_is_passed_to_compile(tmp_path):
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["compile", "--cache-dir", str(tmp_path)])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml", options=CompileOptions(cache_dir=str(tmp_path))
+    )
+
+
+def test_main_compile_reads_cache_dir_from_config(setup_file, monkeypatch):
+    monkeypatch.chdir(setup_file.parent)
+    with open(setup_file, "a") as f:
+        f.write('\n[tool.yapping]\ncache-dir = ".cache"\ncache-max-size = "1K"\n')
+
+    (setup_file.parent / ".cache").mkdir()
+    (setup_file.parent / ".cache" / "big").write_bytes(b"x" * 2048)
+
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["compile"])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml",
+        options=CompileOptions(cache_dir=str(setup_file.parent / ".cache")),
+    )
+    assert os.listdir(setup_file.parent / ".cache") == [".yap-pruned"]
+
+
+def test_main_compile_lock_store(tmp_path):
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["compile", "--lock-store", str(tmp_path)])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml", options=CompileOptions(lock_store=str(tmp_path))
+    )
+
+
+def test_main_compile_reads_lock_store_from_config(setup_file, monkeypatch):
+    monkeypatch.chdir(setup_file.parent)
+    with open(setup_file, "a") as f:
+        f.write('\n[tool.yapping]\nlock-store = "~/locks"\n')
+
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["compile"])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml",
+        options=CompileOptions(lock_store=os.path.expanduser("~/locks")),
+    )
+
+
+def test_main_cache_show(tmp_path, capsys):
+    (tmp_path / "entry").write_bytes(b"x" * 10)
+
+    ret = main(["cache", "--cache-dir", str(tmp_path)])
+
+    out, err = capsys.readouterr()
+    assert ret == 0
+    assert out == f"{tmp_path}: 1 files (10 B)\n"
+
+
+def test_main_cache_prune(tmp_path, capsys):
+    (tmp_path / "entry").write_bytes(b"x" * 10)
+
+    main(["cache", "prune", "--cache-dir", str(tmp_path)])
+
+    out, err = capsys.readouterr()
+    assert out == f"Removed 1 files (10 B)\n{tmp_path}: 0 files (0 B)\n"
+
+
+def test_main_cache_without_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(YappingException) as exc:
+        main(["cache"])
+
+    assert "No cache directory" in exc.value.args[0]
+
+
+def test_main_workspace_prints_summary(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    results = [
+        ProjectResult("services/a", Status.COMPILED, 1.25),
+        ProjectResult("services/b", Status.FAILED, 0.5, "no django"),
+    ]
+
+    with (
+        patch("yapping.workspace.find_projects", return_value=["a", "b"]) as m_find,
+        patch("yapping.workspace.compile_workspace", return_value=results) as m_ws,
+    ):
+        ret = main(["workspace", "services/*", "-j", "4"])
+
+    out, err = capsys.readouterr()
+
+    assert ret == 1
+    m_find.assert_called_once_with(["services/*"], [])
+    m_ws.assert_called_once_with(
+        ["a", "b"], "test", "test-requirements.txt", CompileOptions(), 4
+    )
+    assert "services/a  compiled         1.2s" in out
+    assert "2 projects in" in out
+    assert err == "yap: failed to compile services/b\nno django\n"
+
+
+def test_main_workspace_without_projects(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(YappingException) as exc:
+        main(["workspace"])
+
+    assert "No projects found" in exc.value.args[0]
+
+
+@pytest.fixture
+def extras_project(setup_file, monkeypatch):
+    monkeypatch.chdir(setup_file.parent)
+    add_optional_dependency(setup_file, "docs", "sphinx")
+    add_optional_dependency(setup_file, "lint", "flake8")
+
+    with open(setup_file, "a") as f:
+        f.write('\n[tool.yapping.extra-outputs]\nlint = "requirements-lint.txt"\n')
+
+    return setup_file
+
+
+def test_main_compile_all_extras(extras_project):
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+    ):
+        main(["compile", "--all-extras", "--extra-output", "docs=docs.txt"])
+
+    m_pip_compile.assert_called_once()
+    assert sorted(call.args for call in m_pip_compile_test.call_args_list) == [
+        ("pyproject.toml", "docs", "docs.txt"),
+        ("pyproject.toml", "lint", "requirements-lint.txt"),
+        ("pyproject.toml", "test", "test-requirements.txt"),
+    ]
+
+
+def test_main_upgrade_all_extras(extras_project):
+    with (
+        patch("yapping.cli.commands.compile_dependencies"),
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+    ):
+        main(["upgrade", "--all-extras", "--extra-output", "missing=missing.txt"])
+
+    assert sorted(call.args for call in m_pip_compile_test.call_args_list) == [
+        ("pyproject.toml", "docs", "docs-requirements.txt", "--upgrade"),
+        ("pyproject.toml", "lint", "requirements-lint.txt", "--upgrade"),
+        ("pyproject.toml", "test", "test-requirements.txt", "--upgrade"),
+    ]
+
+
+def test_main_add_extra_all_extras_only_compiles_that_group(extras_project):
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+    ):
+        main(["add", "furo", "--extra", "--optional-dependencies", "docs"])
+        main(
+            [
+                "add",
+                "myst",
+                "--extra",
+                "--optional-dependencies",
+                "docs",
+                "--all-extras",
+            ]
+        )
+
+    m_pip_compile.assert_not_called()
+    assert [call.args for call in m_pip_compile_test.call_args_list] == [
+        ("pyproject.toml", "docs", "test-requirements.txt"),
+        ("pyproject.toml", "docs", "test-requirements.txt"),
+    ]
+
+
+def test_main_all_extras_rejects_shared_output_file(extras_project):
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        pytest.raises(YappingException) as exc,
+    ):
+        main(["compile", "--all-extras", "--optional-dependencies", "docs"])
+
+    m_pip_compile.assert_not_called()
+    assert exc.value.args[0] == (
+        "Optional dependency groups 'test' and 'docs' both compile to "
+        "test-requirements.txt"
+    )
+
+
+def test_main_all_extras_ignores_unknown_optional_dependencies(extras_project):
+    with (
+        patch("yapping.cli.commands.compile_dependencies"),
+        patch("yapping.cli.commands.compile_test_dependencies") as m_pip_compile_test,
+    ):
+        main(["compile", "--all-extras", "--optional-dependencies", "missing"])
+
+    assert sorted(call.args[1] for call in m_pip_compile_test.call_args_list) == [
+        "docs",
+        "lint",
+        "test",
+    ]
+
+
+def test_main_rejects_invalid_extra_output():
+    with pytest.raises(SystemExit) as exc:
+        main(["compile", "--extra-output", "docs"])
+
+    assert exc.value.code == 2
+
+
+def test_main_timings_prints_phases(setup_file, monkeypatch, capsys):
+    monkeypatch.chdir(setup_file.parent)
+
+    with patch("yapping.cli.commands.compile_dependencies"):
+        main(["--timings", "add", "furo", "--no-compile-test"])
+
+    _, err = capsys.readouterr()
+
+    assert err.startswith("yap timings:\n  parse arguments")
+    assert "write pyproject.toml" in err
+    assert err.splitlines()[-1].lstrip().startswith("yap add")
+
+
+def test_main_trace_writes_trace_file(setup_file, monkeypatch, capsys):
+    monkeypatch.chdir(setup_file.parent)
+    trace = setup_file.parent / "trace.json"
+
+    with (
+        patch("yapping.cli.commands.compile_dependencies"),
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["--trace", str(trace), "compile"])
+
+    names = [event["name"] for event in json.loads(trace.read_text())["traceEvents"]]
+
+    assert names[:3] == ["parse arguments", "wait for project lock", "read config"]
+    assert "yap compile" in names
+    assert capsys.readouterr().err == ""
+
+
+def test_main_watch(capsys):
+    with (
+        patch("yapping.watch.make_watcher") as m_make_watcher,
+        patch("yapping.watch.watch") as m_watch,
+    ):
+        ret = main(["watch", "--debounce", "2", "--poll"])
+
+    assert ret == 0
+    m_make_watcher.assert_called_once_with("pyproject.toml", poll=True)
+    locks, options, watcher, debounce = m_watch.call_args.args[1:]
+    assert [tuple(lock) for lock in locks] == [
+        (None, "requirements.txt"),
+        ("test", "test-requirements.txt"),
+    ]
+    assert options == CompileOptions()
+    assert watcher is m_make_watcher.return_value
+    assert debounce == 2
+    assert "yap: watching pyproject.toml" in capsys.readouterr().out
+
+
+def test_main_watch_stops_on_interrupt():
+    with (
+        patch("yapping.watch.make_watcher"),
+        patch("yapping.watch.watch", side_effect=KeyboardInterrupt),
+    ):
+        assert main(["watch"]) == 0
+
+
+def test_main_sends_commands_to_the_daemon(capsys):
+    response = Response(3, "out\n", "err\n")
+
+    with (
+        patch("yapping.daemon.request", return_value=response) as m_request,
+        patch("yapping.cli.commands.compile_dependencies") as m_compile,
+    ):
+        ret = main(["compile", "--force"])
+
+    assert ret == 3
+    m_request.assert_called_once_with(["compile", "--force"])
+    m_compile.assert_not_called()
+    assert capsys.readouterr() == ("out\n", "err\n")
+
+
+@pytest.mark.parametrize(
+    "argv",
+    (
+        ["--no-daemon", "compile"],
+        ["version", "patch"],
+        ["batch", "-"],
+        ["add", "-r", "-"],
+    ),
+)
+def test_main_runs_locally_without_the_daemon(argv):
+    with (
+        patch("yapping.daemon.request") as m_request,
+        patch("yapping.cli.commands.compile_dependencies"),
+        patch("yapping.cli.commands.compile_test_dependencies"),
+        patch("yapping.cli.commands.update_version"),
+        patch("yapping.cli.commands.batch"),
+        patch("yapping.cli.commands.add_dependency"),
+        patch("sys.stdin", io.StringIO("")),
+    ):
+        main(argv)
+
+    m_request.assert_not_called()
+
+
+def test_main_runs_locally_when_no_daemon_answers():
+    with (
+        patch("yapping.daemon.request", return_value=None) as m_request,
+        patch("yapping.cli.commands.batch") as m_batch,
+        patch("yapping.cli.commands.compile_dependencies") as m_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["batch", "add django"])
+
+    m_batch.assert_called_once()
+
+    m_request.assert_called_once_with(["batch", "add django"])
+    m_compile.assert_called_once()
+
+
+def test_main_daemon_run(capsys):
+    with patch("yapping.daemon.serve", side_effect=KeyboardInterrupt) as m_serve:
+        assert main(["daemon", "--ttl", "30"]) == 0
+
+    m_serve.assert_called_once_with(30)
+    assert "yap: daemon listening on" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("action", ("stop", "status"))
+def test_main_daemon_not_running(action, capsys):
+    assert main(["daemon", action]) == 1
+    assert capsys.readouterr().err == "yap: no daemon is running\n"
+
+
+def test_main_daemon_stop():
+    with patch("yapping.daemon.stop", return_value=True):
+        assert main(["daemon", "stop"]) == 0
+
+
+def test_main_daemon_status(capsys):
+    status = {
+        "pid": 42,
+        "socket": "/run/yap.sock",
+        "uptime": 61.2,
+        "requests": 3,
+        "ttl": 300,
+    }
+
+    with patch("yapping.daemon.status", return_value=status):
+        assert main(["daemon", "status"]) == 0
+
+    assert capsys.readouterr().out == (
+        "yap daemon 42 on /run/yap.sock: up 61s, 3 commands, index lookups kept 300s\n"
+    )
+
+
+def test_main_compile_log(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["compile", "--log", "yap.log"])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml", options=CompileOptions(log=str(tmp_path / "yap.log"))
+    )
+
+
+@pytest.fixture
+def synced_project(setup_file, monkeypatch):
+    monkeypatch.chdir(setup_file.parent)
+    (setup_file.parent / "requirements.txt").write_text("django==5.0\n")
+
+    return setup_file.parent
+
+
+def _sync_environment(installed):
+    from yapping.sync import Environment
+
+    return Environment(installed, {}, {"python_version": "3.12"}, {})
+
+
+def test_main_sync_up_to_date(synced_project, capsys):
+    with (
+        patch(
+            "yapping.sync.inspect", return_value=_sync_environment({"django": "5.0"})
+        ),
+        patch("yapping.sync.install") as m_install,
+    ):
+        assert main(["sync"]) == 0
+
+    m_install.assert_not_called()
+    assert capsys.readouterr().out == "yap: the environment is up to date\n"
+
+
+def test_main_sync_installs_and_removes(synced_project, capsys):
+    (synced_project / "test-requirements.txt").write_text("django==5.0\npytest==8\n")
+    environment = _sync_environment({"attrs": "1", "awesome-python-project": "0.1"})
+
+    with (
+        patch("yapping.sync.inspect", return_value=environment) as m_inspect,
+        patch("yapping.sync.install") as m_install,
+        patch("yapping.sync.uninstall") as m_uninstall,
+    ):
+        assert main(["sync", "--python", "/venv/bin/python", "-j", "4"]) == 0
+
+    m_inspect.assert_called_once_with("/venv/bin/python")
+    requirements = m_install.call_args.args[1]
+    assert [req.name for req in requirements] == ["django", "pytest"]
+    assert m_install.call_args.args[::2] == ("/venv/bin/python", 4)
+    assert m_install.call_args.args[3] is None
+    m_uninstall.assert_called_once_with("/venv/bin/python", ["attrs"])
+    assert capsys.readouterr().out == (
+        "install django==5.0\ninstall pytest==8\nremove attrs\n"
+    )
+
+
+@pytest.mark.parametrize(
+    ("installed", "calls"),
+    (({}, ("install",)), ({"django": "5.0", "attrs": "1"}, ("uninstall",))),
+)
+def test_main_sync_only_runs_what_is_needed(synced_project, installed, calls):
+    with (
+        patch("yapping.sync.inspect", return_value=_sync_environment(installed)),
+        patch("yapping.sync.install") as m_install,
+        patch("yapping.sync.uninstall") as m_uninstall,
+    ):
+        main(["sync", "requirements.txt"])
+
+    assert (m_install.called, m_uninstall.called) == (
+        "install" in calls,
+        "uninstall" in calls,
+    )
+
+
+def test_main_sync_uses_the_cache_dir(synced_project):
+    with open(synced_project / "pyproject.toml", "a") as f:
+        f.write('\n[tool.yapping]\ncache-dir = "cache"\n')
+
+    with (
+        patch("yapping.sync.inspect", return_value=_sync_environment({})),
+        patch("yapping.sync.install") as m_install,
+    ):
+        main(["sync"])
+        main(["sync", "--cache-dir", "/other"])
+
+    assert [call.args[3] for call in m_install.call_args_list] == [
+        str(synced_project / "cache"),
+        "/other",
+    ]
+
+
+def test_main_sync_dry_run(synced_project, capsys):
+    with (
+        patch("yapping.sync.inspect", return_value=_sync_environment({})),
+        patch("yapping.sync.install") as m_install,
+    ):
+        assert main(["sync", "--dry-run"]) == 0
+
+    m_install.assert_not_called()
+    assert capsys.readouterr().out == "install django==5.0\n"
+
+
+def test_main_sync_shows_where_direct_references_come_from(synced_project, capsys):
+    (synced_project / "requirements.txt").write_text("mylib @ file:///src/mylib\n")
+
+    with patch("yapping.sync.inspect", return_value=_sync_environment({})):
+        assert main(["sync", "--dry-run"]) == 0
+
+    assert capsys.readouterr().out == "install mylib from file:///src/mylib\n"
+
+
+def test_main_sync_without_lock_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(YappingException, match="No lock files to sync"):
+        main(["sync"])
+
+
+def test_main_sync_defaults_to_the_target_python(synced_project):
+    with (
+        patch("yapping.sync.target_python", return_value="/venv/bin/python"),
+        patch("yapping.sync.inspect", return_value=_sync_environment({})) as m_inspect,
+        patch("yapping.sync.install"),
+    ):
+        main(["sync"])
+
+    m_inspect.assert_called_once_with("/venv/bin/python")
+
+
+@pytest.fixture
+def checked_project(setup_file, monkeypatch):
+    monkeypatch.chdir(setup_file.parent)
+    (setup_file.parent / "requirements.txt").write_text(
+        "".join(
+            f"{name}==1.0\n    # via awesome-python-project (pyproject.toml)\n"
+            for name in ("django", "djangorestframework", "pip-tools", "tomli-w")
+        )
+    )
+
+    return setup_file.parent
+
+
+def test_main_check_up_to_date(checked_project, capsys):
+    (checked_project / "test-requirements.txt").write_text(
+        (checked_project / "requirements.txt").read_text()
+        + "".join(
+            f"{name}==1.0\n"
+            for name in (
+                "covdefaults",
+                "pytest",
+                "pytest-cov",
+                "pytest-randomly",
+                "pytest-xdist",
+                "time-machine",
+            )
+        )
+    )
+
+    assert main(["check"]) == 0
+    assert capsys.readouterr().out == (
+        "requirements.txt: up to date\ntest-requirements.txt: up to date\n"
+    )
+
+
+def test_main_check_reports_stale_locks(checked_project, capsys):
+    assert main(["check", "--test-requirements", "tests.txt"]) == 1
+
+    captured = capsys.readouterr()
+    assert captured.out == "requirements.txt: up to date\n"
+    assert captured.err == (
+        "tests.txt: out of date\n"
+        "  tests.txt does not exist\n"
+        "yap: run `yap compile` to update the lock files\n"
+    )
+
+
+def test_main_check_skips_groups_pyproject_lacks(checked_project, capsys):
+    assert main(["check", "--optional-dependencies", "docs"]) == 0
+    assert capsys.readouterr().out == "requirements.txt: up to date\n"
+
+
+def test_main_check_all_extras(checked_project, capsys):
+    with open("pyproject.toml", "a") as f:
+        f.write('\n[tool.yapping.extra-outputs]\ntest = "tests.txt"\n')
+
+    assert main(["check", "--all-extras"]) == 1
+    assert "tests.txt: out of date" in capsys.readouterr().err
+
+
+def test_main_compile_python_versions():
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["compile", "--python-versions", "3.12, 3.9,3.12"])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml", options=CompileOptions(python_versions=("3.9", "3.12"))
+    )
+
+
+@pytest.mark.parametrize("value", ("3", "3.12,py3.13", ","))
+def test_main_compile_rejects_python_versions(value, capsys):
+    with pytest.raises(SystemExit):
+        main(["compile", "--python-versions", value])
+
+    assert "expected X.Y[,X.Y...]" in capsys.readouterr().err
+
+
+def test_main_compile_reads_python_versions_from_config(setup_file, monkeypatch):
+    monkeypatch.chdir(setup_file.parent)
+    with open(setup_file, "a") as f:
+        f.write('\n[tool.yapping]\npython-versions = ["3.13", "3.12"]\n')
+
+    with (
+        patch("yapping.cli.commands.compile_dependencies") as m_pip_compile,
+        patch("yapping.cli.commands.compile_test_dependencies"),
+    ):
+        main(["compile"])
+
+    m_pip_compile.assert_called_once_with(
+        "pyproject.toml", options=CompileOptions(python_versions=("3.12", "3.13"))
+    )
+
+
+def test_main_compile_rejects_python_versions_from_config(setup_file, monkeypatch):
+    monkeypatch.chdir(setup_file.parent)
+    with open(setup_file, "a") as f:
+        f.write('\n[tool.yapping]\npython-versions = ["three"]\n')
+
+    with pytest.raises(YappingException, match="Invalid `python-versions`"):
+        main(["compile"])
+
+
+def test_main_init_python_versions():
+    with patch("yapping.cli.commands.init") as m_init:
+        main(["init", "foo", "--no-compile", "--python-versions", "3.12,3.11"])
+
+    m_init.assert_called_once_with("foo", ".", ("3.11", "3.12"))
+
+
+def test_main_sync_finds_the_lock_of_its_python_version(synced_project):
+    os.rename("requirements.txt", "requirements-py3.12.txt")
+
+    with (
+        patch("yapping.sync.inspect", return_value=_sync_environment({})),
+        patch("yapping.sync.install") as m_install,
+    ):
+        main(["sync"])
+
+    assert [req.name for req in m_install.call_args.args[1]] == ["django"]
+
+
+def test_main_check_python_versions(checked_project, capsys):
+    assert main(["check", "--python-versions", "3.11,3.12"]) == 1
+
+    captured = capsys.readouterr()
+    assert captured.out == "requirements.txt: up to date\n"
+    assert captured.err.startswith(
+        "test-requirements.txt: out of date\n"
+        "  test-requirements-py3.11.txt does not exist\n"
+        "  test-requirements-py3.12.txt does not exist\n"
+    )
+
+
+@pytest.mark.parametrize(
+    ("argv", "expected"),
+    (
+        (["why", "asgiref"], "asgiref==3.8.1\n  django==5.0\n    x (pyproject.toml)\n"),
+        (["tree"], "x (pyproject.toml)\n  django==5.0\n    asgiref==3.8.1\n"),
+        (["tree", "asgiref"], "asgiref==3.8.1\n"),
+        (
+            ["show", "django"],
+            "name: django\nversion: 5.0\nrequires: asgiref\n"
+            "required by: x (pyproject.toml)\n",
+        ),
+    ),
+)
+def test_main_lockfile_commands(tmp_path, capsys, argv, expected):
+    lock = tmp_path / "lock.txt"
+    lock.write_text(
+        "asgiref==3.8.1\n    # via django\ndjango==5.0\n    # via x (pyproject.toml)\n"
+    )
+
+    assert main([*argv, "--lockfile", str(lock)]) == 0
+    assert capsys.readouterr().out == expected
+
+
+def test_main_lockfile_commands_need_a_lock_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(YappingException, match="No such lock file: requirements.txt"):
+        main(["why", "django"])
@@ -0,0 +1,83 @@
+import io
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+from yapping.progress import capture
+from yapping.progress import CLEAR_LINE
+from yapping.progress import CompileOutput
+from yapping.progress import terminal
+
+
+class Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_terminal():
+    with patch("sys.stderr", Terminal()) as stderr:
+        assert terminal() is stderr
+
+    with patch("sys.stderr", io.StringIO()):
+        assert terminal() is None
+
+    with patch("sys.stderr", Terminal()) as stderr, capture(io.StringIO()):
+        assert terminal() is stderr
+
+
+def test_capture_keeps_the_output_of_other_threads(capsys):
+    output = io.StringIO()
+
+    def _report():
+        print("other", file=sys.stderr, flush=True)
+
+    with capture(output):
+        print("mine")
+        print("mine too", file=sys.stderr)
+        assert not sys.stdout.isatty()
+        thread = threading.Thread(target=_report)
+        thread.start()
+        thread.join()
+
+    print("after")
+
+    assert output.getvalue() == "mine\nmine too\n"
+    assert capsys.readouterr() == ("after\n", "other\n")
+
+
+def test_output_keeps_the_last_lines():
+    with CompileOutput("requirements.txt", tail_lines=2) as output:
+        output.write("one\ntwo\nth")
+        output.write("ree\nfour")
+
+    assert output.tail() == "three\nfour"
+    assert not output.watched
+
+
+def test_output_appends_to_the_log(tmp_path):
+    log = tmp_path / "yap.log"
+    log.write_text("earlier\n")
+
+    with CompileOutput("requirements.txt", str(log)) as output:
+        output.write_line("Resolving\r\n")
+        assert output.watched
+
+    output.close()
+
+    assert log.read_text() == "earlier\n[requirements.txt] Resolving\n"
+
+
+def test_output_shows_progress_on_the_status_line():
+    status = Terminal()
+
+    with (
+        patch("shutil.get_terminal_size", return_value=os.terminal_size((38, 24))),
+        CompileOutput("test-requirements.txt", status=status) as output,
+    ):
+        output.write_line("Finding the best candidates:")
+        output.write_line("")
+
+    assert status.getvalue() == (
+        f"{CLEAR_LINE}test-requirements.txt: Finding the be{CLEAR_LINE}"
+    )
@@ -1,5 +1,6 @@
 import tomllib
 
+from yapping.commands import add_dependency
 from yapping.commands import remove_dependency
 from yapping.commands import remove_optional_dependency
 
@@ -73,3 +74,17 @@ def test_rm_optional_dependency_is_idempotent(setup_file):
         data = tomllib.load(fp)
 
     assert "pytest" not in data["project"]["optional-dependencies"]["test"]
+
+
+def test_rm_dependency_matches_the_package_name(setup_file):
+    add_dependency(setup_file, "Django[argon2]>=4")
+    remove_dependency(setup_file, "django")
+
+    with open(setup_file, "rb") as fp:
+        data = tomllib.load(fp)
+
+    assert data["project"]["dependencies"] == [
+        "djangorestframework",
+        "pip-tools",
+        "tomli-w",
+    ]
@@ -0,0 +1,88 @@
+import subprocess
+import sys
+
+# yapping.cli imports in about 20ms, pip-tools alone takes over 600ms. The
+# margin keeps a busy machine from failing the test.
+STARTUP_BUDGET_US = 300_000
+
+LAZY_MODULES = (
+    "yapping.commands",
+    "tomli_w",
+    "subprocess",
+    "importlib.metadata",
+    "concurrent.futures",
+)
+
+# What pip-compile needs, slow to import and never needed to parse arguments.
+HEAVY_MODULES = ("pip", "piptools", "click", "packaging")
+
+
+def _yapping_import_times(*args):
+    proc = subprocess.run(
+        (sys.executable, "-X", "importtime", "-m", "yapping", *args),
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    times = {}
+    subtree = []
+
+    # Children are reported before their parent, a top-level import closes a tree.
+    for line in proc.stderr.splitlines()[1:]:
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        subtree.append(name.strip())
+
+        if name.startswith("  "):
+            continue
+
+        if name.strip().startswith("yapping"):
+            times.update(dict.fromkeys(subtree, 0))
+            times[name.strip()] = int(cumulative)
+
+        subtree = []
+
+    return times
+
+
+def test_help_does_not_import_heavy_modules():
+    times = _yapping_import_times("--help")
+
+    assert "yapping.cli" in times
+    assert not set(LAZY_MODULES) & set(times)
+
+
+def test_help_import_time_is_within_budget():
+    times = _yapping_import_times("--help")
+
+    assert times["yapping.cli"] < STARTUP_BUDGET_US
+
+
+def test_cli_does_not_import_pip_tools():
+    # Unlike the time it takes, what the import loads does not vary.
+    proc = subprocess.run(
+        (
+            sys.executable,
+            "-c",
+            "import sys, yapping.cli; print(*sys.modules, sep='\\n')",
+        ),
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    modules = set(proc.stdout.split())
+
+    assert "yapping.cli" in modules
+    assert not {
+        module
+        for module in modules
+        if module.partition(".")[0] in HEAVY_MODULES or module in LAZY_MODULES
+    }
+
+
+def test_lockfile_commands_do_not_import_pip_tools(tmp_path):
+    lock = tmp_path / "requirements.txt"
+    lock.write_text("django==5.0\n")
+    times = _yapping_import_times("show", "django", "--lockfile", str(lock))
+
+    assert "yapping.explain" in times
+    assert not set(LAZY_MODULES) & set(times)
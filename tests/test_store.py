@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+from yapping import store
+
+PYPROJECT = """\
+[project]
+name = "{name}"
+version = "0.1.0"
+dependencies = {dependencies}
+
+[project.optional-dependencies]
+test = ["pytest", "{name}[extra]"]
+"""
+
+
+@pytest.fixture
+def project(tmp_path):
+    def _project(name, dependencies='["django"]'):
+        path = tmp_path / name / "pyproject.toml"
+        path.parent.mkdir()
+        path.write_text(PYPROJECT.format(name=name, dependencies=dependencies))
+
+        return str(path)
+
+    return _project
+
+
+def _key(pyproject, extra=None, args=(), python_versions=()):
+    return store.lock_key(pyproject, "requirements.txt", extra, args, python_versions)
+
+
+def test_lock_key_normalizes_the_requirements(project):
+    a = _key(project("svc-a", '["Django>=4,<6", "six ; python_version<\'3.12\'"]'))
+    b = _key(project("svc_b", '["six; python_version < \'3.12\'", "django <6, >=4"]'))
+
+    assert a.key == b.key
+    assert (a.project, b.project) == ("svc-a", "svc_b")
+
+
+def test_lock_key_leaves_the_project_out_of_its_extras(project):
+    assert _key(project("svc-a"), "test").key == _key(project("svc-b"), "test").key
+
+
+def test_lock_key_depends_on_the_inputs(project, monkeypatch):
+    pyproject = project("svc")
+    key = _key(pyproject).key
+
+    assert _key(project("other", '["flask"]')).key != key
+    assert _key(pyproject, "test").key != key
+    assert _key(pyproject, args=("--no-emit-index-url",)).key != key
+    assert _key(pyproject, python_versions=("3.11", "3.12")).key != key
+    assert store.lock_key(pyproject, "lock.txt", None, ()).key != key
+
+    monkeypatch.setenv("PIP_INDEX_URL", "https://example.com/simple")
+    assert _key(pyproject).key != key
+
+
+@pytest.mark.parametrize(
+    "patched",
+    (
+        ("sys.platform", "darwin"),
+        ("platform.machine", lambda: "arm64"),
+        ("sys.implementation.name", "pypy"),
+    ),
+)
+def test_lock_key_depends_on_the_platform(project, monkeypatch, patched):
+    pyproject = project("svc")
+    key = _key(pyproject).key
+    monkeypatch.setattr(*patched)
+
+    assert _key(pyproject).key != key
+
+
+def test_lock_key_keeps_invalid_requirements(project):
+    a = _key(project("a", '["-e ./lib"]'))
+
+    assert a.key == _key(project("b", '["-e ./lib"]')).key
+
+
+def test_lock_key_of_dynamic_dependencies(tmp_path):
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text('[project]\nname = "svc"\ndynamic = ["dependencies"]\n')
+
+    assert _key(str(pyproject)) is None
+
+
+def test_lock_key_of_dynamic_optional_dependencies(tmp_path):
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text(
+        '[project]\nname = "svc"\ndependencies = []\n'
+        'dynamic = ["optional-dependencies"]\n'
+    )
+
+    assert _key(str(pyproject)) is not None
+    assert _key(str(pyproject), "test") is None
+
+
+def test_publish_and_fetch(tmp_path):
+    lock = "django==5.0\n    # via svc-a (pyproject.toml)\n"
+    store.publish(str(tmp_path), store.StoreKey("abcdef", "svc-a"), lock)
+
+    assert os.listdir(tmp_path / "ab") == ["abcdef.txt"]
+    assert (tmp_path / "ab" / "abcdef.txt").read_text() == (
+        "django==5.0\n    # via {project} (pyproject.toml)\n"
+    )
+    assert store.fetch(str(tmp_path), store.StoreKey("abcdef", "svc-b")) == (
+        "django==5.0\n    # via svc-b (pyproject.toml)\n"
+    )
+    assert store.fetch(str(tmp_path), store.StoreKey("012345", "svc-b")) is None
+
+
+def test_publish_and_fetch_without_project_name(tmp_path):
+    key = store.StoreKey("abcdef", None)
+    store.publish(str(tmp_path), key, "django==5.0\n")
+
+    assert store.fetch(str(tmp_path), key) == "django==5.0\n"
@@ -0,0 +1,350 @@
+import json
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from yapping import sync
+from yapping.exceptions import YappingException
+from yapping.lockfile import LockedRequirement
+
+MARKERS = {
+    "implementation_name": "cpython",
+    "implementation_version": "3.12.1",
+    "os_name": "posix",
+    "platform_machine": "x86_64",
+    "platform_release": "6.1",
+    "platform_system": "Linux",
+    "platform_version": "1",
+    "python_full_version": "3.12.1",
+    "platform_python_implementation": "CPython",
+    "python_version": "3.12",
+    "sys_platform": "linux",
+}
+
+DJANGO = LockedRequirement("django", "5.0", "django==5.0 --hash=sha256:a", None)
+SIX = LockedRequirement("six", "1.17.0", "six==1.17.0 --hash=sha256:b", None)
+LEGACY = LockedRequirement(
+    "tomli", "2.0", "tomli==2.0 --hash=sha256:c", 'python_version < "3.11"'
+)
+
+
+MYLIB = LockedRequirement(
+    "mylib", "", "mylib @ file:///src/mylib", None, "file:///src/mylib"
+)
+TOOL = LockedRequirement("tool", "", "-e file:///src/tool", None, "file:///src/tool")
+
+
+def _environment(installed, requires=None, urls=None):
+    return sync.Environment(installed, requires or {}, MARKERS, urls or {})
+
+
+def test_target_python_prefers_the_virtual_env(monkeypatch):
+    monkeypatch.setenv("VIRTUAL_ENV", "/venv")
+    assert sync.target_python() == "/venv/bin/python"
+
+    monkeypatch.delenv("VIRTUAL_ENV")
+    assert sync.target_python() == sys.executable
+
+
+def test_inspect_the_running_interpreter():
+    environment = sync.inspect(sys.executable)
+
+    assert "pytest" in environment.installed
+    assert "pluggy" in environment.requires["pytest"]
+    assert environment.markers["python_version"] == (
+        f"{sys.version_info.major}.{sys.version_info.minor}"
+    )
+
+
+def test_inspect_normalizes_names():
+    output = json.dumps(
+        {
+            "installed": {
+                "Django": ["5.0", ["asgiref>=3.7", "sqlparse; os_name"], None],
+                "My_Lib": ["1.0", [], "file:///src/mylib"],
+            },
+            "environment": MARKERS,
+        }
+    )
+
+    with patch("yapping.sync._run", return_value=output):
+        environment = sync.inspect("python")
+
+    assert environment == sync.Environment(
+        {"django": "5.0", "my-lib": "1.0"},
+        {"django": {"asgiref", "sqlparse"}, "my-lib": set()},
+        MARKERS,
+        {"my-lib": "file:///src/mylib"},
+    )
+
+
+def test_inspect_finds_where_projects_were_installed_from(tmp_path):
+    def _dist(name, direct_url=None):
+        dist_info = tmp_path / f"{name}-1.0.dist-info"
+        dist_info.mkdir()
+        (dist_info / "METADATA").write_text(f"Name: {name}\nVersion: 1.0\n")
+
+        if direct_url is not None:
+            (dist_info / "direct_url.json").write_text(json.dumps(direct_url))
+
+    _dist("plain")
+    _dist("local", {"url": "file:///src/local", "dir_info": {"editable": True}})
+    _dist(
+        "pinned",
+        {
+            "url": "https://example.com/pinned.git",
+            "vcs_info": {"vcs": "git", "requested_revision": "v1", "commit_id": "a"},
+        },
+    )
+    _dist(
+        "tip",
+        {"url": "https://example.com/tip.git", "vcs_info": {"vcs": "git"}},
+    )
+    script = f"import sys\nsys.path.insert(0, {str(tmp_path)!r})\n"
+
+    with patch("yapping.sync.INSPECT_SCRIPT", script + sync.INSPECT_SCRIPT):
+        environment = sync.inspect(sys.executable)
+
+    assert environment.urls["local"] == "file:///src/local"
+    assert environment.urls["pinned"] == "git+https://example.com/pinned.git@v1"
+    assert environment.urls["tip"] == "git+https://example.com/tip.git"
+    assert "plain" not in environment.urls
+
+
+def test_inspect_reports_errors():
+    error = subprocess.CalledProcessError(1, "python", stderr="no such file\n")
+
+    with (
+        patch("subprocess.run", side_effect=error),
+        pytest.raises(YappingException, match="^no such file$"),
+    ):
+        sync.inspect("python")
+
+
+def test_read_locks(tmp_path):
+    main = tmp_path / "requirements.txt"
+    main.write_text("django==5.0\nsix==1.17.0\n")
+    test = tmp_path / "test-requirements.txt"
+    test.write_text("django==5.0\npytest==8.0\n")
+
+    requirements = sync.read_locks([str(main), str(test)])
+
+    assert [(req.name, req.version) for req in requirements] == [
+        ("django", "5.0"),
+        ("six", "1.17.0"),
+        ("pytest", "8.0"),
+    ]
+
+
+def test_read_locks_rejects_conflicting_pins(tmp_path):
+    main = tmp_path / "requirements.txt"
+    main.write_text("django==5.0\n")
+    test = tmp_path / "test-requirements.txt"
+    test.write_text("Django==4.2\n")
+
+    with pytest.raises(YappingException, match="django is locked to 5.0 in"):
+        sync.read_locks([str(main), str(test)])
+
+
+def test_read_locks_names_editable_requirements(tmp_path):
+    project = tmp_path / "tool"
+    project.mkdir()
+    (project / "pyproject.toml").write_text('[project]\nname = "My_Tool"\n')
+    lock = tmp_path / "requirements.txt"
+    lock.write_text(
+        f"-e {project.as_uri()}\n"
+        "-e file:///src/setup-py-only\n"
+        "-e git+https://example.com/tool.git\n"
+    )
+
+    assert [req.name for req in sync.read_locks([str(lock)])] == [
+        "my-tool",
+        "file:///src/setup-py-only",
+        "git+https://example.com/tool.git",
+    ]
+
+
+def test_read_locks_rejects_conflicting_urls(tmp_path):
+    main = tmp_path / "requirements.txt"
+    main.write_text("mylib @ file:///src/mylib\n")
+    test = tmp_path / "test-requirements.txt"
+    test.write_text("mylib==1.0\n")
+
+    with pytest.raises(
+        YappingException, match="mylib is locked to file:///src/mylib in .* to 1.0"
+    ):
+        sync.read_locks([str(main), str(test)])
+
+
+def test_project_name(setup_file, tmp_path):
+    assert sync.project_name(str(setup_file)) == "awesome-python-project"
+    assert sync.project_name(str(tmp_path / "missing.toml")) is None
+
+
+def test_plan_nothing_to_do():
+    environment = _environment({"django": "5.0", "six": "1.17", "pip": "24.0"})
+
+    assert sync.plan([DJANGO, SIX, LEGACY], environment) == sync.Plan([], [])
+
+
+def test_plan_installs_missing_and_mismatched_pins():
+    environment = _environment({"django": "4.2", "tomli": "1.0"})
+
+    assert sync.plan([DJANGO, SIX, LEGACY], environment) == sync.Plan(
+        [DJANGO, SIX], ["tomli"]
+    )
+
+
+def test_plan_compares_invalid_versions_as_text():
+    odd = LockedRequirement("odd", "not-a-version", "odd==not-a-version", None)
+
+    assert sync.plan([odd], _environment({"odd": "not-a-version"})).install == []
+    assert sync.plan([odd], _environment({"odd": "other"})).install == [odd]
+
+
+def test_plan_direct_references_and_editables():
+    environment = _environment(
+        {"mylib": "1.0", "tool": "0.1", "my-tool": "0.2"},
+        urls={"mylib": "file:///src/mylib", "my-tool": "file:///src/tool"},
+    )
+
+    assert sync.plan([MYLIB, TOOL], environment) == sync.Plan([], [])
+    assert sync.plan([MYLIB], environment) == sync.Plan([], ["my-tool", "tool"])
+
+    environment = _environment({"mylib": "1.0"}, urls={"mylib": "file:///old"})
+
+    assert sync.plan([MYLIB, TOOL], environment) == sync.Plan([MYLIB, TOOL], [])
+
+
+def test_plan_keeps_tools_and_what_they_need():
+    environment = _environment(
+        {
+            "pip-tools": "7.0",
+            "click": "8.0",
+            "build": "1.0",
+            "packaging": "24.0",
+            "my-project": "0.1",
+            "attrs": "23.0",
+        },
+        {
+            "pip-tools": {"click", "build"},
+            "build": {"packaging", "pip-tools"},
+            "my-project": {"attrs"},
+        },
+    )
+
+    assert sync.plan([], environment, keep=["My_Project"]) == sync.Plan([], [])
+    assert sync.plan([], environment).uninstall == ["attrs", "my-project"]
+
+
+def test_install_downloads_in_parallel_then_installs_once():
+    commands = []
+
+    def _run(cmd, **kwargs):
+        requirements = cmd[-1].removeprefix("--requirement=")
+
+        with open(requirements) as f:
+            commands.append((cmd[4], f.read()))
+
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    with patch("subprocess.run", side_effect=_run) as m_run:
+        sync.install("python", [DJANGO, SIX, LEGACY], jobs=2)
+
+    assert sorted(commands) == [
+        ("download", "django==5.0 --hash=sha256:a\n" + LEGACY.line + "\n"),
+        ("download", "six==1.17.0 --hash=sha256:b\n"),
+        ("install", f"{DJANGO.line}\n{SIX.line}\n{LEGACY.line}\n"),
+    ]
+    install = m_run.call_args.args[0]
+    assert install[:5] == (
+        "python",
+        "-m",
+        "pip",
+        "--disable-pip-version-check",
+        "install",
+    )
+    assert install[5:] == (
+        "--quiet",
+        "--no-deps",
+        "--require-hashes",
+        "--no-index",
+        f"--find-links={install[-2].removeprefix('--find-links=')}",
+        install[-1],
+    )
+    assert install[-2].endswith("downloads")
+
+
+def test_install_uses_the_cache_dir():
+    with patch("subprocess.run") as m_run:
+        sync.install("python", [SIX, MYLIB], jobs=1, cache_dir="/cache")
+
+    download, install, install_direct = (call.args[0] for call in m_run.call_args_list)
+    for cmd, action in (
+        (download, "download"),
+        (install, "install"),
+        (install_direct, "install"),
+    ):
+        assert cmd[:6] == (
+            "python",
+            "-m",
+            "pip",
+            "--disable-pip-version-check",
+            "--cache-dir=/cache",
+            action,
+        )
+
+
+def test_install_direct_references_without_hashes():
+    commands = []
+
+    def _run(cmd, **kwargs):
+        with open(cmd[-1].removeprefix("--requirement=")) as f:
+            commands.append((cmd[4:-1], f.read()))
+
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    with patch("subprocess.run", side_effect=_run):
+        sync.install("python", [MYLIB, SIX, TOOL], jobs=2)
+
+    assert commands[-1] == (
+        ("install", "--quiet", "--no-deps"),
+        f"{MYLIB.line}\n{TOOL.line}\n",
+    )
+    assert [command[1] for command in commands[:-1]] == [SIX.line + "\n"] * 2
+
+    commands.clear()
+
+    with patch("subprocess.run", side_effect=_run):
+        sync.install("python", [TOOL], jobs=2)
+
+    assert commands == [(("install", "--quiet", "--no-deps"), f"{TOOL.line}\n")]
+
+
+def test_uninstall():
+    with patch("subprocess.run") as m_run:
+        sync.uninstall("python", ["attrs", "six"])
+
+    assert m_run.call_args.args[0] == (
+        "python",
+        "-m",
+        "pip",
+        "--disable-pip-version-check",
+        "uninstall",
+        "--quiet",
+        "--yes",
+        "attrs",
+        "six",
+    )
+
+
+def test_read_locks_of_the_python_version(tmp_path):
+    lock = tmp_path / "requirements.txt"
+    lock.write_text(
+        'django==4.2 ; python_version == "3.11"\n'
+        'django==5.0 ; python_version == "3.12"\n'
+    )
+
+    assert [req.version for req in sync.read_locks([str(lock)], MARKERS)] == ["5.0"]
@@ -0,0 +1,83 @@
+import io
+import json
+
+import pytest
+
+from yapping import timings
+
+
+@pytest.fixture(autouse=True)
+def _disable_timings():
+    yield
+    timings.disable()
+
+
+def test_span_is_not_recorded_when_disabled():
+    with timings.span("read config"):
+        pass
+
+    timings.record("compile", 0.0, 1.0)
+
+    assert timings.spans() == []
+
+
+def test_span_records_name_thread_and_args():
+    timings.enable()
+
+    with timings.span("hash", package="six==1.17.0"):
+        pass
+
+    (span,) = timings.spans()
+
+    assert span.name == "hash"
+    assert span.duration >= 0
+    assert span.thread_name == "MainThread"
+    assert span.args == {"package": "six==1.17.0"}
+
+
+def test_span_is_recorded_when_the_block_raises():
+    timings.enable()
+
+    with pytest.raises(ValueError), timings.span("compile"):
+        raise ValueError
+
+    assert [span.name for span in timings.spans()] == ["compile"]
+
+
+def test_print_summary_adds_up_phases():
+    timings.enable(origin=0.0)
+    timings.record("hash", 1.0, 1.5)
+    timings.record("hash", 2.0, 2.25)
+    timings.record("compile", 0.5, 3.0)
+    output = io.StringIO()
+
+    timings.print_summary(output)
+
+    assert output.getvalue() == (
+        "yap timings:\n"
+        "  hash          750.0 ms  (2 calls)\n"
+        "  compile      2500.0 ms\n"
+    )
+
+
+def test_write_trace_writes_chrome_trace_events(tmp_path):
+    timings.enable(origin=1.0)
+    timings.record("compile", 1.5, 2.0, lockfile="requirements.txt")
+    trace = tmp_path / "trace.json"
+
+    timings.write_trace(str(trace))
+
+    events = json.loads(trace.read_text())["traceEvents"]
+
+    assert events[0] == {
+        "name": "compile",
+        "cat": "yap",
+        "ph": "X",
+        "ts": 500000.0,
+        "dur": 500000.0,
+        "pid": events[0]["pid"],
+        "tid": events[0]["tid"],
+        "args": {"lockfile": "requirements.txt"},
+    }
+    assert events[1]["ph"] == "M"
+    assert events[1]["args"] == {"name": "MainThread"}
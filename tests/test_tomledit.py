@@ -0,0 +1,298 @@
+import copy
+import tomllib
+from unittest.mock import patch as patch_value
+
+import pytest
+import tomli_w
+
+from yapping.tomledit import patch
+from yapping.tomledit import scan
+from yapping.tomledit import Unsupported
+from yapping.tomledit import update
+
+PYPROJECT = """\
+# The project
+[project]
+name = "awesome-python-project"
+version = '0.1.0'  # bumped by yap
+dependencies = [
+    "django",  # web framework
+    # serializers
+    "djangorestframework",
+    'pip-tools',
+    # more to come
+]
+
+[project.optional-dependencies]
+test = ["pytest", "pytest-cov"]
+
+[tool.black]
+line-length = 99
+"""
+
+
+def _patched(text, edit):
+    old = tomllib.loads(text)
+    new = copy.deepcopy(old)
+    edit(new)
+
+    return patch(text, old, new)
+
+
+def test_patch_keeps_comments_and_formatting():
+    def _(data):
+        data["project"]["version"] = "0.2.0"
+        data["project"]["dependencies"] = ["attrs", "django", "pip-tools"]
+
+    assert _patched(PYPROJECT, _) == PYPROJECT.replace("'0.1.0'", "'0.2.0'").replace(
+        """    "django",  # web framework
+    # serializers
+    "djangorestframework",
+""",
+        """    "attrs",
+    "django",  # web framework
+""",
+    )
+
+
+def test_patch_keeps_the_comments_of_a_replaced_entry():
+    text = (
+        "[project]\n"
+        "dependencies = [\n"
+        "    # web\n"
+        '    "django",  # the framework\n'
+        '    "six",\n'
+        "]\n"
+    )
+
+    def _(data):
+        data["project"]["dependencies"] = ["Django>=5", "six"]
+
+    assert _patched(text, _) == text.replace('"django"', '"Django>=5"')
+
+
+def test_patch_keeps_the_comments_of_a_moved_entry():
+    text = (
+        "[project]\n"
+        "dependencies = [\n"
+        '    "beta<3",  # pinned: CVE-2024-0001\n'
+        '    "delta",\n'
+        "]\n"
+    )
+
+    def _(data):
+        data["project"]["dependencies"] = ["aaa", "beta<2.5", "delta"]
+
+    assert _patched(text, _) == (
+        "[project]\n"
+        "dependencies = [\n"
+        '    "aaa",\n'
+        '    "beta<2.5",  # pinned: CVE-2024-0001\n'
+        '    "delta",\n'
+        "]\n"
+    )
+
+
+def test_patch_drops_the_comments_of_a_removed_entry():
+    text = (
+        "[project]\n"
+        "dependencies = [\n"
+        '    "django<5",  # pinned for LTS\n'
+        '    "six",\n'
+        "]\n"
+    )
+
+    def _(data):
+        data["project"]["dependencies"] = ["attrs", "six"]
+
+    assert _patched(text, _) == text.replace(
+        '"django<5",  # pinned for LTS', '"attrs",'
+    )
+
+
+def test_patch_single_line_array():
+    def _(data):
+        data["project"]["optional-dependencies"]["test"] = ["pytest", "xdist"]
+
+    assert _patched(PYPROJECT, _) == PYPROJECT.replace(
+        '["pytest", "pytest-cov"]', '["pytest", "xdist"]'
+    )
+
+
+def test_patch_empty_array():
+    def _(data):
+        data["project"]["dependencies"] = []
+        data["project"]["optional-dependencies"]["test"] = []
+
+    patched = _patched(PYPROJECT, _)
+
+    assert "dependencies = [\n    # more to come\n]\n" in patched
+    assert "test = []\n" in patched
+
+
+def test_patch_adds_key_to_existing_table():
+    def _(data):
+        data["project"]["optional-dependencies"]["docs"] = ["sphinx"]
+
+    assert _patched(PYPROJECT, _) == PYPROJECT.replace(
+        '"pytest-cov"]\n', '"pytest-cov"]\ndocs = [\n    "sphinx",\n]\n'
+    )
+
+
+def test_patch_adds_table_after_its_parent():
+    text = '[project]\nname = "foo"\n\n[tool.black]\nline-length = 99\n'
+
+    def _(data):
+        data["project"]["optional-dependencies"] = {"docs": ["sphinx"], "lint": []}
+
+    assert _patched(text, _) == (
+        '[project]\nname = "foo"\n\n'
+        "[project.optional-dependencies]\n"
+        'docs = [\n    "sphinx",\n]\n'
+        "lint = []\n"
+        "\n[tool.black]\nline-length = 99\n"
+    )
+
+
+def test_patch_adds_table_to_a_document_without_tables():
+    def _(data):
+        data["project"] = {"dependencies": ["django"]}
+
+    assert _patched('name = "foo"', _) == (
+        'name = "foo"\n\n[project]\ndependencies = [\n    "django",\n]\n'
+    )
+
+
+def test_patch_adds_dotted_key_next_to_dotted_keys():
+    text = '[project]\noptional-dependencies.test = ["pytest"]\n'
+
+    def _(data):
+        data["project"]["optional-dependencies"]["docs"] = ["sphinx"]
+
+    assert (
+        _patched(text, _) == text + 'optional-dependencies.docs = [\n    "sphinx",\n]\n'
+    )
+
+
+def test_patch_indents_like_the_first_entry():
+    text = '[project]\ndependencies = [\n\n\t"django",\n  ]\n'
+
+    def _(data):
+        data["project"]["dependencies"].append("flask")
+
+    assert _patched(text, _) == (
+        '[project]\ndependencies = [\n\t"django",\n\t"flask",\n  ]\n'
+    )
+
+
+def test_patch_keeps_crlf_newlines():
+    text = '[project]\r\ndependencies = [\r\n  "django",\r\n]\r\n'
+
+    def _(data):
+        data["project"]["dependencies"].append("flask")
+
+    assert _patched(text, _) == (
+        '[project]\r\ndependencies = [\r\n  "django",\r\n  "flask",\r\n]\r\n'
+    )
+
+
+@pytest.mark.parametrize(
+    "edit",
+    (
+        pytest.param(lambda data: data["project"].pop("name"), id="removed key"),
+        pytest.param(lambda data: data["project"].update(version=1), id="not a string"),
+        pytest.param(
+            lambda data: data["project"].update(dependencies=[1]),
+            id="not an array of strings",
+        ),
+        pytest.param(
+            lambda data: data["project"].update(name={"a": "b"}), id="changed type"
+        ),
+        pytest.param(
+            lambda data: data["tool"]["black"].update({"line-length": 88}),
+            id="integer",
+        ),
+    ),
+)
+def test_patch_unsupported_changes(edit):
+    with pytest.raises(Unsupported):
+        _patched(PYPROJECT, edit)
+
+
+def test_patch_rejects_results_that_do_not_match():
+    text = "[project]\noptional-dependencies = {}\n"
+
+    def _(data):
+        data["project"]["optional-dependencies"]["docs"] = ["sphinx"]
+
+    with pytest.raises(Unsupported):
+        _patched(text, _)
+
+
+def test_patch_checks_the_patched_document():
+    def _(data):
+        data["project"]["version"] = "0.2.0"
+
+    with (
+        patch_value("yapping.tomledit.format_string", return_value='"0.3.0"'),
+        pytest.raises(Unsupported),
+    ):
+        _patched(PYPROJECT, _)
+
+
+def test_update_falls_back_to_a_full_dump():
+    text = "[project]\nversion = '1'\nrelease = 1\n"
+    old = tomllib.loads(text)
+    new = {"project": {"version": "1", "release": 2}}
+
+    assert update(text, old, new) == tomli_w.dumps(new)
+
+
+def test_update_patches_in_place():
+    text = "[project]\nversion = '1'  # keep\n"
+
+    assert update(text, tomllib.loads(text), {"project": {"version": "2"}}) == (
+        "[project]\nversion = '2'  # keep\n"
+    )
+
+
+def test_scan_finds_values_and_tables():
+    text = (
+        'title = "x"\n'
+        "[a . 'b c']\n"
+        '"d.e" = """multi\nline"""""\n'
+        "f = '''raw\\'''' # comment\n"
+        'g = { h = [1, 2], i = "j" }\n'
+        "k = 1979-05-27 07:32:00Z\n"
+        "[[m]]\n"
+        "n = 1\n"
+    )
+
+    document = scan(text)
+
+    assert list(document.values) == [
+        ("title",),
+        ("a", "b c", "d.e"),
+        ("a", "b c", "f"),
+        ("a", "b c", "g"),
+        ("a", "b c", "k"),
+    ]
+    start, end = document.values[("a", "b c", "k")]
+    assert text[start:end] == "1979-05-27 07:32:00Z"
+    assert list(document.table_ends) == [(), ("a", "b c")]
+
+
+@pytest.mark.parametrize(
+    "text",
+    (
+        'a = "unterminated\n',
+        "a = [1, 2\n",
+        "a = \n",
+        "[a\n",
+        "= 1\n",
+        'a = "x\\',
+    ),
+)
+def test_scan_unsupported_documents(text):
+    with pytest.raises(Unsupported):
+        scan(text)
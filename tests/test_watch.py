@@ -0,0 +1,407 @@
+import contextlib
+import pathlib
+import signal
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+
+from yapping import locking
+from yapping.commands import CompileOptions
+from yapping.exceptions import CompileError
+from yapping.watch import _cancel
+from yapping.watch import _compile_in_child
+from yapping.watch import _exit
+from yapping.watch import _start
+from yapping.watch import affected_locks
+from yapping.watch import compile_lock
+from yapping.watch import dependency_tables
+from yapping.watch import InotifyWatcher
+from yapping.watch import Lock
+from yapping.watch import make_watcher
+from yapping.watch import PollingWatcher
+from yapping.watch import watch
+
+MAIN = Lock(None, "requirements.txt")
+TEST = Lock("test", "test-requirements.txt")
+DOCS = Lock("docs", "docs-requirements.txt")
+
+TABLES = {
+    "requires-python": ">=3.11",
+    "dependencies": ["django"],
+    "optional-dependencies": {"test": ["pytest"], "docs": ["sphinx"]},
+}
+
+
+class FakeWatcher:
+    """Replays `events`: True for a change, False for a timeout, or an edit."""
+
+    def __init__(self, events, stop):
+        self.events = list(events)
+        self.stop = stop
+        self.closed = False
+
+    def wait(self, timeout):
+        if not self.events:
+            self.stop.set()
+            return False
+
+        event = self.events.pop(0)
+
+        if callable(event):
+            event()
+            return True
+
+        return event
+
+    def close(self):
+        self.closed = True
+
+
+def _process(alive=False, exitcode=0):
+    process = MagicMock()
+    process.is_alive.return_value = alive
+    process.exitcode = exitcode
+
+    return process
+
+
+def _watch(setup_file, events, processes, locks=(MAIN, TEST, DOCS)):
+    stop = threading.Event()
+    watcher = FakeWatcher(events, stop)
+    log = []
+
+    with (
+        patch("yapping.watch._start", side_effect=processes) as m_start,
+        # The fake processes have no process group, they are terminated.
+        patch("os.killpg", side_effect=ProcessLookupError),
+    ):
+        watch(str(setup_file), locks, CompileOptions(), watcher, 0.1, stop, log.append)
+
+    assert watcher.closed
+    started = [call.args[1] for call in m_start.call_args_list]
+
+    return started, log
+
+
+def _edit(path, old, new):
+    def _():
+        path.write_text(path.read_text().replace(old, new))
+
+    return _
+
+
+def test_polling_watcher_detects_changes(tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text("a")
+    watcher = PollingWatcher(str(path), interval=0.01)
+
+    assert not watcher.wait(0)
+    assert not watcher.wait(0.02)
+
+    path.write_text("ab")
+    assert watcher.wait(1)
+
+    path.unlink()
+    assert watcher.wait(None)
+
+    watcher.close()
+
+
+def test_polling_watcher_waits_without_timeout(tmp_path):
+    path = tmp_path / "pyproject.toml"
+    watcher = PollingWatcher(str(path), interval=0.01)
+
+    with patch("yapping.watch.time.sleep", side_effect=lambda _: path.write_text("a")):
+        assert watcher.wait(None)
+
+
+def test_inotify_watcher_detects_changes(tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text("a")
+    watcher = InotifyWatcher(str(path))
+
+    try:
+        assert not watcher.wait(0)
+
+        (tmp_path / "other.toml").write_text("a")
+        assert not watcher.wait(0.01)
+
+        path.write_text("b")
+        assert watcher.wait(1)
+
+        (tmp_path / "new.toml").write_text("c")
+        (tmp_path / "new.toml").replace(path)
+        assert watcher.wait(None)
+    finally:
+        watcher.close()
+
+
+@pytest.mark.parametrize(
+    ("init", "add_watch"), ((-1, 1), (3, -1)), ids=("init", "add watch")
+)
+def test_inotify_watcher_errors(init, add_watch):
+    libc = MagicMock()
+    libc.inotify_init1.return_value = init
+    libc.inotify_add_watch.return_value = add_watch
+
+    with (
+        patch("yapping.watch.ctypes.CDLL", return_value=libc),
+        patch("yapping.watch.os.close") as m_close,
+        pytest.raises(OSError),
+    ):
+        InotifyWatcher("pyproject.toml")
+
+    assert m_close.call_count == (init >= 0)
+
+
+def test_make_watcher(tmp_path):
+    path = str(tmp_path / "pyproject.toml")
+
+    assert isinstance(make_watcher(path, poll=True), PollingWatcher)
+
+    watcher = make_watcher(path)
+    assert isinstance(watcher, InotifyWatcher)
+    watcher.close()
+
+    with patch("yapping.watch.InotifyWatcher", side_effect=AttributeError):
+        assert isinstance(make_watcher(path), PollingWatcher)
+
+
+def test_dependency_tables(setup_file):
+    tables = dependency_tables(str(setup_file))
+
+    assert tables is not None
+    assert tables["requires-python"] == ">=3.14.1"
+    assert tables["dependencies"][0] == "django"
+    assert list(tables["optional-dependencies"]) == ["test"]
+
+
+@pytest.mark.parametrize("text", ("[project", "[tool.yap]\n"))
+def test_dependency_tables_unreadable(tmp_path, text):
+    path = tmp_path / "pyproject.toml"
+    path.write_text(text)
+
+    assert dependency_tables(str(path)) is None
+    assert dependency_tables(str(tmp_path / "missing.toml")) is None
+
+
+@pytest.mark.parametrize(
+    ("change", "expected"),
+    (
+        ({}, []),
+        ({"dependencies": ["flask"]}, [MAIN, TEST, DOCS]),
+        ({"requires-python": ">=3.12"}, [MAIN, TEST, DOCS]),
+        ({"optional-dependencies": {"test": ["pytest"]}}, [DOCS]),
+        ({"optional-dependencies": {"test": [], "docs": ["sphinx"]}}, [TEST]),
+    ),
+)
+def test_affected_locks(change, expected):
+    assert affected_locks(TABLES, {**TABLES, **change}, [MAIN, TEST, DOCS]) == expected
+
+
+def test_compile_lock():
+    with (
+        patch("yapping.watch.commands.compile_dependencies") as m_compile,
+        patch("yapping.watch.commands.compile_test_dependencies") as m_compile_test,
+    ):
+        compile_lock("pyproject.toml", MAIN, CompileOptions())
+        compile_lock("pyproject.toml", TEST, CompileOptions())
+
+    m_compile.assert_called_once_with("pyproject.toml", options=CompileOptions())
+    m_compile_test.assert_called_once_with(
+        "pyproject.toml", "test", "test-requirements.txt", options=CompileOptions()
+    )
+
+
+def test_compile_lock_takes_the_project_lock(tmp_path, capsys):
+    pyproject = str(tmp_path / "pyproject.toml")
+
+    with (
+        locking.project_lock(str(tmp_path)),
+        patch("yapping.watch.commands.compile_dependencies") as m_compile,
+        pytest.raises(SystemExit),
+    ):
+        compile_lock(pyproject, MAIN, CompileOptions(lock_timeout=0))
+
+    m_compile.assert_not_called()
+    assert "Another yap command is running in" in capsys.readouterr().err
+
+
+def test_compile_lock_failure(capsys):
+    with (
+        patch(
+            "yapping.watch.commands.compile_dependencies",
+            side_effect=CompileError("resolution failed"),
+        ),
+        pytest.raises(SystemExit) as exc_info,
+    ):
+        compile_lock("pyproject.toml", MAIN, CompileOptions())
+
+    assert exc_info.value.code == 1
+    assert capsys.readouterr().err == "resolution failed\n"
+
+
+def test_start():
+    with patch("yapping.watch.multiprocessing.Process") as m_process:
+        process = _start("pyproject.toml", MAIN, CompileOptions())
+
+    m_process.assert_called_once_with(
+        target=_compile_in_child,
+        args=("pyproject.toml", MAIN, CompileOptions()),
+        daemon=True,
+    )
+    process.start.assert_called_once_with()
+
+
+def test_compile_in_child():
+    with (
+        patch("os.setpgrp") as m_setpgrp,
+        patch("signal.signal") as m_signal,
+        patch("yapping.watch.compile_lock") as m_compile_lock,
+    ):
+        _compile_in_child("pyproject.toml", MAIN, CompileOptions())
+
+    m_setpgrp.assert_called_once_with()
+    m_signal.assert_called_once_with(signal.SIGTERM, _exit)
+    m_compile_lock.assert_called_once_with("pyproject.toml", MAIN, CompileOptions())
+
+    with pytest.raises(SystemExit) as exc_info:
+        _exit(signal.SIGTERM, None)
+
+    assert exc_info.value.code == 128 + signal.SIGTERM
+
+
+def test_cancel_a_process_without_its_group():
+    process = MagicMock(pid=123)
+
+    with patch("os.killpg", side_effect=ProcessLookupError) as m_killpg:
+        _cancel(process)
+
+    m_killpg.assert_called_once_with(123, signal.SIGTERM)
+    process.terminate.assert_called_once_with()
+
+
+def _running(pid):
+    stat = ""
+
+    # Gone once it has been waited for.
+    with contextlib.suppress(FileNotFoundError):
+        stat = pathlib.Path(f"/proc/{pid}/stat").read_text()
+
+    # A zombie has exited, it waits for its parent to notice.
+    return bool(stat) and stat.rpartition(")")[2].split()[0] != "Z"
+
+
+def test_cancel_cleans_up_and_stops_pip_compile(tmp_path):
+    temporary = tmp_path / ".requirements.txt.tmp"
+    started = tmp_path / "started"
+
+    def _compile(pyproject_filename, options):  # pragma: no cover (in the child)
+        temporary.write_text("")
+
+        try:
+            child = subprocess.Popen((sys.executable, "-c", "input()"))
+            started.write_text(str(child.pid))
+            child.wait()
+        finally:
+            temporary.unlink()
+
+    with patch("yapping.watch.commands.compile_dependencies", side_effect=_compile):
+        process = _start(str(tmp_path / "pyproject.toml"), MAIN, CompileOptions())
+
+    while not started.exists() or not started.read_text():  # pragma: no cover
+        time.sleep(0.01)
+
+    _cancel(process)
+    process.join()
+
+    assert process.exitcode == 128 + signal.SIGTERM
+    assert not temporary.exists()
+
+    pid = int(started.read_text())
+    deadline = time.monotonic() + 5
+
+    while _running(pid):  # pragma: no cover (timing dependent)
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_watch_compiles_affected_locks(setup_file):
+    events = [
+        _edit(setup_file, '"pytest-cov"', '"pytest-xdist"'),
+        _edit(setup_file, '"pytest"', '"pytest>=8"'),
+        False,
+        False,
+    ]
+
+    started, log = _watch(
+        setup_file, events, [_process() for _ in range(3)], (MAIN, TEST)
+    )
+
+    assert started == [MAIN, TEST, TEST]
+    assert log == [
+        "yap: compiling requirements.txt",
+        "yap: compiling test-requirements.txt",
+        "yap: compiled requirements.txt in 0.0s",
+        "yap: compiled test-requirements.txt in 0.0s",
+        "yap: compiling test-requirements.txt",
+        "yap: compiled test-requirements.txt in 0.0s",
+    ]
+
+
+def test_watch_restarts_cancelled_compiles(setup_file):
+    running = _process(alive=True)
+    processes = [running, _process(exitcode=1), _process(), _process()]
+    events = [_edit(setup_file, '"pip-tools"', '"pip-tools", "attrs"'), False]
+
+    started, log = _watch(setup_file, events, processes, (MAIN, TEST))
+
+    assert started == [MAIN, TEST, MAIN, TEST]
+    running.terminate.assert_called_once_with()
+    assert log == [
+        "yap: compiling requirements.txt",
+        "yap: compiling test-requirements.txt",
+        "yap: failed to compile test-requirements.txt",
+        "yap: cancelled requirements.txt",
+        "yap: compiling requirements.txt",
+        "yap: compiling test-requirements.txt",
+        "yap: compiled requirements.txt in 0.0s",
+        "yap: compiled test-requirements.txt in 0.0s",
+    ]
+
+
+def test_watch_stops_running_compiles(setup_file):
+    processes = [_process(alive=True)]
+
+    _watch(setup_file, [], processes, (MAIN,))
+
+    processes[0].terminate.assert_called_once_with()
+    processes[0].join.assert_called_once_with()
+
+
+def test_watch_waits_for_a_readable_file(setup_file):
+    text = setup_file.read_text()
+    setup_file.write_text("[project")
+    events = [
+        False,
+        lambda: None,
+        False,
+        lambda: setup_file.write_text(text),
+        False,
+    ]
+
+    started, log = _watch(setup_file, events, [_process(), _process()], (MAIN,))
+
+    assert started == [MAIN, MAIN]
+    assert log == [
+        "yap: compiling requirements.txt",
+        "yap: compiled requirements.txt in 0.0s",
+        f"yap: cannot read {setup_file}, waiting for a fix",
+        "yap: compiling requirements.txt",
+        "yap: compiled requirements.txt in 0.0s",
+    ]
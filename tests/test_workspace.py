@@ -0,0 +1,226 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from yapping import locking
+from yapping.exceptions import CompileError
+from yapping.options import CompileOptions
+from yapping.workspace import compile_workspace
+from yapping.workspace import find_projects
+from yapping.workspace import ProjectResult
+from yapping.workspace import Status
+from yapping.workspace import workspace_patterns
+
+PYPROJECT = """\
+[project]
+name = "{name}"
+version = "0.1.0"
+dependencies = {dependencies}
+"""
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "pyproject.toml").write_text(
+        '[tool.yapping.workspace]\nmembers = ["services/*"]\nexclude = ["services/old"]\n'
+    )
+
+    for name, dependencies in (
+        ("a", '["django"]'),
+        ("b", '["django"]'),
+        ("c", '["flask"]'),
+        ("old", '["django"]'),
+    ):
+        project = tmp_path / "services" / name
+        project.mkdir(parents=True)
+        (project / "pyproject.toml").write_text(
+            PYPROJECT.format(name=f"svc-{name}", dependencies=dependencies)
+        )
+
+    (tmp_path / "services" / "README.md").touch()
+
+    return tmp_path
+
+
+def _fake_compile(pyproject_filename, *args, options):
+    with open("pyproject.toml") as f:
+        name = f.read().split('"')[1]
+
+    with open("requirements.txt", "w") as f:
+        f.write(f"django==5.0\n    # via {name} (pyproject.toml)\n")
+
+    with open("compiled.log", "a") as f:
+        f.write("main\n")
+
+
+def test_workspace_patterns(workspace):
+    assert workspace_patterns("pyproject.toml") == (["services/*"], ["services/old"])
+
+
+def test_find_projects(workspace):
+    assert find_projects(["services/*"], ["services/old"]) == [
+        os.path.join("services", "a"),
+        os.path.join("services", "b"),
+        os.path.join("services", "c"),
+    ]
+
+
+def test_find_projects_accepts_pyproject_paths(workspace):
+    assert find_projects(["services/c/pyproject.toml", "pyproject.toml"]) == [
+        ".",
+        os.path.join("services", "c"),
+    ]
+
+
+def test_compile_workspace_resolves_identical_requirements_once(workspace):
+    projects = find_projects(["services/*"], ["services/old"])
+    (workspace / "services/b/requirements.txt").write_text("django==4.2\n")
+
+    with (
+        patch("yapping.commands.compile_dependencies", side_effect=_fake_compile),
+        patch("yapping.commands.compile_test_dependencies"),
+    ):
+        results = compile_workspace(
+            projects, "test", "test-requirements.txt", CompileOptions(), jobs=1
+        )
+
+    assert [(result.project, result.status) for result in results] == [
+        (projects[0], Status.COMPILED),
+        (projects[1], Status.DEDUPLICATED),
+        (projects[2], Status.COMPILED),
+    ]
+    assert (workspace / "services/b/requirements.txt").read_text() == (
+        "django==5.0\n    # via svc-b (pyproject.toml)\n"
+    )
+
+
+def test_compile_workspace_does_not_rewrite_identical_locks(workspace):
+    projects = find_projects(["services/a", "services/b"])
+    options = CompileOptions(force=True)
+
+    with (
+        patch("yapping.commands.compile_dependencies", side_effect=_fake_compile),
+        patch("yapping.commands.compile_test_dependencies"),
+        patch("os.replace", wraps=os.replace) as m_replace,
+    ):
+        compile_workspace(projects, "test", "test-requirements.txt", options, jobs=1)
+        compile_workspace(projects, "test", "test-requirements.txt", options, jobs=1)
+
+    m_replace.assert_called_once()
+
+
+def test_compile_workspace_reports_follower_failures(workspace):
+    projects = find_projects(["services/a", "services/b"])
+
+    def _compile(pyproject_filename, *args, options):
+        if os.path.basename(os.getcwd()) == "b":
+            raise CompileError("b is broken")
+
+        _fake_compile(pyproject_filename, *args, options=options)
+
+    with (
+        patch("yapping.commands.compile_dependencies", side_effect=_compile),
+        patch("yapping.commands.compile_test_dependencies"),
+    ):
+        results = compile_workspace(
+            projects, "test", "test-requirements.txt", CompileOptions(), jobs=1
+        )
+
+    assert [result.status for result in results] == [Status.COMPILED, Status.FAILED]
+
+
+def test_compile_workspace_reports_failures(workspace):
+    projects = find_projects(["services/a", "services/b"])
+
+    with (
+        patch(
+            "yapping.commands.compile_dependencies",
+            side_effect=CompileError("no django"),
+        ),
+        patch("yapping.commands.compile_test_dependencies"),
+    ):
+        results = compile_workspace(
+            projects, "test", "test-requirements.txt", CompileOptions(), jobs=1
+        )
+
+    assert results == [
+        ProjectResult(projects[0], Status.FAILED, results[0].seconds, "no django"),
+        ProjectResult(projects[1], Status.FAILED, 0, "no django"),
+    ]
+
+
+def test_compile_workspace_does_not_hide_bugs(workspace):
+    projects = find_projects(["services/a"])
+
+    with (
+        patch("yapping.commands.compile_dependencies", side_effect=KeyError("name")),
+        pytest.raises(KeyError),
+    ):
+        compile_workspace(
+            projects, "test", "test-requirements.txt", CompileOptions(), jobs=1
+        )
+
+
+def test_compile_workspace_uses_a_process_pool(workspace):
+    projects = find_projects(["services/*"], ["services/old"])
+
+    with (
+        patch(
+            "yapping.workspace.ProcessPoolExecutor",
+            side_effect=lambda max_workers: ThreadPoolExecutor(max_workers=1),
+        ) as m_pool,
+        patch("yapping.commands.compile_dependencies", side_effect=_fake_compile),
+        patch("yapping.commands.compile_test_dependencies"),
+    ):
+        compile_workspace(
+            projects, "test", "test-requirements.txt", CompileOptions(), jobs=4
+        )
+
+    m_pool.assert_called_once_with(max_workers=2)
+    assert (workspace / "services/a/compiled.log").read_text() == "main\n"
+    assert (workspace / "services/c/compiled.log").read_text() == "main\n"
+
+
+def test_compile_workspace_reports_locked_followers(workspace):
+    projects = find_projects(["services/a", "services/b"])
+    options = CompileOptions(lock_timeout=0)
+
+    with (
+        locking.project_lock("services/b"),
+        patch("yapping.commands.compile_dependencies", side_effect=_fake_compile),
+        patch("yapping.commands.compile_test_dependencies"),
+    ):
+        results = compile_workspace(
+            projects, "test", "test-requirements.txt", options, jobs=1
+        )
+
+    assert [result.status for result in results] == [Status.COMPILED, Status.FAILED]
+    assert results[1].error.startswith("Another yap command is running in")
+
+
+@pytest.mark.parametrize(
+    ("pyproject", "error"),
+    (
+        ('[project]\nversion = "0.1.0"\n', "the project has no name"),
+        ("[tool.other]\n", "the project has no name"),
+        ("[project\n", "Expected ']'"),
+    ),
+)
+def test_compile_workspace_reports_invalid_projects(workspace, pyproject, error):
+    (workspace / "services" / "b" / "pyproject.toml").write_text(pyproject)
+    projects = find_projects(["services/a", "services/b"])
+
+    with (
+        patch("yapping.commands.compile_dependencies", side_effect=_fake_compile),
+        patch("yapping.commands.compile_test_dependencies"),
+    ):
+        results = compile_workspace(
+            projects, "test", "test-requirements.txt", CompileOptions(), jobs=1
+        )
+
+    assert [result.status for result in results] == [Status.COMPILED, Status.FAILED]
+    assert results[1].error.startswith(os.path.join("services", "b", "pyproject.toml"))
+    assert error in results[1].error
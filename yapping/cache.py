@@ -0,0 +1,129 @@
+import contextlib
+import os
+import re
+import time
+from typing import NamedTuple
+
+from yapping import exceptions
+
+SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+# Touched by each automatic prune, whose walk of the whole cache is slow.
+PRUNE_STAMP = ".yap-pruned"
+
+PRUNE_INTERVAL = 60 * 60
+
+
+class CacheEntry(NamedTuple):
+    path: str
+    size: int
+    last_used: float
+
+
+class CacheStats(NamedTuple):
+    files: int
+    size: int
+
+
+def parse_size(value: str | int) -> int:
+    """A size in bytes, from a number of bytes or a string like "500M"."""
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+
+    match = SIZE_RE.match(value) if isinstance(value, str) else None
+
+    if match is None:
+        raise exceptions.YappingException(f"Invalid size: {value!r}")
+
+    number, unit = match.groups()
+
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+
+    value = float(size)
+    units = ["KiB", "MiB", "GiB", "TiB"]
+
+    while True:
+        value /= 1024
+        unit = units.pop(0)
+
+        if value < 1024 or not units:
+            return f"{value:.1f} {unit}"
+
+
+def _entries(cache_dir: str) -> list[CacheEntry]:
+    entries = []
+
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name == PRUNE_STAMP:
+                continue
+
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            entries.append(
+                CacheEntry(path, stat.st_size, max(stat.st_atime, stat.st_mtime))
+            )
+
+    return entries
+
+
+def stats(cache_dir: str) -> CacheStats:
+    entries = _entries(cache_dir)
+
+    return CacheStats(len(entries), sum(entry.size for entry in entries))
+
+
+def _remove_empty_dirs(cache_dir: str) -> None:
+    cache_dir = os.path.normpath(cache_dir)
+
+    for root, _, _ in os.walk(cache_dir, topdown=False):
+        if root != cache_dir and not os.listdir(root):
+            os.rmdir(root)
+
+
+def prune(cache_dir: str, max_size: int = 0) -> CacheStats:
+    """Evict the least recently used files until the cache fits in `max_size`."""
+    entries = sorted(_entries(cache_dir), key=lambda entry: entry.last_used)
+    size = sum(entry.size for entry in entries)
+    removed = CacheStats(0, 0)
+
+    for entry in entries:
+        if size <= max_size:
+            break
+
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(entry.path)
+
+        size -= entry.size
+        removed = CacheStats(removed.files + 1, removed.size + entry.size)
+
+    _remove_empty_dirs(cache_dir)
+
+    return removed
+
+
+def prune_if_due(
+    cache_dir: str, max_size: int, interval: float = PRUNE_INTERVAL
+) -> CacheStats | None:
+    """Prune the cache, unless it was pruned less than `interval` seconds ago."""
+    stamp = os.path.join(cache_dir, PRUNE_STAMP)
+
+    with contextlib.suppress(FileNotFoundError):
+        if time.time() - os.stat(stamp).st_mtime < interval:
+            return None
+
+    removed = prune(cache_dir, max_size)
+
+    # pip creates the cache directory, there is nothing to prune without one.
+    with contextlib.suppress(FileNotFoundError):
+        with open(stamp, "w"):
+            pass
+
+    return removed
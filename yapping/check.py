@@ -0,0 +1,136 @@
+import os
+import tomllib
+from typing import Iterable
+from typing import Sequence
+
+from packaging.requirements import InvalidRequirement
+from packaging.requirements import Requirement
+
+from yapping import commands
+from yapping import exceptions
+from yapping import lockfile
+
+
+def _requirements(
+    pyproject_filename: str, extra: str | None
+) -> tuple[str | None, list[str]]:
+    with open(pyproject_filename, "rb") as f:
+        project = tomllib.load(f)["project"]
+
+    if "dependencies" in project.get("dynamic", []):
+        raise exceptions.YappingException(
+            f"The dependencies in {pyproject_filename} are dynamic, "
+            "run `yap compile` to lock them instead."
+        )
+
+    name = project.get("name")
+    requirements = [
+        *project.get("dependencies", []),
+        *project.get("optional-dependencies", {}).get(extra, []),
+    ]
+
+    return (lockfile.normalize_name(name) if name else None), requirements
+
+
+def drift(
+    requirements: Iterable[str],
+    pins: dict[str, str],
+    direct: set[str],
+    project: str | None = None,
+    environment: dict[str, str] | None = None,
+) -> list[str]:
+    """How the pins stray from the requirements, without resolving anything.
+
+    `direct` are the pins the lock file says pyproject.toml asked for, those
+    that nothing requires any more are reported too.
+    """
+    problems: list[str] = []
+    required = set()
+
+    for requirement in requirements:
+        try:
+            parsed = Requirement(requirement)
+        except InvalidRequirement:
+            problems.append(f"{requirement!r} is not a valid requirement")
+            continue
+
+        name = lockfile.normalize_name(parsed.name)
+
+        # Optional dependency groups can include others through the project.
+        if name == project:
+            continue
+
+        required.add(name)
+
+        # Direct references are pinned by URL, markers may exclude the pin.
+        if parsed.url or (
+            parsed.marker is not None and not parsed.marker.evaluate(environment)
+        ):
+            continue
+
+        version = pins.get(name)
+
+        if version is None:
+            problems.append(f"{requirement} is not pinned")
+        elif not parsed.specifier.contains(version, prereleases=True):
+            problems.append(f"{name}=={version} does not satisfy {requirement}")
+
+    problems.extend(
+        f"{name} is pinned but no longer required" for name in sorted(direct - required)
+    )
+
+    return problems
+
+
+def check_lock(
+    pyproject_filename: str,
+    output_filename: str,
+    extra: str | None,
+    python_versions: Sequence[str] = (),
+) -> list[str]:
+    """Why the lock file no longer matches pyproject.toml, nothing when it does.
+
+    The fingerprint left by `yap compile` settles most checks. When it differs,
+    say because the lock was compiled with another Python, the pins are compared
+    with the requirements instead.
+    """
+    outputs = commands.lock_outputs(output_filename, python_versions)
+    missing = [
+        f"{output} does not exist" for output in outputs if not os.path.exists(output)
+    ]
+
+    if missing:
+        return missing
+
+    if commands.is_locked(pyproject_filename, output_filename, extra, python_versions):
+        return []
+
+    project, requirements = _requirements(pyproject_filename, extra)
+
+    if not python_versions:
+        return drift(
+            requirements,
+            lockfile.read_pins(output_filename),
+            lockfile.read_direct(output_filename),
+            project,
+        )
+
+    problems: list[str] = []
+
+    if len(outputs) == 1:
+        # The lock files of every version were merged.
+        outputs = outputs * len(python_versions)
+
+    for python_version, output in zip(python_versions, outputs):
+        problems.extend(
+            f"Python {python_version}: {problem}"
+            for problem in drift(
+                requirements,
+                lockfile.read_pins(output, python_version),
+                lockfile.read_direct(output),
+                project,
+                lockfile.python_version_markers(python_version),
+            )
+        )
+
+    return problems
@@ -2,18 +2,80 @@
 from __future__ import annotations
 
 import argparse
-from importlib.metadata import version
+import contextlib
+import functools
+import os
+import re
+import sys
+import time
+from types import ModuleType
+from typing import Any
+from typing import Callable
 from typing import Sequence
+from typing import TypeAlias
 
-from yapping import commands
+from yapping.options import Backend
+from yapping.options import CompileOptions
+from yapping.options import Pins
 
 PYPROJECT_FILENAME = "pyproject.toml"
 
 UPGRADE_ARG = "--upgrade"
+UPGRADE_PACKAGE_ARG = "--upgrade-package"
 
 COMPILE_PARAM = "compile"
 COMPILE_TEST_PARAM = "compile_test"
 
+MAIN_LABEL = "main"
+
+DEFAULT_JOBS = 2
+
+DEFAULT_DEBOUNCE = 0.5
+
+DEFAULT_METADATA_TTL = 300.0
+
+CompileTask: TypeAlias = tuple[str, Callable[[], None]]
+
+
+def __getattr__(name: str) -> ModuleType:
+    # `commands` pulls in tomli_w, subprocess and friends, only import it when a
+    # command actually runs.
+    if name == "commands":
+        from yapping import commands
+
+        return commands
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _LazyVersionAction(argparse.Action):
+    def __init__(
+        self,
+        option_strings: Sequence[str],
+        dest: str = argparse.SUPPRESS,
+        default: str = argparse.SUPPRESS,
+        help: str | None = None,
+    ) -> None:
+        super().__init__(
+            option_strings=option_strings,
+            dest=dest,
+            default=default,
+            nargs=0,
+            help=help,
+        )
+
+    def __call__(
+        self,
+        parser: argparse.ArgumentParser,
+        namespace: argparse.Namespace,
+        values: Any,
+        option_string: str | None = None,
+    ) -> None:
+        from importlib.metadata import version
+
+        print(f"v{version('yapping')}")
+        parser.exit()
+
 
 class Commands:
     ADD = "add"
@@ -22,6 +84,58 @@ class Commands:
     UPGRADE = "upgrade"
     VERSION = "version"
     INIT = "init"
+    BATCH = "batch"
+    CACHE = "cache"
+    WORKSPACE = "workspace"
+    WATCH = "watch"
+    DAEMON = "daemon"
+    SYNC = "sync"
+    CHECK = "check"
+    WHY = "why"
+    TREE = "tree"
+    SHOW = "show"
+
+
+# Commands that edit or compile the project, one at a time.
+LOCKED_COMMANDS = (
+    Commands.ADD,
+    Commands.REMOVE,
+    Commands.COMPILE,
+    Commands.UPGRADE,
+    Commands.VERSION,
+    Commands.BATCH,
+    Commands.INIT,
+)
+
+# Commands that only read a lock file.
+LOCKFILE_COMMANDS = (Commands.WHY, Commands.TREE, Commands.SHOW)
+
+# Commands a running `yap daemon` can run on behalf of the CLI.
+DAEMON_COMMANDS = (
+    Commands.ADD,
+    Commands.REMOVE,
+    Commands.COMPILE,
+    Commands.UPGRADE,
+    Commands.BATCH,
+)
+
+
+class CacheActions:
+    SHOW = "show"
+    PRUNE = "prune"
+
+
+class DaemonActions:
+    RUN = "run"
+    STOP = "stop"
+    STATUS = "status"
+
+
+CACHE_DIR_KEY = "cache-dir"
+CACHE_MAX_SIZE_KEY = "cache-max-size"
+LOCK_STORE_KEY = "lock-store"
+EXTRA_OUTPUTS_KEY = "extra-outputs"
+PYTHON_VERSIONS_KEY = "python-versions"
 
 
 def _package_arg(parser: argparse.ArgumentParser) -> None:
@@ -57,6 +171,14 @@ def _test_requirements_arg(parser: argparse.ArgumentParser) -> None:
     )
 
 
+def _lockfile_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--lockfile",
+        help="Lock file to read.",
+        default="requirements.txt",
+    )
+
+
 def _compile_arg(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         "--compile",
@@ -72,6 +194,262 @@ def _compile_arg(parser: argparse.ArgumentParser) -> None:
     )
 
 
+def _force_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--force",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Compile even if the inputs did not change since the last compile.",
+    )
+
+
+def _backend_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--backend",
+        help=(
+            "How to run pip-compile: inside the yap process, or as a separate "
+            "`pip-compile` subprocess. `auto` runs in-process when pip-tools is "
+            "importable."
+        ),
+        choices=[
+            Backend.AUTO,
+            Backend.IN_PROCESS,
+            Backend.SUBPROCESS,
+        ],
+        default=Backend.AUTO,
+    )
+
+
+def _log_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--log",
+        metavar="FILE",
+        help="Append the output of pip-compile to FILE as it runs.",
+        default=None,
+    )
+
+
+def _pins_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--pins",
+        help=(
+            "How to treat the pins already in the lock files: `prefer` keeps them "
+            "when possible, `fix` only lets the packages being added and what they "
+            "force move."
+        ),
+        choices=[Pins.PREFER, Pins.FIX],
+        default=Pins.PREFER,
+    )
+
+
+def _cache_dir_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--cache-dir",
+        help=(
+            "Directory for the package, metadata and HTTP caches used by "
+            f"pip-compile and pip. Defaults to `{CACHE_DIR_KEY}` in [tool.yapping]."
+        ),
+        default=None,
+    )
+
+
+def _lock_store_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--lock-store",
+        metavar="DIR",
+        help=(
+            "Directory, possibly shared, where lock files are kept by their "
+            "inputs and reused by projects with the same ones. Defaults to "
+            f"`{LOCK_STORE_KEY}` in [tool.yapping]."
+        ),
+        default=None,
+    )
+
+
+def _python_versions(value: str) -> tuple[str, ...]:
+    versions = {version.strip() for version in value.split(",") if version.strip()}
+
+    if not versions or not all(
+        re.fullmatch(r"\d+\.\d+", version) for version in versions
+    ):
+        raise argparse.ArgumentTypeError(f"expected X.Y[,X.Y...]: {value}")
+
+    return tuple(
+        sorted(versions, key=lambda version: tuple(map(int, version.split("."))))
+    )
+
+
+def _python_versions_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--python-versions",
+        metavar="X.Y[,X.Y...]",
+        help=(
+            "Lock for each of these Python versions at the same time, with their "
+            f"pythonX.Y interpreters. Defaults to `{PYTHON_VERSIONS_KEY}` in "
+            "[tool.yapping]."
+        ),
+        type=_python_versions,
+        default=None,
+    )
+
+
+def _resolve_python_versions(
+    python_versions: tuple[str, ...] | None, yap_config: dict[str, Any]
+) -> tuple[str, ...]:
+    from yapping import exceptions
+
+    if python_versions is not None:
+        return python_versions
+
+    if PYTHON_VERSIONS_KEY not in yap_config:
+        return ()
+
+    try:
+        return _python_versions(",".join(yap_config[PYTHON_VERSIONS_KEY]))
+    except argparse.ArgumentTypeError as e:
+        raise exceptions.YappingException(
+            f"Invalid `{PYTHON_VERSIONS_KEY}` in [tool.yapping]: {e}"
+        ) from e
+
+
+def _log_file(log: str | None) -> str | None:
+    return os.path.abspath(log) if log is not None else None
+
+
+def _resolve_cache_dir(cache_dir: str | None, yap_config: dict[str, Any]) -> str | None:
+    from yapping import config
+
+    if cache_dir is not None:
+        return os.path.abspath(cache_dir)
+
+    if CACHE_DIR_KEY in yap_config:
+        return config.config_path(PYPROJECT_FILENAME, yap_config[CACHE_DIR_KEY])
+
+    return None
+
+
+def _resolve_lock_store(
+    lock_store: str | None, yap_config: dict[str, Any]
+) -> str | None:
+    from yapping import config
+
+    if lock_store is not None:
+        return os.path.abspath(lock_store)
+
+    if LOCK_STORE_KEY in yap_config:
+        return config.config_path(PYPROJECT_FILENAME, yap_config[LOCK_STORE_KEY])
+
+    return None
+
+
+def _extra_output(value: str) -> tuple[str, str]:
+    extra, sep, output_file = value.partition("=")
+
+    if not sep or not extra or not output_file:
+        raise argparse.ArgumentTypeError(f"expected GROUP=FILE: {value}")
+
+    return extra, output_file
+
+
+def _all_extras_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--all-extras",
+        help=(
+            "Compile a lock file for every optional dependencies group, at the "
+            "same time."
+        ),
+        action=argparse.BooleanOptionalAction,
+        default=False,
+    )
+    parser.add_argument(
+        "--extra-output",
+        help=(
+            "Lock file of an optional dependencies group, as GROUP=FILE. Defaults "
+            f"to `{EXTRA_OUTPUTS_KEY}` in [tool.yapping], or GROUP-requirements.txt."
+        ),
+        type=_extra_output,
+        action="append",
+        default=[],
+    )
+
+
+def _extra_outputs(
+    parsed_args: argparse.Namespace, yap_config: dict[str, Any]
+) -> dict[str, str]:
+    if not getattr(parsed_args, "all_extras", False):
+        return {parsed_args.optional_dependencies: parsed_args.test_requirements}
+
+    from yapping import commands
+
+    outputs = {
+        extra: f"{extra}-{commands.DEFAULT_OUTPUT_FILENAME}"
+        for extra in commands.optional_dependency_groups(PYPROJECT_FILENAME)
+    }
+
+    if parsed_args.optional_dependencies in outputs:
+        outputs[parsed_args.optional_dependencies] = parsed_args.test_requirements
+
+    for extra, output_file in [
+        *yap_config.get(EXTRA_OUTPUTS_KEY, {}).items(),
+        *parsed_args.extra_output,
+    ]:
+        if extra in outputs:
+            outputs[extra] = output_file
+
+    return outputs
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value}")
+
+    return number
+
+
+def _jobs_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help=(
+            "Maximum number of lock files to compile at the same time. pip-tools "
+            "runs one compile at a time in-process: with the auto backend the "
+            "other compiles run as pip-compile subprocesses, `--backend "
+            "in-process` compiles one lock file after the other."
+        ),
+        type=_positive_int,
+        default=DEFAULT_JOBS,
+    )
+
+
+def _run_compile_tasks(tasks: Sequence[CompileTask], jobs: int) -> int:
+    from concurrent.futures import ThreadPoolExecutor
+
+    from yapping import exceptions
+
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [(label, executor.submit(task)) for label, task in tasks]
+
+        for label, future in futures:
+            exc = future.exception()
+
+            if exc is None:
+                continue
+
+            # Bugs keep their traceback, only yap's own errors are reported.
+            if not isinstance(exc, exceptions.YappingException):
+                raise exc
+
+            failed = True
+            print(f"yap: failed to compile {label} dependencies", file=sys.stderr)
+            print(exc, file=sys.stderr)
+
+    return int(failed)
+
+
 def make_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -80,10 +458,44 @@ def make_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "-v",
         "--version",
-        action="version",
-        version=f"v{version('yapping')}",
+        action=_LazyVersionAction,
         help="Print version of the tool.",
     )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print how long each phase of the command took.",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="Write the phases of the command to FILE as Chrome trace events.",
+        default=None,
+    )
+    parser.add_argument(
+        "--daemon",
+        help="Let a running `yap daemon` run the command, when there is one.",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+    )
+    lock_group = parser.add_mutually_exclusive_group()
+    lock_group.add_argument(
+        "--lock-timeout",
+        metavar="SECONDS",
+        help=(
+            "How long to wait for other yap commands editing or compiling the "
+            "project. Defaults to waiting until they are done."
+        ),
+        type=float,
+        default=None,
+    )
+    lock_group.add_argument(
+        "--no-wait",
+        help="Fail right away when another yap command is working on the project.",
+        dest="lock_timeout",
+        action="store_const",
+        const=0.0,
+    )
 
     subparser = parser.add_subparsers(
         title="command",
@@ -95,7 +507,24 @@ def make_parser() -> argparse.ArgumentParser:
         help="Add a new dependency",
     )
     _package_arg(add_parser)
+    add_parser.add_argument(
+        "-r",
+        "--requirement",
+        metavar="FILE",
+        help="Add the requirements listed in FILE, `-` for stdin. Can be repeated.",
+        action="append",
+        default=[],
+    )
     _compile_arg(add_parser)
+    _jobs_arg(add_parser)
+    _backend_arg(add_parser)
+    _log_arg(add_parser)
+    _python_versions_arg(add_parser)
+    _cache_dir_arg(add_parser)
+    _lock_store_arg(add_parser)
+    _all_extras_arg(add_parser)
+    _force_arg(add_parser)
+    _pins_arg(add_parser)
     _extra_arg(add_parser)
     _optional_dependencies_arg(add_parser)
     _test_requirements_arg(add_parser)
@@ -106,6 +535,15 @@ def make_parser() -> argparse.ArgumentParser:
     )
     _package_arg(rm_parser)
     _compile_arg(rm_parser)
+    _jobs_arg(rm_parser)
+    _backend_arg(rm_parser)
+    _log_arg(rm_parser)
+    _python_versions_arg(rm_parser)
+    _cache_dir_arg(rm_parser)
+    _lock_store_arg(rm_parser)
+    _all_extras_arg(rm_parser)
+    _force_arg(rm_parser)
+    _pins_arg(rm_parser)
     _extra_arg(rm_parser)
     _optional_dependencies_arg(rm_parser)
     _test_requirements_arg(rm_parser)
@@ -115,6 +553,15 @@ def make_parser() -> argparse.ArgumentParser:
         help="compile dependencies with pip-tools' `pip-compile`",
     )
     _extra_arg(compile_parser)
+    _jobs_arg(compile_parser)
+    _backend_arg(compile_parser)
+    _log_arg(compile_parser)
+    _python_versions_arg(compile_parser)
+    _cache_dir_arg(compile_parser)
+    _lock_store_arg(compile_parser)
+    _all_extras_arg(compile_parser)
+    _force_arg(compile_parser)
+    _pins_arg(compile_parser)
     _optional_dependencies_arg(compile_parser)
     _test_requirements_arg(compile_parser)
 
@@ -122,6 +569,18 @@ def make_parser() -> argparse.ArgumentParser:
         Commands.UPGRADE,
         help="compile dependencies with pip-tools' `pip-compile`",
     )
+    upgrade_parser.add_argument(
+        "packages",
+        help="Only upgrade these packages, leave the other pins alone.",
+        nargs="*",
+    )
+    _jobs_arg(upgrade_parser)
+    _backend_arg(upgrade_parser)
+    _log_arg(upgrade_parser)
+    _python_versions_arg(upgrade_parser)
+    _cache_dir_arg(upgrade_parser)
+    _lock_store_arg(upgrade_parser)
+    _all_extras_arg(upgrade_parser)
     _optional_dependencies_arg(upgrade_parser)
     _test_requirements_arg(upgrade_parser)
 
@@ -150,38 +609,534 @@ def make_parser() -> argparse.ArgumentParser:
         default=".",
     )
     _compile_arg(init_parser)
+    _jobs_arg(init_parser)
+    _backend_arg(init_parser)
+    _log_arg(init_parser)
+    _python_versions_arg(init_parser)
+    _cache_dir_arg(init_parser)
+    _lock_store_arg(init_parser)
+    _force_arg(init_parser)
     _optional_dependencies_arg(init_parser)
     _test_requirements_arg(init_parser)
 
+    batch_parser = subparser.add_parser(
+        Commands.BATCH,
+        help="Apply several edits at once and compile once.",
+    )
+    batch_parser.add_argument(
+        "operations",
+        help=(
+            "Operations to apply, e.g. 'add foo bar', 'rm-extra test baz' or "
+            "'version patch'. Read one per line from stdin when omitted or `-`."
+        ),
+        nargs="*",
+    )
+    _compile_arg(batch_parser)
+    _jobs_arg(batch_parser)
+    _backend_arg(batch_parser)
+    _log_arg(batch_parser)
+    _python_versions_arg(batch_parser)
+    _cache_dir_arg(batch_parser)
+    _lock_store_arg(batch_parser)
+    _all_extras_arg(batch_parser)
+    _force_arg(batch_parser)
+    _pins_arg(batch_parser)
+    _optional_dependencies_arg(batch_parser)
+    _test_requirements_arg(batch_parser)
+
+    cache_parser = subparser.add_parser(
+        Commands.CACHE,
+        help="Show or prune the package cache.",
+    )
+    cache_parser.add_argument(
+        "action",
+        help="What to do with the cache.",
+        choices=[CacheActions.SHOW, CacheActions.PRUNE],
+        default=CacheActions.SHOW,
+        nargs="?",
+    )
+    cache_parser.add_argument(
+        "--max-size",
+        help=(
+            "Evict the least recently used files until the cache is at most this "
+            f"big, e.g. 500M or 2G. Defaults to `{CACHE_MAX_SIZE_KEY}` in "
+            "[tool.yapping], or to emptying the cache."
+        ),
+        default=None,
+    )
+    _cache_dir_arg(cache_parser)
+
+    workspace_parser = subparser.add_parser(
+        Commands.WORKSPACE,
+        help="Compile every project of a workspace.",
+    )
+    workspace_parser.add_argument(
+        "members",
+        help=(
+            "Glob patterns of the project directories. Defaults to `members` in "
+            "[tool.yapping.workspace]."
+        ),
+        nargs="*",
+    )
+    _jobs_arg(workspace_parser)
+    _backend_arg(workspace_parser)
+    _log_arg(workspace_parser)
+    _python_versions_arg(workspace_parser)
+    _cache_dir_arg(workspace_parser)
+    _lock_store_arg(workspace_parser)
+    _force_arg(workspace_parser)
+    _optional_dependencies_arg(workspace_parser)
+    _test_requirements_arg(workspace_parser)
+
+    watch_parser = subparser.add_parser(
+        Commands.WATCH,
+        help="Compile the lock files whenever pyproject.toml changes.",
+    )
+    watch_parser.add_argument(
+        "--debounce",
+        help="Seconds without changes to wait for before compiling.",
+        type=float,
+        default=DEFAULT_DEBOUNCE,
+    )
+    watch_parser.add_argument(
+        "--poll",
+        help="Poll pyproject.toml instead of using inotify.",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+    )
+    _backend_arg(watch_parser)
+    _log_arg(watch_parser)
+    _python_versions_arg(watch_parser)
+    _cache_dir_arg(watch_parser)
+    _lock_store_arg(watch_parser)
+    _all_extras_arg(watch_parser)
+    _pins_arg(watch_parser)
+    _optional_dependencies_arg(watch_parser)
+    _test_requirements_arg(watch_parser)
+
+    sync_parser = subparser.add_parser(
+        Commands.SYNC,
+        help="Install and remove packages so that the environment matches the locks.",
+    )
+    sync_parser.add_argument(
+        "lockfiles",
+        help=(
+            "Lock files to sync. Defaults to requirements.txt and the test "
+            "requirements file, those that exist."
+        ),
+        nargs="*",
+    )
+    sync_parser.add_argument(
+        "--python",
+        help=(
+            "Interpreter of the environment to sync. Defaults to the active virtual "
+            "environment, or the interpreter running yap."
+        ),
+        default=None,
+    )
+    sync_parser.add_argument(
+        "--dry-run",
+        help="Only print what would be installed and removed.",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+    )
+    _jobs_arg(sync_parser)
+    _test_requirements_arg(sync_parser)
+    _cache_dir_arg(sync_parser)
+
+    check_parser = subparser.add_parser(
+        Commands.CHECK,
+        help="Check that the lock files match pyproject.toml, without resolving.",
+    )
+    _python_versions_arg(check_parser)
+    _all_extras_arg(check_parser)
+    _optional_dependencies_arg(check_parser)
+    _test_requirements_arg(check_parser)
+
+    why_parser = subparser.add_parser(
+        Commands.WHY,
+        help="Show what requires a package, going by the lock file.",
+    )
+    why_parser.add_argument("package", help="Name of the locked package.")
+    _lockfile_arg(why_parser)
+
+    tree_parser = subparser.add_parser(
+        Commands.TREE,
+        help="Show the locked packages as a tree of what requires what.",
+    )
+    tree_parser.add_argument(
+        "package",
+        help="Only show what this package requires.",
+        nargs="?",
+        default=None,
+    )
+    _lockfile_arg(tree_parser)
+
+    show_parser = subparser.add_parser(
+        Commands.SHOW,
+        help="Show the pin, hashes and dependencies of a locked package.",
+    )
+    show_parser.add_argument("package", help="Name of the locked package.")
+    _lockfile_arg(show_parser)
+
+    daemon_parser = subparser.add_parser(
+        Commands.DAEMON,
+        help="Keep pip-tools and index lookups warm for other yap commands.",
+    )
+    daemon_parser.add_argument(
+        "action",
+        help="Run the daemon, or stop or show the running one.",
+        choices=[DaemonActions.RUN, DaemonActions.STOP, DaemonActions.STATUS],
+        default=DaemonActions.RUN,
+        nargs="?",
+    )
+    daemon_parser.add_argument(
+        "--ttl",
+        help="Seconds to reuse the package lists fetched from the index for.",
+        type=float,
+        default=DEFAULT_METADATA_TTL,
+    )
+
     return parser
 
 
-def main(argv: Sequence[str] | None = None) -> int:
-    parser = make_parser()
-    parsed_args = parser.parse_args(argv)
+def _cache_command(cache_dir: str | None, max_size: str | None, action: str) -> int:
+    from yapping import cache
+    from yapping import exceptions
+
+    if cache_dir is None:
+        raise exceptions.YappingException(
+            f"No cache directory: pass --cache-dir or set `{CACHE_DIR_KEY}` "
+            "in [tool.yapping]."
+        )
+
+    if action == CacheActions.PRUNE:
+        removed = cache.prune(cache_dir, cache.parse_size(max_size or "0"))
+        print(f"Removed {removed.files} files ({cache.format_size(removed.size)})")
+
+    current = cache.stats(cache_dir)
+    print(f"{cache_dir}: {current.files} files ({cache.format_size(current.size)})")
+
+    return 0
+
+
+def _workspace_command(
+    members: list[str],
+    test_extra: str,
+    test_requirements: str,
+    options: CompileOptions,
+    jobs: int,
+) -> int:
+    import time
+
+    from yapping import exceptions
+    from yapping import workspace
+
+    patterns, exclude = workspace.workspace_patterns(PYPROJECT_FILENAME)
+    projects = workspace.find_projects(members or patterns, exclude)
+
+    if not projects:
+        raise exceptions.YappingException(
+            "No projects found: pass glob patterns or set `members` in "
+            "[tool.yapping.workspace]."
+        )
+
+    start = time.perf_counter()
+    results = workspace.compile_workspace(
+        projects, test_extra, test_requirements, options, jobs
+    )
+    elapsed = time.perf_counter() - start
+    width = max(len(result.project) for result in results)
+
+    for result in results:
+        print(f"{result.project:<{width}}  {result.status:<12}  {result.seconds:6.1f}s")
+
+    print(f"{len(results)} projects in {elapsed:.1f}s")
+
+    for result in results:
+        if result.status == workspace.Status.FAILED:
+            print(f"yap: failed to compile {result.project}", file=sys.stderr)
+            print(result.error, file=sys.stderr)
+
+    return int(any(result.status == workspace.Status.FAILED for result in results))
+
+
+def _watch_command(
+    parsed_args: argparse.Namespace,
+    yap_config: dict[str, Any],
+    options: CompileOptions,
+) -> int:
+    from yapping import commands
+    from yapping import watch
+
+    locks = [
+        watch.Lock(None, commands.DEFAULT_OUTPUT_FILENAME),
+        *(
+            watch.Lock(extra, output_file)
+            for extra, output_file in _extra_outputs(parsed_args, yap_config).items()
+        ),
+    ]
+    watcher = watch.make_watcher(PYPROJECT_FILENAME, poll=parsed_args.poll)
+    print(f"yap: watching {PYPROJECT_FILENAME}, press Ctrl+C to stop")
+
+    try:
+        watch.watch(PYPROJECT_FILENAME, locks, options, watcher, parsed_args.debounce)
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+def _daemon_command(action: str, ttl: float) -> int:
+    from yapping import daemon
+
+    if action == DaemonActions.STOP:
+        if not daemon.stop():
+            print("yap: no daemon is running", file=sys.stderr)
+            return 1
+
+        return 0
+
+    if action == DaemonActions.STATUS:
+        status = daemon.status()
+
+        if status is None:
+            print("yap: no daemon is running", file=sys.stderr)
+            return 1
+
+        print(
+            f"yap daemon {status['pid']} on {status['socket']}: up "
+            f"{status['uptime']:.0f}s, {status['requests']} commands, "
+            f"index lookups kept {status['ttl']:.0f}s"
+        )
+
+        return 0
+
+    print(f"yap: daemon listening on {daemon.socket_path()}, press Ctrl+C to stop")
+
+    try:
+        daemon.serve(ttl)
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+def _sync_command(parsed_args: argparse.Namespace, cache_dir: str | None) -> int:
+    from yapping import commands
+    from yapping import exceptions
+    from yapping import sync
+
+    python = parsed_args.python or sync.target_python()
+    environment = sync.inspect(python)
+    lockfiles = parsed_args.lockfiles
+
+    if not lockfiles:
+        # Lock files compiled for several Python versions may not be merged.
+        python_version = environment.markers["python_version"]
+        lockfiles = []
+
+        for filename in (
+            commands.DEFAULT_OUTPUT_FILENAME,
+            parsed_args.test_requirements,
+        ):
+            for candidate in (
+                filename,
+                commands.python_version_lockfile(filename, python_version),
+            ):
+                if os.path.exists(candidate):
+                    lockfiles.append(candidate)
+                    break
+
+    if not lockfiles:
+        raise exceptions.YappingException(
+            "No lock files to sync: run `yap compile` first."
+        )
+
+    requirements = sync.read_locks(lockfiles, environment.markers)
+    # The project itself is usually installed in its own environment.
+    project = sync.project_name(PYPROJECT_FILENAME)
+    plan = sync.plan(requirements, environment, [project] if project else [])
+
+    if not plan.install and not plan.uninstall:
+        print("yap: the environment is up to date")
+        return 0
+
+    for requirement in plan.install:
+        if requirement.url is not None:
+            print(f"install {requirement.name} from {requirement.url}")
+        else:
+            print(f"install {requirement.name}=={requirement.version}")
+
+    for name in plan.uninstall:
+        print(f"remove {name}")
+
+    if parsed_args.dry_run:
+        return 0
+
+    if plan.install:
+        sync.install(python, plan.install, parsed_args.jobs, cache_dir)
+
+    if plan.uninstall:
+        sync.uninstall(python, plan.uninstall)
+
+    return 0
+
+
+def _use_daemon(parsed_args: argparse.Namespace) -> bool:
+    if not parsed_args.daemon or parsed_args.command not in DAEMON_COMMANDS:
+        return False
+
+    # The daemon cannot read the operations or requirements from our stdin.
+    if parsed_args.command == Commands.ADD:
+        return "-" not in parsed_args.requirement
+
+    return parsed_args.command != Commands.BATCH or parsed_args.operations not in (
+        [],
+        ["-"],
+    )
+
+
+def _check_command(parsed_args: argparse.Namespace) -> int:
+    from yapping import check
+    from yapping import commands
+    from yapping import config
+
+    yap_config = config.read_config(PYPROJECT_FILENAME)
+    python_versions = _resolve_python_versions(parsed_args.python_versions, yap_config)
+    groups = commands.optional_dependency_groups(PYPROJECT_FILENAME)
+    locks: list[tuple[str | None, str]] = [
+        (None, commands.DEFAULT_OUTPUT_FILENAME),
+        *(
+            (extra, output_file)
+            for extra, output_file in _extra_outputs(parsed_args, yap_config).items()
+            # `yap compile` does not lock groups pyproject.toml lacks.
+            if extra in groups
+        ),
+    ]
+    stale = False
+
+    for extra, output_file in locks:
+        problems = check.check_lock(
+            PYPROJECT_FILENAME, output_file, extra, python_versions
+        )
+
+        if not problems:
+            print(f"{output_file}: up to date")
+            continue
+
+        stale = True
+        print(f"{output_file}: out of date", file=sys.stderr)
+
+        for problem in problems:
+            print(f"  {problem}", file=sys.stderr)
+
+    if stale:
+        print("yap: run `yap compile` to update the lock files", file=sys.stderr)
+
+    return int(stale)
+
+
+def _lockfile_command(parsed_args: argparse.Namespace) -> int:
+    from yapping import explain
+    from yapping import exceptions
+    from yapping import lockfile
+
+    try:
+        index = lockfile.read_index(parsed_args.lockfile)
+    except FileNotFoundError:
+        raise exceptions.YappingException(
+            f"No such lock file: {parsed_args.lockfile}, run `yap compile` first."
+        ) from None
+
+    if parsed_args.command == Commands.WHY:
+        lines = explain.why(index, parsed_args.package)
+    elif parsed_args.command == Commands.TREE:
+        lines = explain.tree(index, parsed_args.package)
+    else:
+        lines = explain.show(index, parsed_args.package)
+
+    for line in lines:
+        print(line)
+
+    return 0
+
+
+def _run(parser: argparse.ArgumentParser, parsed_args: argparse.Namespace) -> int:
+    if parsed_args.command in LOCKFILE_COMMANDS:
+        # Neither pip-tools nor the config are needed to read a lock file.
+        return _lockfile_command(parsed_args)
+
+    from yapping import commands
+    from yapping import config
+    from yapping import exceptions
+    from yapping import timings
+
+    yap_config: dict[str, Any] = {}
+    cache_dir = None
+    lock_store = None
+    python_versions: tuple[str, ...] = ()
+
+    if hasattr(parsed_args, "cache_dir"):
+        with timings.span("read config"):
+            yap_config = config.read_config(PYPROJECT_FILENAME)
+            cache_dir = _resolve_cache_dir(parsed_args.cache_dir, yap_config)
+
+    if hasattr(parsed_args, "lock_store"):
+        lock_store = _resolve_lock_store(parsed_args.lock_store, yap_config)
+
+    if hasattr(parsed_args, "python_versions"):
+        python_versions = _resolve_python_versions(
+            parsed_args.python_versions, yap_config
+        )
 
     do_compile = False
     do_compile_test = False
+    compile_args: tuple[str, ...] = ()
+    # None when every optional dependencies group is affected.
+    changed_extras: frozenset[str] | None = None
+    compile_tasks: list[CompileTask] = []
+    compile_options = CompileOptions(
+        force=getattr(parsed_args, "force", False),
+        backend=getattr(parsed_args, "backend", Backend.AUTO),
+        pins=getattr(parsed_args, "pins", Pins.PREFER),
+        cache_dir=cache_dir,
+        log=_log_file(getattr(parsed_args, "log", None)),
+        python_versions=python_versions,
+        lock_timeout=parsed_args.lock_timeout,
+        lock_store=lock_store,
+    )
 
     if parsed_args.command == Commands.ADD:
         do_compile_test = True
+        packages = [
+            *parsed_args.packages,
+            *(
+                requirement
+                for filename in parsed_args.requirement
+                for requirement in commands.read_requirements_file(filename)
+            ),
+        ]
+        compile_options = compile_options._replace(unlocked=tuple(packages))
 
         if parsed_args.extra is True:
+            changed_extras = frozenset({parsed_args.optional_dependencies})
             commands.add_optional_dependency(
                 PYPROJECT_FILENAME,
                 parsed_args.optional_dependencies,
-                *parsed_args.packages,
+                *packages,
             )
         else:
             do_compile = True
             commands.add_dependency(
                 PYPROJECT_FILENAME,
-                *parsed_args.packages,
+                *packages,
             )
     elif parsed_args.command == Commands.REMOVE:
         do_compile_test = True
 
         if parsed_args.extra is True:
+            changed_extras = frozenset({parsed_args.optional_dependencies})
             commands.remove_optional_dependency(
                 PYPROJECT_FILENAME,
                 parsed_args.optional_dependencies,
@@ -199,34 +1154,186 @@ def main(argv: Sequence[str] | None = None) -> int:
         if not parsed_args.extra:
             do_compile = True
     elif parsed_args.command == Commands.UPGRADE:
-        commands.compile_dependencies(PYPROJECT_FILENAME, UPGRADE_ARG)
-
-        commands.compile_test_dependencies(
-            PYPROJECT_FILENAME,
-            parsed_args.optional_dependencies,
-            parsed_args.test_requirements,
-            UPGRADE_ARG,
-        )
-
+        do_compile = True
+        do_compile_test = True
+        compile_args = tuple(
+            f"{UPGRADE_PACKAGE_ARG}={pkg}" for pkg in parsed_args.packages
+        ) or (UPGRADE_ARG,)
     elif parsed_args.command == Commands.VERSION:
         commands.update_version(PYPROJECT_FILENAME, parsed_args.version_type)
     elif parsed_args.command == Commands.INIT:
-        commands.init(parsed_args.project_name, parsed_args.output_dir)
+        commands.init(parsed_args.project_name, parsed_args.output_dir, python_versions)
 
         if parsed_args.compile:
             do_compile = True
             do_compile_test = True
+    elif parsed_args.command == Commands.BATCH:
+        lines = parsed_args.operations
+
+        if not lines or lines == ["-"]:
+            lines = sys.stdin.read().splitlines()
+
+        operations = commands.parse_operations(lines)
+        result = commands.batch(PYPROJECT_FILENAME, operations)
+
+        compile_options = compile_options._replace(
+            unlocked=tuple(
+                pkg
+                for operation in operations
+                if operation.name == commands.BatchOperation.ADD
+                for pkg in operation.args
+            )
+            + tuple(
+                pkg
+                for operation in operations
+                if operation.name == commands.BatchOperation.ADD_EXTRA
+                for pkg in operation.args[1:]
+            ),
+        )
+
+        do_compile = result.dependencies_changed
+        do_compile_test = True
+
+        if not result.dependencies_changed:
+            changed_extras = result.changed_extras
+    elif parsed_args.command == Commands.CACHE:
+        max_size = parsed_args.max_size or yap_config.get(CACHE_MAX_SIZE_KEY)
+
+        return _cache_command(cache_dir, max_size, parsed_args.action)
+    elif parsed_args.command == Commands.WORKSPACE:
+        with timings.span("compile workspace"):
+            return _workspace_command(
+                parsed_args.members,
+                parsed_args.optional_dependencies,
+                parsed_args.test_requirements,
+                compile_options,
+                parsed_args.jobs,
+            )
+    elif parsed_args.command == Commands.WATCH:
+        return _watch_command(parsed_args, yap_config, compile_options)
+    elif parsed_args.command == Commands.SYNC:
+        return _sync_command(parsed_args, cache_dir)
+    elif parsed_args.command == Commands.CHECK:
+        return _check_command(parsed_args)
+    elif parsed_args.command == Commands.DAEMON:
+        return _daemon_command(parsed_args.action, parsed_args.ttl)
     else:
         parser.print_help()
 
     if getattr(parsed_args, COMPILE_PARAM, True) and do_compile:
-        commands.compile_dependencies(PYPROJECT_FILENAME)
+        compile_tasks.append(
+            (
+                MAIN_LABEL,
+                functools.partial(
+                    commands.compile_dependencies,
+                    PYPROJECT_FILENAME,
+                    *compile_args,
+                    options=compile_options,
+                ),
+            )
+        )
 
     if getattr(parsed_args, COMPILE_TEST_PARAM, True) and do_compile_test:
-        commands.compile_test_dependencies(
-            PYPROJECT_FILENAME,
-            parsed_args.optional_dependencies,
-            parsed_args.test_requirements,
-        )
+        extra_outputs = _extra_outputs(parsed_args, yap_config)
+        output_owners: dict[str, str] = {}
 
-    return 0
+        for extra, output_file in extra_outputs.items():
+            if changed_extras is not None and extra not in changed_extras:
+                continue
+
+            if output_file in output_owners:
+                raise exceptions.YappingException(
+                    f"Optional dependency groups {output_owners[output_file]!r} "
+                    f"and {extra!r} both compile to {output_file}"
+                )
+
+            output_owners[output_file] = extra
+            compile_tasks.append(
+                (
+                    extra,
+                    functools.partial(
+                        commands.compile_test_dependencies,
+                        PYPROJECT_FILENAME,
+                        extra,
+                        output_file,
+                        *compile_args,
+                        options=compile_options,
+                    ),
+                )
+            )
+
+    if not compile_tasks:
+        return 0
+
+    ret = _run_compile_tasks(compile_tasks, parsed_args.jobs)
+
+    if cache_dir is not None and CACHE_MAX_SIZE_KEY in yap_config:
+        from yapping import cache
+
+        with timings.span("prune cache"):
+            cache.prune_if_due(
+                cache_dir, cache.parse_size(yap_config[CACHE_MAX_SIZE_KEY])
+            )
+
+    return ret
+
+
+def _run_locked(
+    parser: argparse.ArgumentParser, parsed_args: argparse.Namespace
+) -> int:
+    if parsed_args.command not in LOCKED_COMMANDS:
+        return _run(parser, parsed_args)
+
+    from yapping import locking
+    from yapping import timings
+
+    directory = os.path.dirname(PYPROJECT_FILENAME)
+
+    if parsed_args.command == Commands.INIT:
+        directory = parsed_args.output_dir
+
+    with contextlib.ExitStack() as stack:
+        with timings.span("wait for project lock"):
+            stack.enter_context(
+                locking.project_lock(directory, parsed_args.lock_timeout)
+            )
+
+        return _run(parser, parsed_args)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    start = time.perf_counter()
+    parser = make_parser()
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parsed_args = parser.parse_args(argv)
+
+    if _use_daemon(parsed_args):
+        from yapping import daemon
+
+        response = daemon.request(argv)
+
+        if response is not None:
+            sys.stdout.write(response.stdout)
+            sys.stderr.write(response.stderr)
+            return response.code
+
+    if not parsed_args.timings and parsed_args.trace is None:
+        return _run_locked(parser, parsed_args)
+
+    from yapping import timings
+
+    timings.enable(start)
+    timings.record("parse arguments", start, time.perf_counter())
+
+    try:
+        return _run_locked(parser, parsed_args)
+    finally:
+        timings.record(f"yap {parsed_args.command}", start, time.perf_counter())
+
+        if parsed_args.timings:
+            timings.print_summary(sys.stderr)
+
+        if parsed_args.trace is not None:
+            timings.write_trace(parsed_args.trace)
+
+        timings.disable()
@@ -1,18 +1,49 @@
+import contextlib
+import copy
 import functools
+import hashlib
+import importlib.util
+import json
 import os
 import re
+import shlex
+import shutil
 import site
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 import tomllib
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 from typing import Callable
+from typing import Iterable
+from typing import Iterator
 from typing import NamedTuple
+from typing import Sequence
+from typing import TYPE_CHECKING
 from typing import TypeAlias
 
 import tomli_w
+from packaging.requirements import InvalidRequirement
+from packaging.requirements import Requirement
 
 from yapping import exceptions
+from yapping import hashes
+from yapping import lockfile
+from yapping import locking
+from yapping import progress
+from yapping import store
+from yapping import timings
+from yapping import tomledit
+from yapping.dependencies import DependencyIndex
+from yapping.options import Backend
+from yapping.options import CompileOptions
+from yapping.options import Pins
+
+if TYPE_CHECKING:
+    import click
 
 PyprojectData: TypeAlias = dict[str, Any]
 CommandCallable: TypeAlias = Callable[[PyprojectData, *tuple[str]], PyprojectData]
@@ -28,6 +59,35 @@ TEMPLATE_DIR = os.path.abspath(
     os.path.join(__file__, "../templates/pyproject.toml"),
 )
 
+DEFAULT_OUTPUT_FILENAME = "requirements.txt"
+
+DEFAULT_COMPILE_OPTIONS = CompileOptions()
+
+FINGERPRINT_PREFIX = "# yap-inputs: sha256:"
+
+UPGRADE_ARGS = ("--upgrade", "-P")
+
+# pip treats `#` as a comment at the start of a line or after whitespace.
+REQUIREMENTS_COMMENT_RE = re.compile(r"(^|\s)#.*$")
+INCLUDE_RE = re.compile(r"^(?:-r|--requirement)[\s=]*(\S+)$")
+
+# What pip prints when the requirements cannot be satisfied, as opposed to
+# network or usage errors.
+RESOLUTION_CONFLICTS = (
+    "ResolutionImpossible",
+    "Could not find a version that",
+    "No matching distribution found",
+)
+
+_IN_PROCESS_LOCK = threading.Lock()
+
+# Hash stores the running in-process compile added to, saved once it is done.
+_hash_stores: list[hashes.HashStore] = []
+
+# How long a long-lived process, like `yap daemon`, reuses index lookups. None
+# reuses them for as long as the process lives.
+_metadata_ttl: float | None = None
+
 PYTHON_VERSION = (
     f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
 )
@@ -38,30 +98,678 @@ def _read_write_toml_file(
     pyproject_filename: str,
     *args: str,
 ) -> None:
-    with open(pyproject_filename, "rb") as f:
-        data = tomllib.load(f)
+    with timings.span("read pyproject.toml"), open(pyproject_filename, "rb") as f:
+        text = f.read().decode()
+        data = tomllib.loads(text)
+
+    with timings.span("edit pyproject.toml"):
+        new_data = func(copy.deepcopy(data), *args)
+
+    # Leave the file, and whatever watches it, alone when nothing changed.
+    if new_data == data:
+        return
+
+    with timings.span("write pyproject.toml"):
+        locking.atomic_write(pyproject_filename, tomledit.update(text, data, new_data))
+
+
+def set_metadata_ttl(ttl: float | None) -> None:
+    global _metadata_ttl
+
+    _metadata_ttl = ttl
 
-    new_data = func(data, *args)
 
-    with open(pyproject_filename, "wb") as f:
-        tomli_w.dump(new_data, f)
+def _expired(created: float) -> bool:
+    return _metadata_ttl is not None and time.monotonic() - created > _metadata_ttl
 
 
 @functools.cache
 def find_pip_compile_bin() -> str:
     yap_site = os.path.join("/", *site.getsitepackages()[0].split("/")[:-3])
-    return os.path.join(yap_site, "bin", "pip-compile")
+    candidates = (
+        os.path.join(yap_site, "bin", "pip-compile"),
+        os.path.join(os.path.dirname(sys.executable), "pip-compile"),
+    )
+
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+
+    return candidates[0]
+
+
+@functools.cache
+def resolve_backend(backend: str) -> str:
+    if backend != Backend.AUTO:
+        return backend
+
+    if importlib.util.find_spec("piptools") is None:
+        return Backend.SUBPROCESS
+
+    return Backend.IN_PROCESS
+
+
+@functools.cache
+def _in_process_cli() -> "click.Command":
+    from piptools.repositories import PyPIRepository
+    from piptools.scripts import compile as pip_compile
+    from piptools.utils import as_tuple
+
+    shared_state: dict[tuple[tuple[str, ...], str], tuple[Any, Any, float]] = {}
+
+    class SharedSessionRepository(PyPIRepository):
+        """Share the HTTP session and index lookups between compiles."""
+
+        def __init__(self, pip_args: list[str], cache_dir: str) -> None:
+            super().__init__(pip_args, cache_dir)
+
+            key = (tuple(pip_args), cache_dir)
+
+            if key not in shared_state or _expired(shared_state[key][2]):
+                shared_state[key] = (
+                    self._session,
+                    self._available_candidates_cache,
+                    time.monotonic(),
+                )
+                return
+
+            self._session, self._available_candidates_cache, _ = shared_state[key]
+            self._finder = self.command._build_package_finder(
+                options=self.options, session=self._session
+            )
+
+        @functools.cached_property
+        def hash_store(self) -> hashes.HashStore:
+            store = hashes.HashStore(hashes.store_path(self._cache_dir))
+            _hash_stores.append(store)
+            return store
+
+        def find_all_candidates(self, req_name: str) -> list[Any]:
+            with timings.span("find candidates", package=req_name):
+                return super().find_all_candidates(req_name)
+
+        def _get_req_hashes(self, ireq: Any) -> set[str]:
+            name, version, _ = as_tuple(ireq)
+
+            with timings.span("hash", package=f"{name}=={version}"):
+                return self._get_stored_req_hashes(ireq, name, version)
+
+        def _get_stored_req_hashes(
+            self, ireq: Any, name: str, version: str
+        ) -> set[str]:
+            file_hashes = {}
+            missing = []
+
+            for candidate in self._get_matching_candidates(ireq):
+                file_hash = self.hash_store.get(name, version, candidate.link.filename)
+
+                if file_hash is None:
+                    missing.append(candidate.link)
+                else:
+                    file_hashes[candidate.link.filename] = file_hash
+
+            if not missing:
+                return set(file_hashes.values())
+
+            pypi_hashes = self._get_hashes_from_pypi(ireq)
+
+            for link in missing:
+                file_hash = pypi_hashes.get(link.url) or self._get_file_hash(link)
+                file_hashes[link.filename] = file_hash
+                self.hash_store.add(name, version, link.filename, file_hash)
+
+            return set(file_hashes.values())
+
+    pip_compile.PyPIRepository = SharedSessionRepository  # type: ignore[attr-defined]
+
+    return pip_compile.cli
+
+
+def warm_up(backend: str = Backend.AUTO) -> None:
+    """Import pip-tools ahead of the first compile of a long-lived process."""
+    if resolve_backend(backend) == Backend.IN_PROCESS:
+        _in_process_cli()
+
+
+def _run_pip_compile_subprocess(
+    cmd: tuple[str, ...], output: progress.CompileOutput
+) -> None:
+    with (
+        timings.span("pip-compile", backend=Backend.SUBPROCESS),
+        subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+        ) as process,
+    ):
+        for line in process.stdout or ():
+            output.write_line(line)
+
+        returncode = process.wait()
+
+    if returncode:
+        raise exceptions.CompileError(output.tail())
+
+
+def _run_pip_compile_in_process(
+    args: tuple[str, ...], output: progress.CompileOutput
+) -> None:
+    import click
+    from pip._internal.exceptions import PipError
+
+    cli = _in_process_cli()
+
+    try:
+        with (
+            progress.capture(output),
+            timings.span("pip-compile", backend=Backend.IN_PROCESS),
+        ):
+            cli.main(list(args), prog_name="pip-compile", standalone_mode=False)
+    except click.ClickException as e:
+        raise exceptions.CompileError(e.format_message()) from e
+    except PipError as e:
+        # What pip-compile prints last when run as a subprocess.
+        raise exceptions.CompileError(f"{output.tail()}\n{e}".strip()) from e
+    except SystemExit as e:
+        if e.code:
+            raise exceptions.CompileError(output.tail()) from e
+    finally:
+        _save_hash_stores()
+
+
+def _save_hash_stores() -> None:
+    """Save the hashes of files the in-process compile downloaded, once."""
+    while _hash_stores:
+        _hash_stores.pop().save()
+
+
+def _acquire_in_process(backend: str) -> bool:
+    """Take pip-tools for a compile in this process, if it is not busy.
+
+    pip-tools keeps global state (logging, verbosity), so it runs one compile at
+    a time. With the auto backend, compiles that would wait for it run as
+    subprocesses instead, and --jobs still compiles in parallel.
+    """
+    if backend == Backend.AUTO:
+        return _IN_PROCESS_LOCK.acquire(blocking=False)
+
+    with timings.span("wait for pip-compile"):
+        return _IN_PROCESS_LOCK.acquire()
+
+
+def _run_pip_compile(
+    args: tuple[str, ...],
+    backend: str,
+    output: progress.CompileOutput,
+    python: str | None = None,
+) -> None:
+    if output.watched:
+        # Someone follows the resolution, tell them more than the errors.
+        args = ("--verbose", *(arg for arg in args if arg != "--quiet"))
+
+    if python is not None:
+        # pip-tools resolves for the interpreter it runs on.
+        _run_pip_compile_subprocess(
+            (python, "-m", "piptools", "compile", *args), output
+        )
+    elif resolve_backend(backend) == Backend.IN_PROCESS and _acquire_in_process(
+        backend
+    ):
+        try:
+            _run_pip_compile_in_process(args, output)
+        finally:
+            _IN_PROCESS_LOCK.release()
+    else:
+        with timings.span("find pip-compile"):
+            pip_compile_bin = find_pip_compile_bin()
+
+        _run_pip_compile_subprocess((pip_compile_bin, *args), output)
+
+
+def optional_dependency_groups(pyproject_filename: str) -> list[str]:
+    with open(pyproject_filename, "rb") as f:
+        project = tomllib.load(f)["project"]
+
+    return list(project.get("optional-dependencies", {}))
+
+
+def inputs_fingerprint(
+    pyproject_filename: str, extra: str | None, args: tuple[str, ...]
+) -> str | None:
+    with open(pyproject_filename, "rb") as f:
+        project = tomllib.load(f)["project"]
+
+    if store.has_dynamic_inputs(project, extra):
+        return None
+
+    inputs = {
+        "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+        "requires-python": project.get("requires-python"),
+        "dependencies": sorted(dep.strip() for dep in project.get("dependencies", [])),
+        "extra": sorted(
+            dep.strip()
+            for dep in project.get("optional-dependencies", {}).get(extra, [])
+        ),
+        "args": args,
+    }
+    serialized = json.dumps(inputs, sort_keys=True, separators=(",", ":"))
+
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def read_fingerprint(output_filename: str) -> str | None:
+    with open(output_filename) as f:
+        for line in f:
+            if line.startswith(FINGERPRINT_PREFIX):
+                return line.removeprefix(FINGERPRINT_PREFIX).strip()
+
+            if not line.startswith("#"):
+                break
+
+    return None
 
 
-def compile_dependencies(pyproject_filename: str, *extra_args: str) -> None:
-    cmd = (
-        find_pip_compile_bin(),
-        "--quiet",
-        "--generate-hashes",
-        *extra_args,
-        pyproject_filename,
+def _write_fingerprint(output_filename: str, fingerprint: str) -> None:
+    with open(output_filename) as f:
+        lines = [line for line in f if not line.startswith(FINGERPRINT_PREFIX)]
+
+    locking.atomic_write(
+        output_filename, "".join([f"{FINGERPRINT_PREFIX}{fingerprint}\n", *lines])
     )
-    subprocess.run(cmd, check=True, capture_output=True)
+
+
+def _is_fresh(
+    pyproject_filename: str,
+    output_filename: str,
+    extra: str | None,
+    args: tuple[str, ...],
+) -> bool:
+    if not os.path.exists(output_filename):
+        return False
+
+    fingerprint = inputs_fingerprint(pyproject_filename, extra, args)
+
+    return fingerprint is not None and fingerprint == read_fingerprint(output_filename)
+
+
+def _lock_args(
+    extra: str | None, output_filename: str, extra_args: tuple[str, ...]
+) -> tuple[str, ...]:
+    args = ("--quiet", "--generate-hashes", *extra_args)
+
+    if extra is None:
+        return args
+
+    return (*args, f"--extra={extra}", "-o", output_filename)
+
+
+def is_locked(
+    pyproject_filename: str,
+    output_filename: str,
+    extra: str | None,
+    python_versions: Sequence[str] = (),
+) -> bool:
+    """Whether `yap compile` left the lock files for these exact inputs."""
+    args = _fingerprint_args(_lock_args(extra, output_filename, ()), python_versions)
+
+    return all(
+        _is_fresh(pyproject_filename, output, extra, args)
+        for output in lock_outputs(output_filename, python_versions)
+    )
+
+
+def _is_resolution_conflict(error: exceptions.CompileError) -> bool:
+    return any(message in str(error) for message in RESOLUTION_CONFLICTS)
+
+
+def _run_pip_compile_with_fixed_pins(
+    pyproject_filename: str,
+    output_filename: str,
+    compiled_filename: str,
+    args: tuple[str, ...],
+    options: CompileOptions,
+    output: progress.CompileOutput,
+) -> None:
+    unlocked = {lockfile.requirement_name(pkg) for pkg in options.unlocked}
+    pins = lockfile.read_pins(output_filename)
+
+    with tempfile.NamedTemporaryFile(
+        "w", prefix="yap-pins-", suffix=".txt", delete=False
+    ) as f:
+        f.writelines(
+            f"{name}=={version}\n"
+            for name, version in pins.items()
+            if name not in unlocked
+        )
+
+    try:
+        _run_pip_compile(
+            (*args, f"--constraint={f.name}", pyproject_filename),
+            options.backend,
+            output,
+        )
+    except exceptions.CompileError as e:
+        if not _is_resolution_conflict(e):
+            raise
+
+        # The new packages need some of the pins to move, let pip-tools only
+        # prefer the existing pins instead.
+        _run_pip_compile((*args, pyproject_filename), options.backend, output)
+        return
+    finally:
+        os.unlink(f.name)
+
+    # The pins file is gone, the lock file must not point at it.
+    with open(compiled_filename) as compiled:
+        text = lockfile.strip_constraint(compiled.read(), f.name)
+
+    with open(compiled_filename, "w") as compiled:
+        compiled.write(text)
+
+
+def _compile(
+    pyproject_filename: str,
+    output_filename: str,
+    extra: str | None,
+    args: tuple[str, ...],
+    options: CompileOptions,
+) -> None:
+    with timings.span("compile", lockfile=output_filename):
+        _compile_lockfile(pyproject_filename, output_filename, extra, args, options)
+
+
+def python_version_lockfile(output_filename: str, python_version: str) -> str:
+    root, ext = os.path.splitext(output_filename)
+
+    return f"{root}-py{python_version}{ext}"
+
+
+def lock_outputs(output_filename: str, python_versions: Sequence[str]) -> list[str]:
+    """Where a compile to `output_filename` leaves its lock files.
+
+    That is one per Python version when their locks could not be merged.
+    """
+    if not python_versions or os.path.exists(output_filename):
+        return [output_filename]
+
+    return [
+        python_version_lockfile(output_filename, version) for version in python_versions
+    ]
+
+
+def find_python(python_version: str) -> str:
+    python = shutil.which(f"python{python_version}")
+
+    if python is None:
+        raise exceptions.YappingException(
+            f"Cannot lock for Python {python_version}: python{python_version} "
+            "is not on the PATH."
+        )
+
+    return python
+
+
+def _fingerprint_args(
+    args: tuple[str, ...], python_versions: Sequence[str]
+) -> tuple[str, ...]:
+    # An upgrade locks the same inputs, a later compile has nothing to redo.
+    args = tuple(arg for arg in args if not arg.startswith(UPGRADE_ARGS))
+
+    if not python_versions:
+        return args
+
+    return (*args, f"--python-versions={','.join(python_versions)}")
+
+
+def _compile_python_versions(
+    pyproject_filename: str,
+    output_filename: str,
+    args: tuple[str, ...],
+    options: CompileOptions,
+) -> list[str]:
+    """Compile a lock file for each Python version at once, then merge them.
+
+    Returns the lock files written: the merged one, or one per version when
+    markers cannot tell their requirements apart.
+    """
+    pythons = {version: find_python(version) for version in options.python_versions}
+    outputs = {
+        version: python_version_lockfile(output_filename, version)
+        for version in pythons
+    }
+    seeds = {}
+
+    if os.path.exists(output_filename):
+        with open(output_filename) as f:
+            merged_text = f.read()
+
+        for version, version_output in outputs.items():
+            if not os.path.exists(version_output):
+                # pip-compile prefers the pins of its output file.
+                seeds[version] = lockfile.python_version_lock(merged_text, version)
+
+    def _compile_version(version: str) -> None:
+        version_output = outputs[version]
+        # Like a single lock file, each is compiled to a copy that then
+        # replaces it at once.
+        temporary = locking.temporary_path(version_output)
+
+        if version in seeds:
+            with open(temporary, "x") as f:
+                f.write(seeds[version])
+        elif os.path.exists(version_output):
+            shutil.copyfile(version_output, temporary)
+
+        try:
+            with progress.CompileOutput(
+                f"{output_filename} (Python {version})",
+                options.log,
+                progress.terminal(),
+            ) as output:
+                _run_pip_compile(
+                    (*args, f"--output-file={temporary}", pyproject_filename),
+                    options.backend,
+                    output,
+                    pythons[version],
+                )
+
+            with open(temporary) as f:
+                text = f.read().replace(temporary, version_output)
+
+            locking.atomic_write(version_output, text)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temporary)
+
+    with ThreadPoolExecutor(len(pythons)) as executor:
+        futures = {
+            version: executor.submit(_compile_version, version) for version in pythons
+        }
+
+    errors = [
+        f"Python {version}: {future.exception()}"
+        for version, future in futures.items()
+        if future.exception() is not None
+    ]
+
+    if errors:
+        for version in seeds:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(outputs[version])
+
+        raise exceptions.CompileError("\n".join(errors))
+
+    texts = {}
+
+    for version, version_output in outputs.items():
+        with open(version_output) as f:
+            texts[version] = f.read()
+
+    merged = lockfile.merge_python_versions(texts)
+
+    if merged is None:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(output_filename)
+
+        return list(outputs.values())
+
+    for version_output in outputs.values():
+        # pip-compile records the command it ran in the header.
+        merged = merged.replace(version_output, output_filename)
+
+    locking.atomic_write(output_filename, merged)
+
+    for version_output in outputs.values():
+        os.unlink(version_output)
+
+    return [output_filename]
+
+
+def _compile_single(
+    pyproject_filename: str,
+    output_filename: str,
+    args: tuple[str, ...],
+    options: CompileOptions,
+    force: bool,
+) -> None:
+    # pip-compile rewrites its output file in place, let it write a copy that
+    # then replaces the lock file at once.
+    temporary = locking.temporary_path(output_filename)
+    args = (*args, f"--output-file={temporary}")
+
+    if os.path.exists(output_filename):
+        # pip-compile prefers the pins already in its output file.
+        shutil.copyfile(output_filename, temporary)
+
+    try:
+        with progress.CompileOutput(
+            output_filename, options.log, progress.terminal()
+        ) as output:
+            if (
+                options.pins == Pins.FIX
+                and not force
+                and os.path.exists(output_filename)
+            ):
+                _run_pip_compile_with_fixed_pins(
+                    pyproject_filename,
+                    output_filename,
+                    temporary,
+                    args,
+                    options,
+                    output,
+                )
+            else:
+                _run_pip_compile((*args, pyproject_filename), options.backend, output)
+
+        if os.path.exists(temporary):
+            with open(temporary) as f:
+                # pip-compile records the command it ran in the header.
+                text = f.read().replace(temporary, output_filename)
+
+            locking.atomic_write(output_filename, text)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temporary)
+
+
+def _compile_lockfile(
+    pyproject_filename: str,
+    output_filename: str,
+    extra: str | None,
+    args: tuple[str, ...],
+    options: CompileOptions,
+) -> None:
+    force = options.force or any(arg.startswith(UPGRADE_ARGS) for arg in args)
+    fingerprint_args = _fingerprint_args(args, options.python_versions)
+
+    with timings.span("check fingerprint"):
+        fresh = not force and all(
+            _is_fresh(pyproject_filename, output, extra, fingerprint_args)
+            for output in lock_outputs(output_filename, options.python_versions)
+        )
+
+    if fresh:
+        return
+
+    run_args = args
+
+    if options.cache_dir is not None:
+        run_args = (*run_args, f"--cache-dir={options.cache_dir}")
+
+    store_key = None
+    stored = None
+
+    # Fixed pins come from the lock file in place, not from the inputs alone.
+    if options.lock_store is not None and not (
+        options.pins == Pins.FIX and os.path.exists(output_filename)
+    ):
+        with timings.span("look up lock store"):
+            store_key = store.lock_key(
+                pyproject_filename,
+                output_filename,
+                extra,
+                fingerprint_args,
+                options.python_versions,
+            )
+
+            # pip-compile keeps the pins of an existing lock file, which the
+            # key leaves out: a stored lock file could undo an upgrade.
+            if (
+                store_key is not None
+                and not force
+                and not any(
+                    os.path.exists(output)
+                    for output in lock_outputs(output_filename, options.python_versions)
+                )
+            ):
+                stored = store.fetch(options.lock_store, store_key)
+
+    if stored is not None:
+        outputs = [output_filename]
+        locking.atomic_write(output_filename, stored)
+    elif options.python_versions:
+        outputs = _compile_python_versions(
+            pyproject_filename, output_filename, run_args, options
+        )
+    else:
+        outputs = [output_filename]
+        _compile_single(pyproject_filename, output_filename, run_args, options, force)
+
+    if (
+        options.lock_store is not None
+        and store_key is not None
+        and stored is None
+        and outputs == [output_filename]
+        and os.path.exists(output_filename)
+    ):
+        with timings.span("publish to lock store"), open(output_filename) as f:
+            store.publish(options.lock_store, store_key, f.read())
+
+    outputs = [output_file for output_file in outputs if os.path.exists(output_file)]
+
+    if not outputs:
+        return
+
+    with timings.span("write fingerprint"):
+        fingerprint = inputs_fingerprint(pyproject_filename, extra, fingerprint_args)
+
+        if fingerprint is not None:
+            for output_file in outputs:
+                _write_fingerprint(output_file, fingerprint)
+
+
+def compile_dependencies(
+    pyproject_filename: str,
+    *extra_args: str,
+    options: CompileOptions = DEFAULT_COMPILE_OPTIONS,
+) -> None:
+    output_filename = os.path.join(
+        os.path.dirname(pyproject_filename), DEFAULT_OUTPUT_FILENAME
+    )
+    args = _lock_args(None, output_filename, extra_args)
+    _compile(pyproject_filename, output_filename, None, args, options)
 
 
 def compile_test_dependencies(
@@ -69,135 +777,315 @@ def compile_test_dependencies(
     test_extra: str,
     test_requirements_output_file: str,
     *extra_args: str,
+    options: CompileOptions = DEFAULT_COMPILE_OPTIONS,
 ) -> None:
-    cmd = (
-        find_pip_compile_bin(),
-        "--quiet",
-        "--generate-hashes",
-        *extra_args,
-        f"--extra={test_extra}",
-        "-o",
-        test_requirements_output_file,
-        pyproject_filename,
+    args = _lock_args(test_extra, test_requirements_output_file, extra_args)
+    _compile(
+        pyproject_filename, test_requirements_output_file, test_extra, args, options
     )
-    subprocess.run(cmd, check=True, capture_output=True)
 
 
-def remove_dependency(pyproject_filename: str, *packages: str) -> None:
-    def _(pyproject_data: PyprojectData, *packages: str) -> PyprojectData:
-        dependencies = set(pyproject_data["project"]["dependencies"])
+def _remove_dependency(pyproject_data: PyprojectData, *packages: str) -> PyprojectData:
+    dependencies = DependencyIndex(pyproject_data["project"]["dependencies"])
 
-        for pkg in packages:
-            if pkg in dependencies:
-                dependencies.remove(pkg)
+    for pkg in packages:
+        dependencies.remove(pkg)
 
-        pyproject_data["project"]["dependencies"] = sorted(dependencies, key=str.lower)
+    pyproject_data["project"]["dependencies"] = list(dependencies)
 
-        return pyproject_data
+    return pyproject_data
 
-    _read_write_toml_file(_, pyproject_filename, *packages)
 
+def _remove_optional_dependency(
+    pyproject_data: PyprojectData, extra: str, *packages: str
+) -> PyprojectData:
+    dependencies = DependencyIndex(
+        pyproject_data["project"]["optional-dependencies"][extra]
+    )
 
-def remove_optional_dependency(
-    pyproject_filename: str, extra: str, *packages: str
-) -> None:
-    def _(pyproject_data: PyprojectData, *packages: str) -> PyprojectData:
-        dependencies = set(pyproject_data["project"]["optional-dependencies"][extra])
+    for pkg in packages:
+        dependencies.remove(pkg)
+
+    pyproject_data["project"]["optional-dependencies"][extra] = list(dependencies)
+
+    return pyproject_data
+
+
+def _add_dependency(pyproject_data: PyprojectData, *packages: str) -> PyprojectData:
+    dependencies = DependencyIndex(pyproject_data["project"]["dependencies"])
+    dependencies.update(packages)
+    pyproject_data["project"]["dependencies"] = list(dependencies)
+
+    return pyproject_data
 
-        for pkg in packages:
-            if pkg in dependencies:
-                dependencies.remove(pkg)
 
-        pyproject_data["project"]["optional-dependencies"][extra] = sorted(
-            dependencies, key=str.lower
+def _add_optional_dependency(
+    pyproject_data: PyprojectData, extra: str, *packages: str
+) -> PyprojectData:
+    optional_dependencies = pyproject_data["project"].setdefault(
+        "optional-dependencies", {}
+    )
+    dependencies = DependencyIndex(optional_dependencies.get(extra, []))
+    dependencies.update(packages)
+    optional_dependencies[extra] = list(dependencies)
+
+    return pyproject_data
+
+
+def _update_version(pyproject_data: PyprojectData, version_type: str) -> PyprojectData:
+    version = pyproject_data["project"]["version"]
+
+    if not re.match(r"\d\.\d\.\d", version):
+        raise exceptions.YappingException("Version does not match semver: X.Y.Z")
+
+    current_version = Version(*version.split("."))
+
+    new_version: Version | None = None
+    if version_type == "patch":
+        new_version = Version(
+            current_version.major,
+            current_version.minor,
+            str(int(current_version.patch) + 1),
+        )
+    elif version_type == "minor":
+        new_version = Version(
+            current_version.major,
+            str(int(current_version.minor) + 1),
+            "0",
+        )
+    else:
+        new_version = Version(
+            str(int(current_version.major) + 1),
+            "0",
+            "0",
         )
 
-        return pyproject_data
+    pyproject_data["project"]["version"] = ".".join(new_version)
 
-    _read_write_toml_file(_, pyproject_filename, *packages)
+    return pyproject_data
 
 
-def add_dependency(pyproject_filename: str, *packages: str) -> None:
-    def _(pyproject_data: PyprojectData, *packages: str) -> PyprojectData:
-        dependencies = set(pyproject_data["project"]["dependencies"])
+def remove_dependency(pyproject_filename: str, *packages: str) -> None:
+    _read_write_toml_file(_remove_dependency, pyproject_filename, *packages)
 
-        for pkg in packages:
-            dependencies.add(pkg)
 
-        pyproject_data["project"]["dependencies"] = sorted(dependencies, key=str.lower)
+def remove_optional_dependency(
+    pyproject_filename: str, extra: str, *packages: str
+) -> None:
+    _read_write_toml_file(
+        _remove_optional_dependency, pyproject_filename, extra, *packages
+    )
 
-        return pyproject_data
 
-    _read_write_toml_file(_, pyproject_filename, *packages)
+def add_dependency(pyproject_filename: str, *packages: str) -> None:
+    _read_write_toml_file(_add_dependency, pyproject_filename, *packages)
 
 
 def add_optional_dependency(
     pyproject_filename: str, extra: str, *packages: str
 ) -> None:
-    def _(pyproject_data: PyprojectData, *packages: str) -> PyprojectData:
-        dependencies = set(pyproject_data["project"]["optional-dependencies"][extra])
+    _read_write_toml_file(
+        _add_optional_dependency, pyproject_filename, extra, *packages
+    )
 
-        for pkg in packages:
-            dependencies.add(pkg)
 
-        pyproject_data["project"]["optional-dependencies"][extra] = sorted(
-            dependencies, key=str.lower
-        )
+def _requirement_lines(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    """The logical lines of a requirements file and where they start."""
+    parts: list[str] = []
+    start = 1
 
-        return pyproject_data
+    for lineno, line in enumerate(lines, 1):
+        if not parts:
+            start = lineno
 
-    _read_write_toml_file(_, pyproject_filename, *packages)
+        line = REQUIREMENTS_COMMENT_RE.sub("", line).strip()
 
+        if line.endswith("\\"):
+            parts.append(line[:-1].strip())
+            continue
 
-def update_version(pyproject_filename: str, version_type: str) -> None:
-    def _(pyproject_data: PyprojectData, version_type: str) -> PyprojectData:
-        version = pyproject_data["project"]["version"]
+        logical = " ".join(part for part in (*parts, line) if part)
+        parts = []
+
+        if logical:
+            yield start, logical
+
+    if parts:
+        yield start, " ".join(part for part in parts if part)
+
+
+def _parse_requirements(
+    lines: Iterable[str], source: str, seen: set[str]
+) -> Iterator[str]:
+    for lineno, line in _requirement_lines(lines):
+        include = INCLUDE_RE.match(line)
 
-        if not re.match(r"\d\.\d\.\d", version):
-            raise exceptions.YappingException("Version does not match semver: X.Y.Z")
+        if include:
+            filename = os.path.join(os.path.dirname(source), include[1])
 
-        current_version = Version(*version.split("."))
+            if os.path.abspath(filename) in seen:
+                continue
 
-        new_version: Version | None = None
-        if version_type == "patch":
-            new_version = Version(
-                current_version.major,
-                current_version.minor,
-                str(int(current_version.patch) + 1),
+            seen.add(os.path.abspath(filename))
+
+            try:
+                with open(filename) as f:
+                    yield from _parse_requirements(f, filename, seen)
+            except FileNotFoundError as e:
+                raise exceptions.YappingException(
+                    f"{source}:{lineno}: no such file: {filename}"
+                ) from e
+
+            continue
+
+        if line.startswith("-"):
+            raise exceptions.YappingException(
+                f"{source}:{lineno}: {line.split()[0]} cannot go in pyproject.toml"
             )
-        elif version_type == "minor":
-            new_version = Version(
-                current_version.major,
-                str(int(current_version.minor) + 1),
-                "0",
+
+        try:
+            Requirement(line)
+        except InvalidRequirement as e:
+            raise exceptions.YappingException(
+                f"{source}:{lineno}: invalid requirement {line!r}: "
+                f"{str(e).splitlines()[0]}"
+            ) from e
+
+        yield line
+
+
+def parse_requirements(lines: Iterable[str], source: str) -> Iterator[str]:
+    """The requirements of a requirements file, checked as they are read.
+
+    `-r FILE` includes another file, relative to `source`. Other pip options
+    have no equivalent in pyproject.toml and are rejected.
+    """
+    return _parse_requirements(lines, source, {os.path.abspath(source)})
+
+
+def read_requirements_file(filename: str) -> list[str]:
+    """The requirements of `filename`, or of stdin for `-`."""
+    if filename == "-":
+        return list(parse_requirements(sys.stdin, "<stdin>"))
+
+    try:
+        with open(filename) as f:
+            return list(parse_requirements(f, filename))
+    except FileNotFoundError as e:
+        raise exceptions.YappingException(f"No such file: {filename}") from e
+
+
+def update_version(pyproject_filename: str, version_type: str) -> None:
+    _read_write_toml_file(_update_version, pyproject_filename, version_type)
+
+
+class BatchOperation:
+    ADD = "add"
+    REMOVE = "rm"
+    ADD_EXTRA = "add-extra"
+    REMOVE_EXTRA = "rm-extra"
+    VERSION = "version"
+
+
+BATCH_OPERATIONS: dict[str, Callable[..., PyprojectData]] = {
+    BatchOperation.ADD: _add_dependency,
+    BatchOperation.REMOVE: _remove_dependency,
+    BatchOperation.ADD_EXTRA: _add_optional_dependency,
+    BatchOperation.REMOVE_EXTRA: _remove_optional_dependency,
+    BatchOperation.VERSION: _update_version,
+}
+
+VERSION_TYPES = ("patch", "minor", "major")
+
+
+class Operation(NamedTuple):
+    name: str
+    args: tuple[str, ...]
+
+
+class BatchResult(NamedTuple):
+    dependencies_changed: bool
+    changed_extras: frozenset[str]
+
+
+def parse_operation(line: str) -> Operation:
+    name, *args = shlex.split(line) or [""]
+
+    if name not in BATCH_OPERATIONS:
+        raise exceptions.YappingException(f"Unknown batch operation: {line!r}")
+
+    if name in (BatchOperation.ADD_EXTRA, BatchOperation.REMOVE_EXTRA):
+        if len(args) < 2:
+            raise exceptions.YappingException(
+                f"`{name}` expects an extra name and at least one package: {line!r}"
             )
-        else:
-            new_version = Version(
-                str(int(current_version.major) + 1),
-                "0",
-                "0",
+    elif name == BatchOperation.VERSION:
+        if len(args) != 1 or args[0] not in VERSION_TYPES:
+            raise exceptions.YappingException(
+                f"`{name}` expects one of {', '.join(VERSION_TYPES)}: {line!r}"
             )
+    elif not args:
+        raise exceptions.YappingException(
+            f"`{name}` expects at least one package: {line!r}"
+        )
+
+    return Operation(name, tuple(args))
 
-        pyproject_data["project"]["version"] = ".".join(new_version)
+
+def parse_operations(lines: Iterable[str]) -> list[Operation]:
+    return [
+        parse_operation(line)
+        for line in lines
+        if line.strip() and not line.lstrip().startswith("#")
+    ]
+
+
+def batch(pyproject_filename: str, operations: Sequence[Operation]) -> BatchResult:
+    def _(pyproject_data: PyprojectData, *args: str) -> PyprojectData:
+        for operation in operations:
+            pyproject_data = BATCH_OPERATIONS[operation.name](
+                pyproject_data, *operation.args
+            )
 
         return pyproject_data
 
-    _read_write_toml_file(_, pyproject_filename, version_type)
+    _read_write_toml_file(_, pyproject_filename)
+
+    return BatchResult(
+        dependencies_changed=any(
+            op.name in (BatchOperation.ADD, BatchOperation.REMOVE) for op in operations
+        ),
+        changed_extras=frozenset(
+            op.args[0]
+            for op in operations
+            if op.name in (BatchOperation.ADD_EXTRA, BatchOperation.REMOVE_EXTRA)
+        ),
+    )
 
 
-def init(project_name: str, output_dir: str) -> None:
+def init(
+    project_name: str, output_dir: str, python_versions: Sequence[str] = ()
+) -> None:
     with open(TEMPLATE_DIR, "rb") as f:
         template_data = tomllib.load(f)
 
     template_data["project"]["name"] = project_name
     template_data["project"]["requires-python"] = f">={PYTHON_VERSION}"
 
+    if python_versions:
+        # yap sorts the versions, the oldest comes first.
+        template_data["project"]["requires-python"] = f">={python_versions[0]}"
+        template_data.setdefault("tool", {}).setdefault("yapping", {})[
+            "python-versions"
+        ] = list(python_versions)
+
     output_filename = os.path.join(output_dir, "pyproject.toml")
 
-    if os.path.exists(output_filename):
+    try:
+        locking.atomic_write(
+            output_filename, tomli_w.dumps(template_data), exclusive=True
+        )
+    except FileExistsError:
         raise exceptions.YappingException(
             "Will not overwrite existing `pyproject.toml` file."
-        )
-
-    with open(output_filename, "wb") as f:
-        tomli_w.dump(template_data, f)
+        ) from None
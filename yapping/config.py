@@ -0,0 +1,23 @@
+import os
+import tomllib
+from typing import Any
+
+TOOL_NAME = "yapping"
+
+
+def read_config(pyproject_filename: str) -> dict[str, Any]:
+    try:
+        with open(pyproject_filename, "rb") as f:
+            data = tomllib.load(f)
+    except FileNotFoundError:
+        return {}
+
+    config: dict[str, Any] = data.get("tool", {}).get(TOOL_NAME, {})
+
+    return config
+
+
+def config_path(pyproject_filename: str, value: str) -> str:
+    path = os.path.expanduser(value)
+
+    return os.path.join(os.path.dirname(os.path.abspath(pyproject_filename)), path)
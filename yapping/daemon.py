@@ -0,0 +1,260 @@
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Any
+from typing import NamedTuple
+from typing import Sequence
+
+from yapping import exceptions
+
+SOCKET_ENV = "YAP_DAEMON_SOCKET"
+
+BUFFER_SIZE = 64 * 1024
+
+# The pid, uid and gid of the process at the other end of a Unix socket.
+CREDENTIALS = struct.Struct("3i")
+
+
+class Response(NamedTuple):
+    code: int
+    stdout: str
+    stderr: str
+
+
+def socket_path() -> str:
+    path = os.environ.get(SOCKET_ENV)
+
+    if path:
+        return path
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+
+    # In a directory of its own, the shared temporary directory would let
+    # other users put their socket in its place.
+    return os.path.join(runtime_dir, f"yap-{os.getuid()}", "daemon.sock")
+
+
+def _check_directory(path: str) -> None:
+    """Make sure only the current user can reach the sockets in `path`."""
+    info = os.lstat(path)
+
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise exceptions.YappingException(
+            f"{path} must be a directory that only the current user can access"
+        )
+
+
+def _peer_uid(connection: socket.socket, path: str) -> int:
+    try:
+        credentials = connection.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, CREDENTIALS.size
+        )
+    except AttributeError:  # pragma: linux no cover
+        # Without SO_PEERCRED, go by who created the socket.
+        return os.stat(path).st_uid
+
+    uid: int = CREDENTIALS.unpack(credentials)[1]
+
+    return uid
+
+
+def _environment() -> dict[str, str]:
+    # pip reads its options from these, a daemon started with others would
+    # resolve against another index.
+    return {key: value for key, value in os.environ.items() if key.startswith("PIP_")}
+
+
+def _send(message: dict[str, Any]) -> dict[str, Any] | None:
+    """Send `message` to the daemon and return its reply, None when none runs."""
+    path = socket_path()
+
+    try:
+        _check_directory(os.path.dirname(os.path.abspath(path)))
+    except FileNotFoundError:
+        return None
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(path)
+        except OSError:
+            return None
+
+        if _peer_uid(client, path) != os.getuid():
+            raise exceptions.YappingException(
+                f"The yap daemon on {path} is run by another user"
+            )
+
+        client.sendall(json.dumps(message).encode())
+        client.shutdown(socket.SHUT_WR)
+        chunks = []
+
+        while chunk := client.recv(BUFFER_SIZE):
+            chunks.append(chunk)
+
+    if not chunks:
+        raise exceptions.YappingException("The yap daemon closed the connection")
+
+    reply: dict[str, Any] = json.loads(b"".join(chunks))
+
+    return reply
+
+
+def request(argv: Sequence[str]) -> Response | None:
+    """Run `yap argv` in the daemon, None when there is no daemon that can."""
+    reply = _send(
+        {
+            "argv": list(argv),
+            "cwd": os.getcwd(),
+            "executable": sys.executable,
+            "env": _environment(),
+        }
+    )
+
+    if reply is None or reply.get("fallback"):
+        return None
+
+    return Response(reply["code"], reply["stdout"], reply["stderr"])
+
+
+def status() -> dict[str, Any] | None:
+    return _send({"status": True})
+
+
+def stop() -> bool:
+    return _send({"stop": True}) is not None
+
+
+def run(argv: Sequence[str], cwd: str) -> Response:
+    """Run `yap argv` from `cwd` in this process and capture what it prints."""
+    from yapping import cli
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    previous_cwd = os.getcwd()
+
+    try:
+        os.chdir(cwd)
+
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                code = cli.main(["--no-daemon", *argv])
+            except SystemExit as e:
+                if isinstance(e.code, str):
+                    print(e.code, file=sys.stderr)
+
+                code = e.code if isinstance(e.code, int) else int(e.code is not None)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+    finally:
+        os.chdir(previous_cwd)
+
+    return Response(code, stdout.getvalue(), stderr.getvalue())
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def handle(self) -> None:
+        try:
+            message = json.loads(self.rfile.read())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            message = None
+
+        if isinstance(message, dict):
+            reply = self.server.reply(message)
+        else:
+            # Not sent by yap, there is no command to run.
+            reply = {"error": "Invalid request"}
+
+        # Clients that give up, like on a daemon of another user, hang up first.
+        with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+            self.wfile.write(json.dumps(reply).encode())
+
+
+class _Server(socketserver.UnixStreamServer):
+    """Run one command at a time, they share the working directory and pip-tools."""
+
+    def __init__(self, path: str, ttl: float) -> None:
+        super().__init__(path, _Handler)
+        self.path = path
+        self.ttl = ttl
+        self.started = time.monotonic()
+        self.requests = 0
+
+    def reply(self, message: dict[str, Any]) -> dict[str, Any]:
+        if message.get("stop"):
+            # `shutdown` waits for `serve_forever`, which is running this.
+            threading.Thread(target=self.shutdown).start()
+            return {"stopping": True}
+
+        if message.get("status"):
+            return {
+                "pid": os.getpid(),
+                "socket": self.path,
+                "uptime": time.monotonic() - self.started,
+                "requests": self.requests,
+                "ttl": self.ttl,
+            }
+
+        if message["executable"] != sys.executable or message["env"] != _environment():
+            return {"fallback": True}
+
+        self.requests += 1
+
+        return run(message["argv"], message["cwd"])._asdict()
+
+
+def serve(ttl: float) -> None:
+    """Serve yap commands on the socket until stopped.
+
+    Index lookups are reused for `ttl` seconds, so that new releases are seen.
+    """
+    from yapping import commands
+
+    path = socket_path()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _check_directory(directory)
+
+    if os.path.exists(path):
+        if status() is not None:
+            raise exceptions.YappingException(
+                f"A yap daemon is already listening on {path}"
+            )
+
+        # Left behind by a daemon that did not stop cleanly.
+        os.unlink(path)
+
+    commands.set_metadata_ttl(ttl)
+    commands.warm_up()
+    # Only the user running the daemon can send it commands.
+    umask = os.umask(0o177)
+
+    try:
+        server = _Server(path, ttl)
+    finally:
+        os.umask(umask)
+
+    try:
+        with server:
+            server.serve_forever()
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+
+        commands.set_metadata_ttl(None)
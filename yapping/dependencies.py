@@ -0,0 +1,81 @@
+import bisect
+from typing import Iterable
+from typing import Iterator
+
+from yapping import lockfile
+
+
+class DependencyIndex:
+    """Requirement strings sorted and looked up by normalized project name.
+
+    A name can have several entries, e.g. one per environment marker. Adding a
+    requirement replaces every entry of its project.
+    """
+
+    def __init__(self, requirements: Iterable[str] = ()) -> None:
+        entries = sorted(
+            (
+                (lockfile.requirement_name(requirement), requirement)
+                for requirement in requirements
+            ),
+            key=lambda entry: entry[0],
+        )
+        self._names = [name for name, _ in entries]
+        self._requirements = [requirement for _, requirement in entries]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._requirements)
+
+    def __contains__(self, requirement: object) -> bool:
+        if not isinstance(requirement, str):
+            return False
+
+        start, end = self._range(requirement)
+
+        return start < end
+
+    def _range(self, requirement: str) -> tuple[int, int]:
+        name = lockfile.requirement_name(requirement)
+
+        return (
+            bisect.bisect_left(self._names, name),
+            bisect.bisect_right(self._names, name),
+        )
+
+    def get(self, requirement: str) -> list[str]:
+        start, end = self._range(requirement)
+
+        return self._requirements[start:end]
+
+    def add(self, requirement: str) -> None:
+        start, end = self._range(requirement)
+        self._names[start:end] = [lockfile.requirement_name(requirement)]
+        self._requirements[start:end] = [requirement]
+
+    def update(self, requirements: Iterable[str]) -> None:
+        """Add several requirements, keeping the last one per project and marker.
+
+        Unlike `add`, entries of a project that only differ in their marker are
+        all kept, as a requirements file may list one per environment.
+        """
+        projects: dict[str, dict[str, str]] = {}
+
+        for requirement in requirements:
+            _, _, marker = requirement.partition(";")
+            projects.setdefault(lockfile.requirement_name(requirement), {})[
+                marker.strip()
+            ] = requirement
+
+        for name, entries in projects.items():
+            start, end = self._range(name)
+            self._names[start:end] = [name] * len(entries)
+            self._requirements[start:end] = list(entries.values())
+
+    def remove(self, requirement: str) -> list[str]:
+        """Remove every entry of the project of `requirement` and return them."""
+        start, end = self._range(requirement)
+        removed = self._requirements[start:end]
+        del self._names[start:end]
+        del self._requirements[start:end]
+
+        return removed
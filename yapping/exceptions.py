@@ -1,2 +1,6 @@
 class YappingException(Exception):
     pass
+
+
+class CompileError(YappingException):
+    pass
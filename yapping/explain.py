@@ -0,0 +1,122 @@
+from typing import Callable
+from typing import Iterable
+
+from yapping import exceptions
+from yapping import lockfile
+from yapping.lockfile import LockedPackage
+from yapping.lockfile import LockIndex
+
+INDENT = "  "
+
+
+def _pins(index: LockIndex, name: str) -> list[LockedPackage]:
+    pins = index.packages.get(lockfile.normalize_name(name))
+
+    if not pins:
+        raise exceptions.YappingException(f"{name} is not locked in {index.filename}")
+
+    return pins
+
+
+def _pin_label(package: LockedPackage) -> str:
+    label = f"{package.name}=={package.version}"
+
+    return f"{label} ; {package.marker}" if package.marker else label
+
+
+def _label(index: LockIndex, node: str) -> str:
+    if node not in index.packages:
+        return node
+
+    return " | ".join(_pin_label(package) for package in index.packages[node])
+
+
+def _via(index: LockIndex, node: str) -> list[str]:
+    via: dict[str, None] = {}
+
+    for package in index.packages.get(node, ()):
+        via.update(dict.fromkeys(package.via))
+
+    return list(via)
+
+
+def _tree(
+    index: LockIndex, roots: Iterable[str], children: Callable[[str], list[str]]
+) -> list[str]:
+    lines: list[str] = []
+    expanded: set[str] = set()
+
+    def _visit(node: str, depth: int) -> None:
+        label = f"{INDENT * depth}{_label(index, node)}"
+        nodes = children(node)
+
+        if node in expanded and nodes:
+            lines.append(f"{label} (see above)")
+            return
+
+        lines.append(label)
+        expanded.add(node)
+
+        for child in nodes:
+            _visit(child, depth + 1)
+
+    for root in roots:
+        _visit(root, 0)
+
+    return lines
+
+
+def why(index: LockIndex, name: str) -> list[str]:
+    """What pulls `name` in, up to the files that pip-compile read."""
+    package = _pins(index, name)[0]
+
+    return _tree(index, [package.name], lambda node: _via(index, node))
+
+
+def tree(index: LockIndex, name: str | None = None) -> list[str]:
+    """What the project requires, or `name` does, with what they require in turn."""
+    if name is not None:
+        roots = [_pins(index, name)[0].name]
+    else:
+        # The input files, and the packages nothing seems to require.
+        roots = sorted(node for node in index.requires if node not in index.packages)
+        roots.extend(
+            name
+            for name, pins in index.packages.items()
+            if not any(package.via for package in pins)
+        )
+
+    return _tree(index, roots, lambda node: index.requires.get(node, []))
+
+
+def show(index: LockIndex, name: str) -> list[str]:
+    """Everything the lock file says about `name`, one block per pin."""
+    lines: list[str] = []
+
+    for package in _pins(index, name):
+        if lines:
+            lines.append("")
+
+        lines.extend(
+            (
+                f"name: {package.name}",
+                f"version: {package.version}",
+            )
+        )
+
+        if package.marker:
+            lines.append(f"marker: {package.marker}")
+
+        lines.extend(
+            (
+                f"requires: {', '.join(index.requires.get(package.name, []))}".rstrip(),
+                f"required by: {', '.join(package.via)}".rstrip(),
+            )
+        )
+        hashes = lockfile.read_package_hashes(index.filename, package)
+
+        if hashes:
+            lines.append("hashes:")
+            lines.extend(f"{INDENT}{hash_}" for hash_ in hashes)
+
+    return lines
@@ -0,0 +1,68 @@
+import json
+import os
+from typing import Any
+
+from yapping import lockfile
+from yapping import locking
+
+STORE_FILENAME = "yap-hashes.json"
+
+
+def store_path(cache_dir: str) -> str:
+    return os.path.join(os.path.abspath(os.path.expanduser(cache_dir)), STORE_FILENAME)
+
+
+def _key(name: str, version: str) -> str:
+    return f"{lockfile.normalize_name(name)}=={version}"
+
+
+class HashStore:
+    """Hashes of distribution files, kept between compiles.
+
+    `files` maps `name==version` to the hash of each file by filename and is
+    filled when pip-tools hashes a file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.files: dict[str, dict[str, str]] = {}
+        self._changed = False
+
+        self._merge(self._load())
+
+    def _load(self) -> dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        return data if isinstance(data, dict) else {}
+
+    def _merge(self, data: dict[str, Any]) -> None:
+        for key, files in data.get("files", {}).items():
+            self.files.setdefault(key, {}).update(files)
+
+    def get(self, name: str, version: str, filename: str) -> str | None:
+        return self.files.get(_key(name, version), {}).get(filename)
+
+    def add(self, name: str, version: str, filename: str, file_hash: str) -> None:
+        self.files.setdefault(_key(name, version), {})[filename] = file_hash
+        self._changed = True
+
+    def save(self) -> None:
+        if not self._changed:
+            return
+
+        # Keep what other processes stored since this store was loaded.
+        on_disk = self._load()
+        self.files = {
+            key: {**on_disk.get("files", {}).get(key, {}), **files}
+            for key, files in {**on_disk.get("files", {}), **self.files}.items()
+        }
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        locking.atomic_write(self.path, json.dumps({"files": self.files}))
+
+        self._changed = False
@@ -0,0 +1,445 @@
+import re
+from typing import Iterable
+from typing import Iterator
+from typing import NamedTuple
+
+PIN_RE = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(?:\[[^\]]*\])?==([^\s;\\]+)")
+NAME_RE = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+HASH_RE = re.compile(r"--hash=(\w+:[0-9a-fA-F]+)")
+PACKAGE_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+EDITABLE_RE = re.compile(r"^(?:-e|--editable)[\s=]+(\S+)")
+EGG_RE = re.compile(r"[#&]egg=([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+
+class LockedRequirement(NamedTuple):
+    name: str
+    version: str
+    # The requirement with its marker and hashes, as pip reads it.
+    line: str
+    marker: str | None
+    # Where a direct reference or an editable requirement is installed from,
+    # they are not pinned to a version.
+    url: str | None = None
+
+
+def normalize_name(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def requirement_name(requirement: str) -> str:
+    match = NAME_RE.match(requirement)
+
+    return normalize_name(match[1]) if match else requirement.strip().lower()
+
+
+def read_pins(
+    lockfile_filename: str, python_version: str | None = None
+) -> dict[str, str]:
+    """The pinned versions, those that apply to `python_version` if given."""
+    pins: dict[str, str] = {}
+
+    with open(lockfile_filename) as f:
+        lines: Iterable[str] = f
+
+        if python_version is not None:
+            lines = python_version_lock(f.read(), python_version).splitlines()
+
+        for line in lines:
+            match = PIN_RE.match(line)
+
+            if match:
+                pins[normalize_name(match[1])] = match[2]
+
+    return pins
+
+
+def _logical_lines(lines: Iterable[str]) -> Iterator[str]:
+    parts: list[str] = []
+
+    for line in lines:
+        line = line.strip()
+
+        if line.startswith("#"):
+            continue
+
+        if line.endswith("\\"):
+            parts.append(line[:-1].strip())
+            continue
+
+        parts.append(line)
+        yield " ".join(part for part in parts if part)
+        parts = []
+
+    if parts:
+        yield " ".join(part for part in parts if part)
+
+
+def _direct_requirement(line: str) -> LockedRequirement | None:
+    """A `name @ url` or `-e url` line, which pip-compile does not pin.
+
+    Editable requirements only have a name when their URL says `#egg=name`.
+    """
+    # Only syncing reads these, the commands that explain lock files do not.
+    from packaging.requirements import InvalidRequirement
+    from packaging.requirements import Requirement
+
+    requirement, _, _ = line.partition(" --")
+    editable = EDITABLE_RE.match(requirement)
+
+    if editable:
+        url = editable[1]
+        egg = EGG_RE.search(url)
+
+        return LockedRequirement(
+            normalize_name(egg[1]) if egg else "", "", line, None, url
+        )
+
+    try:
+        parsed = Requirement(requirement)
+    except InvalidRequirement:
+        return None
+
+    if parsed.url is None:
+        return None
+
+    marker = str(parsed.marker) if parsed.marker is not None else None
+
+    return LockedRequirement(normalize_name(parsed.name), "", line, marker, parsed.url)
+
+
+def read_requirements(lockfile_filename: str) -> list[LockedRequirement]:
+    requirements = []
+
+    with open(lockfile_filename) as f:
+        for line in _logical_lines(f):
+            match = PIN_RE.match(line)
+
+            if not match:
+                direct = _direct_requirement(line)
+
+                if direct is not None:
+                    requirements.append(direct)
+
+                continue
+
+            requirement, _, _ = line.partition(" --")
+            _, _, marker = requirement.partition(";")
+            requirements.append(
+                LockedRequirement(
+                    normalize_name(match[1]), match[2], line, marker.strip() or None
+                )
+            )
+
+    return requirements
+
+
+def rename_project(lockfile_text: str, old_name: str, new_name: str) -> str:
+    """Point the `# via` annotations of a lock file at another project."""
+    names = {old_name, normalize_name(old_name)}
+    pattern = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+
+    return re.sub(
+        rf"(?<![\w.-])(?:{pattern}) \(pyproject\.toml\)",
+        f"{new_name} (pyproject.toml)",
+        lockfile_text,
+    )
+
+
+def _via_lines(entries: list[str]) -> list[str]:
+    if not entries:
+        return []
+
+    if len(entries) == 1:
+        return [f"    # via {entries[0]}\n"]
+
+    return ["    # via\n", *(f"    #   {entry}\n" for entry in entries)]
+
+
+def strip_constraint(lockfile_text: str, constraint_filename: str) -> str:
+    """Leave a constraints file given to pip-compile out of the lock file.
+
+    The header and the `# via` annotations then read as if pip-compile had
+    found the same pins without it.
+    """
+    constraint = f"-c {constraint_filename}"
+    lines: list[str] = []
+    via: list[str] | None = None
+
+    for line in lockfile_text.replace(
+        f" --constraint={constraint_filename}", ""
+    ).splitlines(keepends=True):
+        comment = line.strip()
+
+        if via is not None:
+            if comment.startswith("#   "):
+                via.append(comment[1:].strip())
+                continue
+
+            lines.extend(_via_lines([entry for entry in via if entry != constraint]))
+            via = None
+
+        if comment == "# via":
+            via = []
+        elif comment != f"# via {constraint}":
+            lines.append(line)
+
+    if via is not None:
+        lines.extend(_via_lines([entry for entry in via if entry != constraint]))
+
+    return "".join(lines)
+
+
+def read_direct(lockfile_filename: str) -> set[str]:
+    """The pins that pyproject.toml asks for, going by their `# via` annotations."""
+    direct = set()
+    pin = None
+
+    with open(lockfile_filename) as f:
+        for line in f:
+            match = PIN_RE.match(line)
+
+            if match:
+                pin = normalize_name(match[1])
+            elif not line[:1].isspace():
+                pin = None
+            elif pin is not None and "(pyproject.toml)" in line:
+                direct.add(pin)
+
+    return direct
+
+
+class _Lock(NamedTuple):
+    header: list[str]
+    options: list[str]
+    # The lines of each requirement, with its hashes and annotations.
+    blocks: list[list[str]]
+
+
+def _split(lockfile_text: str) -> _Lock:
+    lock = _Lock([], [], [])
+
+    for line in lockfile_text.splitlines():
+        line = f"{line}\n"
+
+        if line[:1].isspace() and lock.blocks:
+            lock.blocks[-1].append(line)
+        elif line.startswith("--"):
+            lock.options.append(line)
+        elif line.startswith("#"):
+            # Comments after the first requirement are pip-compile's footer.
+            if not lock.blocks:
+                lock.header.append(line)
+        elif line.strip():
+            lock.blocks.append([line])
+
+    return lock
+
+
+def _marker(block: list[str]) -> str | None:
+    requirement, _, _ = next(_logical_lines(block)).partition(" --")
+    _, _, marker = requirement.partition(";")
+
+    return marker.strip() or None
+
+
+def _with_marker(block: list[str], marker: str) -> list[str]:
+    first = block[0].rstrip()
+    continued = first.endswith("\\")
+    requirement, _, existing = first.removesuffix("\\").rstrip().partition(";")
+
+    if existing.strip():
+        marker = f"({existing.strip()}) and ({marker})"
+
+    first = f"{requirement.rstrip()} ; {marker}"
+
+    return [f"{first} \\\n" if continued else f"{first}\n", *block[1:]]
+
+
+def merge_python_versions(lockfile_texts: dict[str, str]) -> str | None:
+    """Merge the lock files compiled for each Python version into one.
+
+    Requirements that only some versions lock get a `python_version` marker.
+    None when markers cannot tell them apart, editable requirements take none.
+    """
+    header: list[str] = []
+    options: list[str] = []
+    merged: dict[str, tuple[list[str], list[str]]] = {}
+
+    for python_version, text in lockfile_texts.items():
+        lock = _split(text)
+        header = header or lock.header
+        options.extend(option for option in lock.options if option not in options)
+
+        for block in lock.blocks:
+            key = next(_logical_lines(block))
+            merged.setdefault(key, (block, []))[1].append(python_version)
+
+    lines = [
+        re.sub(r"with Python \S+$", f"with Python {', '.join(lockfile_texts)}", line)
+        for line in header
+    ]
+    lines.extend(options)
+
+    if options:
+        lines.append("\n")
+
+    for block, python_versions in sorted(
+        merged.values(), key=lambda item: requirement_name(item[0][0])
+    ):
+        if len(python_versions) < len(lockfile_texts):
+            if block[0].startswith("-"):
+                return None
+
+            block = _with_marker(
+                block,
+                " or ".join(
+                    f'python_version == "{version}"' for version in python_versions
+                ),
+            )
+
+        lines.extend(block)
+
+    return "".join(lines)
+
+
+def python_version_markers(python_version: str) -> dict[str, str]:
+    """Environment markers of `python_version`, the others are those of yap's."""
+    return {
+        "python_version": python_version,
+        "python_full_version": f"{python_version}.0",
+    }
+
+
+def python_version_lock(lockfile_text: str, python_version: str) -> str:
+    """The part of a merged lock file that applies to `python_version`."""
+    # Reading a lock file is much quicker than importing the markers parser.
+    from packaging.markers import Marker
+
+    lock = _split(lockfile_text)
+    environment = python_version_markers(python_version)
+    lines = [*lock.header, *lock.options]
+
+    if lock.options:
+        lines.append("\n")
+
+    for block in lock.blocks:
+        marker = _marker(block)
+
+        if marker is None or Marker(marker).evaluate(environment):
+            lines.extend(block)
+
+    return "".join(lines)
+
+
+class LockedPackage(NamedTuple):
+    name: str
+    version: str
+    marker: str | None
+    # What requires it, going by its `# via` annotations: other packages, by
+    # normalized name, or the files that pip-compile read, like
+    # "my-project (pyproject.toml)" or "-r requirements.in".
+    via: tuple[str, ...]
+    # Where its lines start in the lock file, to read its hashes when needed.
+    offset: int
+
+
+class LockIndex(NamedTuple):
+    filename: str
+    # The pins of each package, a lock file merged for several Python versions
+    # may pin a package once for each.
+    packages: dict[str, list[LockedPackage]]
+    # What each package and input file requires, the `# via` annotations reversed.
+    requires: dict[str, list[str]]
+
+
+def _via_entry(entry: str) -> str:
+    return normalize_name(entry) if PACKAGE_NAME_RE.match(entry) else entry
+
+
+def _index_package(
+    index: LockIndex, match: re.Match[str], offset: int, via: list[str]
+) -> None:
+    requirement, _, _ = match.string.rstrip().removesuffix("\\").partition(" --")
+    _, _, marker = requirement.partition(";")
+    package = LockedPackage(
+        normalize_name(match[1]), match[2], marker.strip() or None, tuple(via), offset
+    )
+    pins = index.packages.setdefault(package.name, [])
+    pins.append(package)
+
+    # Pins of the other Python versions have the same dependents, mostly.
+    for entry in via:
+        dependencies = index.requires.setdefault(entry, [])
+
+        if package.name not in dependencies:
+            dependencies.append(package.name)
+
+
+def read_index(lockfile_filename: str) -> LockIndex:
+    """Index the pins of a lock file by name and by what requires them.
+
+    The file is read once, line by line, and the hashes are left in it: the
+    offset of each package is enough for `read_package_hashes` to find them.
+    """
+    index = LockIndex(lockfile_filename, {}, {})
+    current: tuple[re.Match[str], int] | None = None
+    via: list[str] = []
+    in_via = False
+    offset = 0
+
+    with open(lockfile_filename, "rb") as f:
+        for raw_line in f:
+            line = raw_line.decode()
+            line_offset = offset
+            offset += len(raw_line)
+
+            if line[:1].isspace():
+                comment = line.strip()
+
+                if current is None or not comment.startswith("#"):
+                    continue
+
+                comment = comment[1:].strip()
+
+                if comment == "via" or comment.startswith("via "):
+                    in_via = True
+                    comment = comment[3:].strip()
+                elif not in_via:
+                    continue
+
+                if comment:
+                    via.append(_via_entry(comment))
+
+                continue
+
+            if current is not None:
+                _index_package(index, *current, via)
+
+            match = PIN_RE.match(line)
+            current = (match, line_offset) if match else None
+            via = []
+            in_via = False
+
+    if current is not None:
+        _index_package(index, *current, via)
+
+    return index
+
+
+def read_package_hashes(lockfile_filename: str, package: LockedPackage) -> list[str]:
+    """The hashes of a package that `read_index` found in the lock file."""
+    hashes = []
+
+    with open(lockfile_filename, "rb") as f:
+        f.seek(package.offset)
+        hashes.extend(HASH_RE.findall(f.readline().decode()))
+
+        for raw_line in f:
+            line = raw_line.decode()
+
+            if not line[:1].isspace():
+                break
+
+            hashes.extend(HASH_RE.findall(line))
+
+    return hashes
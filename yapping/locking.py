@@ -0,0 +1,95 @@
+import contextlib
+import fcntl
+import os
+import secrets
+import shutil
+import sys
+import time
+from typing import Iterator
+
+from yapping import exceptions
+
+POLL_INTERVAL = 0.05
+
+
+@contextlib.contextmanager
+def project_lock(directory: str, timeout: float | None = None) -> Iterator[None]:
+    """Hold the advisory lock of the project in `directory`.
+
+    yap takes it to edit or compile a project, so that commands running at the
+    same time on one checkout take turns. Waits for `timeout` seconds for
+    another command to release it, forever when None.
+    """
+    # The directory is locked, files in it are replaced rather than rewritten.
+    fd = os.open(directory or ".", os.O_RDONLY)
+
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            _wait(fd, directory, timeout)
+
+        yield
+    finally:
+        # Closing the last descriptor releases the lock.
+        os.close(fd)
+
+
+def _wait(fd: int, directory: str, timeout: float | None) -> None:
+    path = os.path.abspath(directory)
+
+    if timeout is not None and timeout <= 0:
+        raise exceptions.YappingException(f"Another yap command is running in {path}")
+
+    print(f"yap: waiting for another yap command in {path}", file=sys.stderr)
+
+    if timeout is None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+
+    deadline = time.monotonic() + timeout
+
+    while True:
+        time.sleep(POLL_INTERVAL)
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise exceptions.YappingException(
+                    f"Another yap command is still running in {path} "
+                    f"after {timeout:g}s"
+                ) from None
+
+
+def temporary_path(filename: str) -> str:
+    """An unused name next to `filename`, on the same file system."""
+    directory, name = os.path.split(filename)
+
+    return os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+
+
+def atomic_write(filename: str, text: str, exclusive: bool = False) -> None:
+    """Replace `filename` with `text`, readers see the old or the new file.
+
+    With `exclusive`, only create `filename`: raises FileExistsError when it
+    already exists, even if another process just created it.
+    """
+    temporary = temporary_path(filename)
+
+    try:
+        with open(temporary, "x", encoding="utf-8") as f:
+            f.write(text)
+
+        if exclusive:
+            os.link(temporary, filename)
+            return
+
+        if os.path.exists(filename):
+            shutil.copymode(filename, temporary)
+
+        os.replace(temporary, filename)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temporary)
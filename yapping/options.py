@@ -0,0 +1,27 @@
+from typing import NamedTuple
+
+
+class Backend:
+    AUTO = "auto"
+    IN_PROCESS = "in-process"
+    SUBPROCESS = "subprocess"
+
+
+class Pins:
+    PREFER = "prefer"
+    FIX = "fix"
+
+
+class CompileOptions(NamedTuple):
+    force: bool = False
+    backend: str = Backend.AUTO
+    pins: str = Pins.PREFER
+    unlocked: tuple[str, ...] = ()
+    cache_dir: str | None = None
+    log: str | None = None
+    # Lock for each of these Python versions instead of the running one.
+    python_versions: tuple[str, ...] = ()
+    # Seconds to wait for another yap command on the project, None waits forever.
+    lock_timeout: float | None = None
+    # Where lock files are shared between projects with the same inputs.
+    lock_store: str | None = None
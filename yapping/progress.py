@@ -0,0 +1,135 @@
+import collections
+import contextlib
+import io
+import shutil
+import sys
+import threading
+from typing import cast
+from typing import Iterator
+from typing import TextIO
+
+TAIL_LINES = 200
+
+CLEAR_LINE = "\r\x1b[K"
+
+# Concurrent compiles share the status line.
+_status_lock = threading.Lock()
+
+
+def terminal() -> TextIO | None:
+    """Where to show progress, None when stderr is not a terminal."""
+    stderr = sys.stderr
+
+    if isinstance(stderr, _ThreadOutput):
+        stderr = stderr.stream
+
+    return stderr if stderr.isatty() else None
+
+
+class _ThreadOutput(io.TextIOBase):
+    """Send what one thread writes to `output`, and the rest to `stream`."""
+
+    def __init__(self, stream: TextIO, output: io.TextIOBase) -> None:
+        super().__init__()
+        self.stream = stream
+        self.output = output
+        self._thread = threading.get_ident()
+
+    def _target(self) -> TextIO | io.TextIOBase:
+        return self.output if threading.get_ident() == self._thread else self.stream
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def isatty(self) -> bool:
+        return self._target().isatty()
+
+
+@contextlib.contextmanager
+def capture(output: io.TextIOBase) -> Iterator[None]:
+    """Capture stdout and stderr of the current thread only.
+
+    Unlike `contextlib.redirect_stdout`, the prints of other threads, like
+    concurrent compiles reporting progress, still reach the real streams.
+    """
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = cast(TextIO, _ThreadOutput(stdout, output))
+    sys.stderr = cast(TextIO, _ThreadOutput(stderr, output))
+
+    try:
+        yield
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+
+class CompileOutput(io.TextIOBase):
+    """Follow the output of a pip-compile run, line by line.
+
+    Each line is appended to the `log` file and shown on the `status` line of a
+    terminal. Only the last `tail_lines` are kept, to report a failure.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        log: str | None = None,
+        status: TextIO | None = None,
+        tail_lines: int = TAIL_LINES,
+    ) -> None:
+        super().__init__()
+        self.label = label
+        self._lines: collections.deque[str] = collections.deque(maxlen=tail_lines)
+        self._partial = ""
+        self._log = open(log, "a", buffering=1) if log is not None else None
+        self._status = status
+
+    @property
+    def watched(self) -> bool:
+        return self._log is not None or self._status is not None
+
+    def write(self, text: str) -> int:
+        *lines, self._partial = (self._partial + text).split("\n")
+
+        for line in lines:
+            self.write_line(line)
+
+        return len(text)
+
+    def write_line(self, line: str) -> None:
+        line = line.rstrip("\r\n")
+        self._lines.append(line)
+
+        if self._log is not None:
+            self._log.write(f"[{self.label}] {line}\n")
+
+        if self._status is not None and line.strip():
+            width = shutil.get_terminal_size().columns - 1
+            text = f"{self.label}: {line}"[:width]
+
+            with _status_lock:
+                self._status.write(f"{CLEAR_LINE}{text}")
+                self._status.flush()
+
+    def tail(self) -> str:
+        return "\n".join(self._lines).strip()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        if self._partial:
+            self.write_line(self._partial)
+            self._partial = ""
+
+        if self._log is not None:
+            self._log.close()
+
+        if self._status is not None:
+            with _status_lock:
+                self._status.write(CLEAR_LINE)
+                self._status.flush()
+
+        super().close()
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import platform
+import sys
+import tomllib
+from typing import Any
+from typing import NamedTuple
+from typing import Sequence
+
+from packaging.requirements import InvalidRequirement
+from packaging.requirements import Requirement
+
+from yapping import lockfile
+from yapping import locking
+
+# Stands for the project in the `# via` annotations of the stored lock files.
+PROJECT_PLACEHOLDER = "{project}"
+
+
+class StoreKey(NamedTuple):
+    key: str
+    # The stored lock files leave the project name out, to be shared.
+    project: str | None
+
+
+def _normalize_requirement(requirement: str, project: str | None) -> str:
+    try:
+        parsed = Requirement(requirement)
+    except InvalidRequirement:
+        return requirement.strip()
+
+    name = lockfile.normalize_name(parsed.name)
+    # Optional dependency groups can include others through the project.
+    parsed.name = PROJECT_PLACEHOLDER if name == project else name
+
+    return str(parsed)
+
+
+def has_dynamic_inputs(project: dict[str, Any], extra: str | None) -> bool:
+    """Whether the lock file depends on what a build backend computes."""
+    dynamic = project.get("dynamic", [])
+
+    return "dependencies" in dynamic or (
+        extra is not None and "optional-dependencies" in dynamic
+    )
+
+
+def lock_key(
+    pyproject_filename: str,
+    output_filename: str,
+    extra: str | None,
+    args: tuple[str, ...],
+    python_versions: Sequence[str] = (),
+) -> StoreKey | None:
+    """What a compile of these inputs is stored under, None if it cannot be.
+
+    Projects that spell the same requirements differently share the key, only
+    the project name tells their lock files apart and it is left out.
+    """
+    with open(pyproject_filename, "rb") as f:
+        project = tomllib.load(f)["project"]
+
+    if has_dynamic_inputs(project, extra):
+        return None
+
+    name = project.get("name")
+    normalized_name = lockfile.normalize_name(name) if name else None
+    inputs = {
+        "python": list(python_versions)
+        or f"{sys.version_info.major}.{sys.version_info.minor}",
+        # Markers, and the wheels found for them, depend on where it runs.
+        "platform": [sys.platform, platform.machine(), sys.implementation.name],
+        "requires-python": project.get("requires-python"),
+        "dependencies": sorted(
+            _normalize_requirement(dep, normalized_name)
+            for dep in project.get("dependencies", [])
+        ),
+        "extra": sorted(
+            _normalize_requirement(dep, normalized_name)
+            for dep in project.get("optional-dependencies", {}).get(extra, [])
+        ),
+        "args": args,
+        # pip-compile records it in the header of the lock file.
+        "output": output_filename,
+        # The index settings change what the resolver finds.
+        "pip": {
+            key: value for key, value in os.environ.items() if key.startswith("PIP_")
+        },
+    }
+    serialized = json.dumps(inputs, sort_keys=True, separators=(",", ":"))
+
+    return StoreKey(hashlib.sha256(serialized.encode()).hexdigest(), name)
+
+
+def entry_path(store_dir: str, key: StoreKey) -> str:
+    return os.path.join(store_dir, key.key[:2], f"{key.key}.txt")
+
+
+def fetch(store_dir: str, key: StoreKey) -> str | None:
+    """The lock file stored under `key`, for the project of the key."""
+    try:
+        with open(entry_path(store_dir, key)) as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+
+    if key.project is None:
+        return text
+
+    return lockfile.rename_project(text, PROJECT_PLACEHOLDER, key.project)
+
+
+def publish(store_dir: str, key: StoreKey, lockfile_text: str) -> None:
+    """Store a lock file under `key`, other compiles see all of it or nothing."""
+    if key.project is not None:
+        lockfile_text = lockfile.rename_project(
+            lockfile_text, key.project, PROJECT_PLACEHOLDER
+        )
+
+    path = entry_path(store_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    locking.atomic_write(path, lockfile_text)
@@ -0,0 +1,377 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tomllib
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+from typing import NamedTuple
+from typing import Sequence
+
+from packaging.markers import Marker
+from packaging.version import InvalidVersion
+from packaging.version import Version
+
+from yapping import exceptions
+from yapping import lockfile
+from yapping import timings
+from yapping.lockfile import LockedRequirement
+
+# Never removed, even when the lock files do not list them.
+KEEP_PACKAGES = frozenset({"pip", "setuptools", "wheel", "pip-tools", "yapping"})
+
+# Run by the target interpreter, which does not need yap installed.
+INSPECT_SCRIPT = """\
+import json, os, platform, sys
+from importlib import metadata
+
+installed = {}
+
+
+def direct_url(dist):
+    info = json.loads(dist.read_text("direct_url.json") or "{}")
+    vcs = info.get("vcs_info")
+
+    if vcs:
+        url = f"{vcs['vcs']}+{info['url']}"
+        revision = vcs.get("requested_revision")
+
+        return f"{url}@{revision}" if revision else url
+
+    return info.get("url")
+
+
+for dist in metadata.distributions():
+    if dist.metadata["Name"]:
+        requires = [req for req in dist.requires or () if "extra ==" not in req]
+        installed.setdefault(
+            dist.metadata["Name"], [dist.version, requires, direct_url(dist)]
+        )
+
+info = sys.implementation.version
+environment = {
+    "implementation_name": sys.implementation.name,
+    "implementation_version": f"{info.major}.{info.minor}.{info.micro}",
+    "os_name": os.name,
+    "platform_machine": platform.machine(),
+    "platform_release": platform.release(),
+    "platform_system": platform.system(),
+    "platform_version": platform.version(),
+    "python_full_version": platform.python_version(),
+    "platform_python_implementation": platform.python_implementation(),
+    "python_version": ".".join(platform.python_version_tuple()[:2]),
+    "sys_platform": sys.platform,
+}
+print(json.dumps({"installed": installed, "environment": environment}))
+"""
+
+
+class Environment(NamedTuple):
+    # Installed versions by normalized project name.
+    installed: dict[str, str]
+    # What each installed project depends on.
+    requires: dict[str, set[str]]
+    # Values of the environment markers.
+    markers: dict[str, str]
+    # Where the projects installed from a URL or a directory come from.
+    urls: dict[str, str]
+
+
+class Plan(NamedTuple):
+    install: list[LockedRequirement]
+    uninstall: list[str]
+
+
+def target_python() -> str:
+    """The interpreter of the active virtual environment, or the one running yap."""
+    virtual_env = os.environ.get("VIRTUAL_ENV")
+
+    if virtual_env:
+        return os.path.join(virtual_env, "bin", "python")
+
+    return sys.executable
+
+
+def _run(cmd: Sequence[str]) -> str:
+    try:
+        proc = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        raise exceptions.YappingException(e.stderr.strip()) from e
+
+    return proc.stdout
+
+
+def inspect(python: str) -> Environment:
+    with timings.span("inspect environment"):
+        data = json.loads(_run((python, "-c", INSPECT_SCRIPT)))
+
+    installed = {}
+    requires = {}
+    urls = {}
+
+    for name, (version, dist_requires, url) in data["installed"].items():
+        installed[lockfile.normalize_name(name)] = version
+        requires[lockfile.normalize_name(name)] = {
+            lockfile.requirement_name(requirement) for requirement in dist_requires
+        }
+
+        if url is not None:
+            urls[lockfile.normalize_name(name)] = url
+
+    return Environment(installed, requires, data["environment"], urls)
+
+
+def _applies(requirement: LockedRequirement, markers: dict[str, str]) -> bool:
+    return requirement.marker is None or Marker(requirement.marker).evaluate(markers)
+
+
+def _pin(requirement: LockedRequirement) -> str:
+    return requirement.url or requirement.version
+
+
+def _editable_name(url: str) -> str:
+    """The project of an editable requirement that pip-compile did not name."""
+    parsed = urllib.parse.urlsplit(url)
+
+    if parsed.scheme == "file":
+        path = urllib.request.url2pathname(parsed.path)
+        name = project_name(os.path.join(path, "pyproject.toml"))
+
+        if name:
+            return lockfile.normalize_name(name)
+
+    return url
+
+
+def read_locks(
+    lockfile_filenames: Iterable[str], markers: dict[str, str] | None = None
+) -> list[LockedRequirement]:
+    """The requirements of every lock file, which must agree on the pins.
+
+    Only the requirements whose markers match `markers` are read when given, a
+    lock file merged for several Python versions pins some packages once each.
+    """
+    requirements: dict[str, tuple[LockedRequirement, str]] = {}
+
+    for filename in lockfile_filenames:
+        for requirement in lockfile.read_requirements(filename):
+            if requirement.url is not None and not requirement.name:
+                requirement = requirement._replace(name=_editable_name(requirement.url))
+
+            name = requirement.name
+
+            if markers is not None and not _applies(requirement, markers):
+                continue
+
+            if name not in requirements:
+                requirements[name] = (requirement, filename)
+                continue
+
+            other, other_filename = requirements[name]
+
+            if _pin(other) != _pin(requirement):
+                raise exceptions.YappingException(
+                    f"{name} is locked to {_pin(other)} in {other_filename} "
+                    f"and to {_pin(requirement)} in {filename}"
+                )
+
+    return [requirement for requirement, _ in requirements.values()]
+
+
+def project_name(pyproject_filename: str) -> str | None:
+    try:
+        with open(pyproject_filename, "rb") as f:
+            name: str | None = tomllib.load(f).get("project", {}).get("name")
+    except FileNotFoundError:
+        return None
+
+    return name
+
+
+def _same_version(installed: str | None, locked: str) -> bool:
+    if installed is None:
+        return False
+
+    try:
+        return Version(installed) == Version(locked)
+    except InvalidVersion:
+        return installed == locked
+
+
+def _with_dependencies(names: Iterable[str], requires: dict[str, set[str]]) -> set[str]:
+    found = set()
+    pending = list(names)
+
+    while pending:
+        name = pending.pop()
+
+        if name not in found:
+            found.add(name)
+            pending.extend(requires.get(name, ()))
+
+    return found
+
+
+def plan(
+    requirements: Sequence[LockedRequirement],
+    environment: Environment,
+    keep: Iterable[str] = (),
+) -> Plan:
+    """What to install and to remove to make the environment match the locks."""
+    locked = {
+        requirement.name: requirement
+        for requirement in requirements
+        if _applies(requirement, environment.markers)
+    }
+    # yap and pip may run from this environment, keep what they need too.
+    kept = _with_dependencies(
+        KEEP_PACKAGES | {lockfile.normalize_name(name) for name in keep},
+        environment.requires,
+    )
+    # Direct references and editable requirements have no version to compare,
+    # they are installed when pip recorded installing a project from their URL.
+    locked_urls = {
+        requirement.url for requirement in locked.values() if requirement.url
+    }
+    installed_urls = set(environment.urls.values())
+
+    return Plan(
+        install=[
+            requirement
+            for name, requirement in locked.items()
+            if (
+                requirement.url not in installed_urls
+                if requirement.url is not None
+                else not _same_version(
+                    environment.installed.get(name), requirement.version
+                )
+            )
+        ],
+        uninstall=sorted(
+            name
+            for name in environment.installed
+            if name not in locked
+            and name not in kept
+            and environment.urls.get(name) not in locked_urls
+        ),
+    )
+
+
+def _write_requirements(
+    filename: str, requirements: Iterable[LockedRequirement]
+) -> str:
+    with open(filename, "w") as f:
+        f.writelines(f"{requirement.line}\n" for requirement in requirements)
+
+    return filename
+
+
+def _install_hashed(
+    pip: tuple[str, ...],
+    requirements: Sequence[LockedRequirement],
+    jobs: int,
+    directory: str,
+) -> None:
+    chunks = [requirements[i::jobs] for i in range(min(jobs, len(requirements)))]
+    chunk_files = [
+        _write_requirements(os.path.join(directory, f"chunk-{i}.txt"), chunk)
+        for i, chunk in enumerate(chunks)
+    ]
+    downloads = os.path.join(directory, "downloads")
+
+    with timings.span("download"), ThreadPoolExecutor(len(chunks)) as executor:
+        list(
+            executor.map(
+                lambda chunk_file: _run(
+                    (
+                        *pip,
+                        "download",
+                        "--quiet",
+                        "--no-deps",
+                        "--require-hashes",
+                        f"--dest={downloads}",
+                        f"--requirement={chunk_file}",
+                    )
+                ),
+                chunk_files,
+            )
+        )
+
+    all_requirements = _write_requirements(
+        os.path.join(directory, "requirements.txt"), requirements
+    )
+
+    with timings.span("install"):
+        _run(
+            (
+                *pip,
+                "install",
+                "--quiet",
+                "--no-deps",
+                "--require-hashes",
+                # Everything was just downloaded, the index has nothing to add.
+                "--no-index",
+                f"--find-links={downloads}",
+                f"--requirement={all_requirements}",
+            )
+        )
+
+
+def install(
+    python: str,
+    requirements: Sequence[LockedRequirement],
+    jobs: int,
+    cache_dir: str | None = None,
+) -> None:
+    """Download the requirements in `jobs` pip processes, then install them.
+
+    Installing happens in a single pip process, pip does not support several
+    installing into the same environment at once. Hashes are checked by both.
+    Direct references and editable requirements have no hashes, they are
+    installed afterwards by pip on its own.
+    """
+    pip: tuple[str, ...] = (python, "-m", "pip", "--disable-pip-version-check")
+
+    if cache_dir is not None:
+        pip = (*pip, f"--cache-dir={cache_dir}")
+    hashed = [requirement for requirement in requirements if not requirement.url]
+    direct = [requirement for requirement in requirements if requirement.url]
+
+    with tempfile.TemporaryDirectory(prefix="yap-sync-") as directory:
+        if hashed:
+            _install_hashed(pip, hashed, jobs, directory)
+
+        if direct:
+            direct_requirements = _write_requirements(
+                os.path.join(directory, "direct.txt"), direct
+            )
+
+            with timings.span("install"):
+                _run(
+                    (
+                        *pip,
+                        "install",
+                        "--quiet",
+                        "--no-deps",
+                        f"--requirement={direct_requirements}",
+                    )
+                )
+
+
+def uninstall(python: str, names: Sequence[str]) -> None:
+    with timings.span("uninstall"):
+        _run(
+            (
+                python,
+                "-m",
+                "pip",
+                "--disable-pip-version-check",
+                "uninstall",
+                "--quiet",
+                "--yes",
+                *names,
+            )
+        )
@@ -0,0 +1,114 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Iterator
+from typing import NamedTuple
+from typing import TextIO
+
+
+class Span(NamedTuple):
+    name: str
+    start: float
+    duration: float
+    thread_id: int
+    thread_name: str
+    args: dict[str, str]
+
+
+# None while timings are off, so that `span` costs next to nothing.
+_spans: list[Span] | None = None
+_origin = 0.0
+
+
+def enable(origin: float | None = None) -> None:
+    global _spans, _origin
+
+    _spans = []
+    _origin = time.perf_counter() if origin is None else origin
+
+
+def disable() -> None:
+    global _spans
+
+    _spans = None
+
+
+def spans() -> list[Span]:
+    return list(_spans or [])
+
+
+def record(name: str, start: float, end: float, **args: str) -> None:
+    if _spans is None:
+        return
+
+    thread = threading.current_thread()
+    _spans.append(Span(name, start, end - start, thread.ident or 0, thread.name, args))
+
+
+@contextlib.contextmanager
+def span(name: str, **args: str) -> Iterator[None]:
+    """Time the block as the phase `name`, when timings are enabled."""
+    if _spans is None:
+        yield
+        return
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        record(name, start, time.perf_counter(), **args)
+
+
+def print_summary(file: TextIO) -> None:
+    totals: dict[str, tuple[float, int]] = {}
+
+    for item in spans():
+        total, count = totals.get(item.name, (0.0, 0))
+        totals[item.name] = (total + item.duration, count + 1)
+
+    width = max((len(name) for name in totals), default=0)
+
+    print("yap timings:", file=file)
+
+    for name, (total, count) in totals.items():
+        calls = f"  ({count} calls)" if count > 1 else ""
+        print(f"  {name:<{width}}  {total * 1000:10.1f} ms{calls}", file=file)
+
+
+def write_trace(filename: str) -> None:
+    """Write the spans as Chrome trace events, for chrome://tracing or Perfetto."""
+    pid = os.getpid()
+    events: list[dict[str, object]] = []
+    threads: dict[int, str] = {}
+
+    for item in spans():
+        threads.setdefault(item.thread_id, item.thread_name)
+        events.append(
+            {
+                "name": item.name,
+                "cat": "yap",
+                "ph": "X",
+                "ts": round((item.start - _origin) * 1e6, 3),
+                "dur": round(item.duration * 1e6, 3),
+                "pid": pid,
+                "tid": item.thread_id,
+                "args": item.args,
+            }
+        )
+
+    events.extend(
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": pid,
+            "tid": thread_id,
+            "args": {"name": thread_name},
+        }
+        for thread_id, thread_name in threads.items()
+    )
+
+    with open(filename, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,486 @@
+import json
+import re
+import tomllib
+from typing import Any
+from typing import NamedTuple
+from typing import TypeAlias
+
+import tomli_w
+
+from yapping import lockfile
+
+BARE_KEY_RE = re.compile(r"[A-Za-z0-9_-]+")
+# Numbers, booleans and dates, up to the next separator.
+SCALAR_RE = re.compile(r"[^,\]}#\r\n]+")
+
+DEFAULT_INDENT = "    "
+
+Key: TypeAlias = tuple[str, ...]
+
+
+class Unsupported(Exception):
+    """The document or the change cannot be patched in place."""
+
+
+class Span(NamedTuple):
+    start: int
+    end: int
+
+
+class Document(NamedTuple):
+    # Where the value of each `key = value` is, by its full key.
+    values: dict[Key, Span]
+    # Where a `key = value` line can be appended to each [table].
+    table_ends: dict[Key, int]
+    newline: str
+
+
+class Item(NamedTuple):
+    value: Any
+    source: str
+    comments: tuple[str, ...]
+    trailing_comment: str
+
+
+class Array(NamedTuple):
+    items: list[Item]
+    comments: tuple[str, ...]
+    multiline: bool
+    indent: str
+    closing_indent: str
+
+
+class _Scanner:
+    def __init__(self, text: str, pos: int = 0) -> None:
+        self.text = text
+        self.pos = pos
+
+    def peek(self, size: int = 1) -> str:
+        start = self.pos
+        end = start + size
+
+        return self.text[start:end]
+
+    def expect(self, token: str) -> None:
+        if self.peek(len(token)) != token:
+            raise Unsupported(f"expected {token!r} at {self.pos}")
+
+        self.pos += len(token)
+
+    def skip_spaces(self) -> None:
+        while self.peek() in (" ", "\t"):
+            self.pos += 1
+
+    def comment(self) -> str:
+        end = self.text.find("\n", self.pos)
+        end = len(self.text) if end == -1 else end
+        start = self.pos
+        comment = self.text[start:end].rstrip("\r")
+        self.pos += len(comment)
+
+        return comment
+
+    def end_of_line(self) -> None:
+        self.skip_spaces()
+
+        if self.peek() == "#":
+            self.comment()
+
+        if self.peek() == "\r":
+            self.pos += 1
+
+        if self.pos < len(self.text):
+            self.expect("\n")
+
+    def key(self) -> Key:
+        parts = []
+
+        while True:
+            self.skip_spaces()
+
+            if self.peek() in ('"', "'"):
+                start = self.pos
+                self.string()
+                parts.append(tomllib.loads(f"k = {self.text[start:self.pos]}")["k"])
+            else:
+                match = BARE_KEY_RE.match(self.text, self.pos)
+
+                if match is None:
+                    raise Unsupported(f"expected a key at {self.pos}")
+
+                parts.append(match[0])
+                self.pos = match.end()
+
+            self.skip_spaces()
+
+            if self.peek() != ".":
+                return tuple(parts)
+
+            self.pos += 1
+
+    def string(self) -> None:
+        quotes = next(
+            quotes
+            for quotes in ('"""', "'''", '"', "'")
+            if self.peek(len(quotes)) == quotes
+        )
+        self.pos += len(quotes)
+
+        while self.pos < len(self.text):
+            if quotes[0] == '"' and self.peek() == "\\":
+                self.pos += 2
+            elif self.peek(len(quotes)) == quotes:
+                self.pos += len(quotes)
+
+                # A multi-line string can end with up to two more quotes.
+                while len(quotes) == 3 and self.peek() == quotes[0]:
+                    self.pos += 1
+
+                return
+            elif len(quotes) == 1 and self.peek() == "\n":
+                break
+            else:
+                self.pos += 1
+
+        raise Unsupported("unterminated string")
+
+    def value(self) -> None:
+        char = self.peek()
+
+        if char in ('"', "'"):
+            self.string()
+        elif char == "[":
+            self.array()
+        elif char == "{":
+            self.inline_table()
+        else:
+            match = SCALAR_RE.match(self.text, self.pos)
+
+            if match is None or not match[0].strip():
+                raise Unsupported(f"expected a value at {self.pos}")
+
+            self.pos += len(match[0].rstrip(" \t"))
+
+    def array(self) -> Array:
+        self.expect("[")
+        items: list[Item] = []
+        comments: list[str] = []
+        after_item = False
+        multiline = False
+
+        while True:
+            self.skip_spaces()
+            char = self.peek()
+
+            if not char:
+                raise Unsupported("unterminated array")
+            elif char in ("\r", "\n"):
+                self.pos += 1
+                after_item = False
+                multiline = True
+            elif char == "#":
+                gap_start = len(self.text[: self.pos].rstrip(" \t"))
+                gap_end = self.pos
+                gap = self.text[gap_start:gap_end]
+                comment = self.comment()
+
+                if after_item:
+                    items[-1] = items[-1]._replace(trailing_comment=gap + comment)
+                else:
+                    comments.append(comment)
+            elif char == ",":
+                self.pos += 1
+            elif char == "]":
+                self.pos += 1
+                break
+            else:
+                start = self.pos
+                self.value()
+                end = self.pos
+                source = self.text[start:end]
+                value = tomllib.loads(f"v = {source}")["v"]
+                items.append(Item(value, source, tuple(comments), ""))
+                comments = []
+                after_item = True
+
+        return Array(items, tuple(comments), multiline, "", "")
+
+    def inline_table(self) -> None:
+        self.expect("{")
+
+        while True:
+            self.skip_spaces()
+
+            if self.peek() == "}":
+                self.pos += 1
+                return
+
+            self.key()
+            self.skip_spaces()
+            self.expect("=")
+            self.skip_spaces()
+            self.value()
+            self.skip_spaces()
+
+            if self.peek() == ",":
+                self.pos += 1
+
+
+def scan(text: str) -> Document:
+    scanner = _Scanner(text)
+    values: dict[Key, Span] = {}
+    table_ends: dict[Key, int] = {(): 0}
+    table: Key | None = ()
+
+    while scanner.pos < len(text):
+        scanner.skip_spaces()
+        char = scanner.peek()
+
+        if char in ("\r", "\n", "#"):
+            scanner.end_of_line()
+            continue
+
+        if char == "[":
+            array_of_tables = scanner.peek(2) == "[["
+            scanner.pos += 2 if array_of_tables else 1
+            key = scanner.key()
+            scanner.expect("]]" if array_of_tables else "]")
+            scanner.end_of_line()
+            # Keys of [[array.of.tables]] cannot be addressed by path.
+            table = None if array_of_tables else key
+
+            if table is not None:
+                table_ends[table] = scanner.pos
+
+            continue
+
+        key = scanner.key()
+        scanner.expect("=")
+        scanner.skip_spaces()
+        start = scanner.pos
+        scanner.value()
+        end = scanner.pos
+        scanner.end_of_line()
+
+        if table is not None:
+            values[(*table, *key)] = Span(start, end)
+            table_ends[table] = scanner.pos
+
+    return Document(values, table_ends, "\r\n" if "\r\n" in text else "\n")
+
+
+def _changed_keys(
+    old: dict[str, Any], new: dict[str, Any], prefix: Key = ()
+) -> list[Key]:
+    if set(old) - set(new):
+        raise Unsupported("keys were removed")
+
+    changed = []
+
+    for name, value in new.items():
+        key = (*prefix, name)
+
+        if isinstance(value, dict):
+            old_value = old.get(name, {})
+
+            if not isinstance(old_value, dict):
+                raise Unsupported(f"{'.'.join(key)} changed type")
+
+            changed.extend(_changed_keys(old_value, value, key))
+        elif name not in old or old[name] != value:
+            changed.append(key)
+
+    return changed
+
+
+def format_key(key: Key) -> str:
+    return ".".join(
+        part if BARE_KEY_RE.fullmatch(part) else json.dumps(part) for part in key
+    )
+
+
+def format_string(value: str, old_source: str = "") -> str:
+    literal = old_source.startswith("'") and not old_source.startswith("'''")
+
+    if literal and not re.search(r"['\x00-\x08\x0a-\x1f\x7f]", value):
+        return f"'{value}'"
+
+    return tomli_w.dumps({"v": value}).removeprefix("v = ").rstrip("\n")
+
+
+def _array_layout(source: str) -> Array:
+    array = _Scanner(source).array()
+    lines = source.split("\n")
+    indent = DEFAULT_INDENT
+
+    for line in lines[1:-1]:
+        if line.strip():
+            indent = line[: len(line) - len(line.lstrip(" \t"))]
+            break
+
+    closing_indent = lines[-1][: len(lines[-1]) - len(lines[-1].lstrip(" \t"))]
+
+    return array._replace(indent=indent, closing_indent=closing_indent)
+
+
+def _replaced_item(items: dict[int, Item], value: str) -> int | None:
+    """The entry for the same package, whose comments a new value keeps."""
+    name = lockfile.requirement_name(value)
+
+    return next(
+        (
+            index
+            for index, item in items.items()
+            if lockfile.requirement_name(item.value) == name
+        ),
+        None,
+    )
+
+
+def format_array(values: list[Any], old_source: str, newline: str) -> str:
+    if not all(isinstance(value, str) for value in values):
+        raise Unsupported("only arrays of strings are patched")
+
+    layout = _array_layout(old_source) if old_source else None
+    old_items = list(layout.items) if layout is not None else []
+    # New entries are quoted like the first existing one.
+    quoting = old_items[0].source if old_items else ""
+    unused = dict(enumerate(old_items))
+    kept: dict[int, Item] = {}
+
+    for index, value in enumerate(values):
+        for old_index, item in unused.items():
+            if item.value == value:
+                kept[index] = unused.pop(old_index)
+                break
+
+    items = []
+
+    for index, value in enumerate(values):
+        replaced = None if index in kept else _replaced_item(unused, value)
+
+        if index in kept:
+            items.append(kept[index])
+        elif replaced is not None:
+            item = unused.pop(replaced)
+            source = format_string(value, item.source)
+            items.append(item._replace(value=value, source=source))
+        else:
+            items.append(Item(value, format_string(value, quoting), (), ""))
+
+    if layout is not None and not layout.multiline:
+        return f"[{', '.join(item.source for item in items)}]"
+
+    comments = layout.comments if layout is not None else ()
+
+    if not items and not comments:
+        return "[]"
+
+    indent = layout.indent if layout is not None else DEFAULT_INDENT
+    closing_indent = layout.closing_indent if layout is not None else ""
+    lines = ["["]
+
+    for item in items:
+        lines.extend(f"{indent}{comment}" for comment in item.comments)
+        lines.append(f"{indent}{item.source},{item.trailing_comment}")
+
+    lines.extend(f"{indent}{comment}" for comment in comments)
+    lines.append(f"{closing_indent}]")
+
+    return newline.join(lines)
+
+
+def format_value(value: Any, old_source: str, newline: str) -> str:
+    if isinstance(value, str):
+        return format_string(value, old_source)
+
+    if isinstance(value, list):
+        return format_array(value, old_source, newline)
+
+    raise Unsupported(f"cannot patch a {type(value).__name__}")
+
+
+def _get(data: dict[str, Any], key: Key) -> Any:
+    for part in key:
+        data = data[part]
+
+    return data
+
+
+def patch(text: str, old: dict[str, Any], new: dict[str, Any]) -> str:
+    """Patch the values that changed from `old` to `new` into the TOML `text`.
+
+    Only the changed values are rewritten, the rest of the document keeps its
+    formatting and comments. New keys are appended to their table, or to a new
+    table after their closest existing parent. Raises `Unsupported` when the
+    change cannot be made in place.
+    """
+    document = scan(text)
+    newline = document.newline
+    edits: list[tuple[int, int, str]] = []
+    # Lines appended to an existing table, or to a new [table] after it.
+    appended: dict[tuple[Key, Key | None], list[str]] = {}
+
+    for key in _changed_keys(old, new):
+        value = _get(new, key)
+
+        if key in document.values:
+            start, end = document.values[key]
+            edits.append((start, end, format_value(value, text[start:end], newline)))
+            continue
+
+        parent = key[:-1]
+
+        while parent not in document.table_ends:
+            parent = parent[:-1]
+
+        dotted = any(other[: len(key) - 1] == key[:-1] for other in document.values)
+
+        if parent == key[:-1] or dotted:
+            depth = len(parent)
+            line_key, new_table = key[depth:], None
+        else:
+            line_key, new_table = key[-1:], key[:-1]
+
+        line = f"{format_key(line_key)} = {format_value(value, '', newline)}"
+        appended.setdefault((parent, new_table), []).append(line)
+
+    for (parent, new_table), lines in appended.items():
+        body = "".join(f"{line}{newline}" for line in lines)
+        position = document.table_ends[parent]
+
+        if new_table is not None:
+            position = position if parent else len(text)
+            body = f"{newline}[{format_key(new_table)}]{newline}{body}"
+
+        if position and text[position - 1] != "\n":
+            body = newline + body
+
+        edits.append((position, position, body))
+
+    patched = text
+
+    # From the end, so that earlier offsets stay valid. Insertions at the same
+    # offset keep their order.
+    for _, (start, end, replacement) in sorted(
+        enumerate(edits), key=lambda edit: (edit[1][0], edit[0]), reverse=True
+    ):
+        patched = patched[:start] + replacement + patched[end:]
+
+    try:
+        valid = tomllib.loads(patched) == new
+    except tomllib.TOMLDecodeError:
+        valid = False
+
+    if not valid:
+        raise Unsupported("the patched document does not match")
+
+    return patched
+
+
+def update(text: str, old: dict[str, Any], new: dict[str, Any]) -> str:
+    """Return `text` updated to `new`, in place when possible."""
+    try:
+        return patch(text, old, new)
+    except Unsupported:
+        return tomli_w.dumps(new)
@@ -0,0 +1,316 @@
+import ctypes
+import multiprocessing
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+import tomllib
+from typing import Any
+from typing import Callable
+from typing import NamedTuple
+from typing import Protocol
+from typing import Sequence
+
+from yapping import commands
+from yapping import exceptions
+from yapping import locking
+from yapping.options import CompileOptions
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+INOTIFY_EVENT = struct.Struct("iIII")
+
+POLL_INTERVAL = 0.5
+
+
+class Lock(NamedTuple):
+    extra: str | None
+    output: str
+
+
+class Watcher(Protocol):
+    def wait(self, timeout: float | None) -> bool:
+        """Wait up to `timeout` seconds for a change, return whether one came."""
+
+    def close(self) -> None:
+        """Release what the watcher holds."""
+
+
+class PollingWatcher:
+    def __init__(self, filename: str, interval: float = POLL_INTERVAL) -> None:
+        self.filename = filename
+        self.interval = interval
+        self._state = self._stat()
+
+    def _stat(self) -> tuple[int, int, int] | None:
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def wait(self, timeout: float | None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            state = self._stat()
+
+            if state != self._state:
+                self._state = state
+                return True
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+            remaining = self.interval
+
+            if deadline is not None:
+                remaining = min(remaining, max(deadline - time.monotonic(), 0))
+
+            time.sleep(remaining)
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Watch the directory, editors often replace the file instead of writing it."""
+
+    def __init__(self, filename: str) -> None:
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.name = os.fsencode(os.path.basename(filename))
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        directory = os.fsencode(os.path.dirname(os.path.abspath(filename)))
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+        if libc.inotify_add_watch(self.fd, directory, mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def _read_events(self) -> bool:
+        data = os.read(self.fd, 64 * 1024)
+        changed = False
+        offset = 0
+
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            start = offset + INOTIFY_EVENT.size
+            offset = start + length
+            name = data[start:offset].rstrip(b"\0")
+            changed = changed or name == self.name
+
+        return changed
+
+    def wait(self, timeout: float | None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            remaining = None
+
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+
+            if not ready:
+                return False
+
+            if self._read_events():
+                return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def make_watcher(filename: str, poll: bool = False) -> Watcher:
+    if not poll:
+        try:
+            return InotifyWatcher(filename)
+        except (AttributeError, OSError):
+            pass
+
+    return PollingWatcher(filename)
+
+
+def dependency_tables(pyproject_filename: str) -> dict[str, Any] | None:
+    """What the lock files depend on, None while the file cannot be read."""
+    try:
+        with open(pyproject_filename, "rb") as f:
+            project = tomllib.load(f)["project"]
+    except (OSError, tomllib.TOMLDecodeError, KeyError):
+        return None
+
+    return {
+        "requires-python": project.get("requires-python"),
+        "dependencies": project.get("dependencies", []),
+        "optional-dependencies": project.get("optional-dependencies", {}),
+    }
+
+
+def affected_locks(
+    old: dict[str, Any], new: dict[str, Any], locks: Sequence[Lock]
+) -> list[Lock]:
+    # Every lock file includes the main dependencies.
+    main_changed = any(
+        old[key] != new[key] for key in ("requires-python", "dependencies")
+    )
+
+    return [
+        lock
+        for lock in locks
+        if main_changed
+        or (
+            lock.extra is not None
+            and old["optional-dependencies"].get(lock.extra)
+            != new["optional-dependencies"].get(lock.extra)
+        )
+    ]
+
+
+def compile_lock(pyproject_filename: str, lock: Lock, options: CompileOptions) -> None:
+    try:
+        # Other yap commands may edit or compile the project meanwhile.
+        with locking.project_lock(
+            os.path.dirname(pyproject_filename), options.lock_timeout
+        ):
+            if lock.extra is None:
+                commands.compile_dependencies(pyproject_filename, options=options)
+            else:
+                commands.compile_test_dependencies(
+                    pyproject_filename, lock.extra, lock.output, options=options
+                )
+    except exceptions.YappingException as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+def _exit(signum: int, frame: Any) -> None:
+    sys.exit(128 + signum)
+
+
+def _compile_in_child(
+    pyproject_filename: str, lock: Lock, options: CompileOptions
+) -> None:
+    # A group of its own, cancelling the compile stops pip-compile with it.
+    os.setpgrp()
+    # Exit normally when cancelled, the compile removes its temporary files.
+    signal.signal(signal.SIGTERM, _exit)
+    compile_lock(pyproject_filename, lock, options)
+
+
+class _Compile(NamedTuple):
+    process: Any
+    started: float
+
+
+def _start(
+    pyproject_filename: str, lock: Lock, options: CompileOptions
+) -> multiprocessing.Process:
+    process = multiprocessing.Process(
+        target=_compile_in_child,
+        args=(pyproject_filename, lock, options),
+        daemon=True,
+    )
+    process.start()
+
+    return process
+
+
+def _cancel(process: Any) -> None:
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        # It has exited, or has not made its process group yet.
+        process.terminate()
+
+
+def watch(
+    pyproject_filename: str,
+    locks: Sequence[Lock],
+    options: CompileOptions,
+    watcher: Watcher,
+    debounce: float,
+    stop: threading.Event | None = None,
+    log: Callable[[str], None] = print,
+) -> None:
+    """Recompile the lock files affected by each change to `pyproject_filename`.
+
+    A burst of changes is handled once `debounce` seconds pass without another
+    one. A lock file still compiling when a newer change affects it is
+    cancelled and compiled again.
+    """
+    stop = stop or threading.Event()
+    running: dict[Lock, _Compile] = {}
+    tables = dependency_tables(pyproject_filename)
+
+    def _compile(changed: Sequence[Lock]) -> None:
+        for lock in changed:
+            if lock in running:
+                _cancel(running.pop(lock).process)
+                log(f"yap: cancelled {lock.output}")
+
+            log(f"yap: compiling {lock.output}")
+            running[lock] = _Compile(
+                _start(pyproject_filename, lock, options), time.monotonic()
+            )
+
+    def _reap() -> None:
+        for lock, (process, started) in list(running.items()):
+            if process.is_alive():
+                continue
+
+            del running[lock]
+            elapsed = time.monotonic() - started
+
+            if process.exitcode == 0:
+                log(f"yap: compiled {lock.output} in {elapsed:.1f}s")
+            else:
+                log(f"yap: failed to compile {lock.output}")
+
+    # Fingerprints make this a no-op for lock files that are up to date.
+    _compile(locks)
+
+    try:
+        while not stop.is_set():
+            if not watcher.wait(0.2 if running else None):
+                _reap()
+                continue
+
+            while watcher.wait(debounce):
+                pass
+
+            new_tables = dependency_tables(pyproject_filename)
+
+            if new_tables is None:
+                log(f"yap: cannot read {pyproject_filename}, waiting for a fix")
+                continue
+
+            if tables is None:
+                changed = list(locks)
+            else:
+                changed = affected_locks(tables, new_tables, locks)
+
+            tables = new_tables
+            _reap()
+            _compile(changed)
+    finally:
+        for compile_ in running.values():
+            _cancel(compile_.process)
+
+        for compile_ in running.values():
+            compile_.process.join()
+
+        watcher.close()
@@ -0,0 +1,220 @@
+import glob
+import os
+import subprocess
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+from typing import NamedTuple
+from typing import Sequence
+
+from yapping import commands
+from yapping import config
+from yapping import exceptions
+from yapping import lockfile
+from yapping import locking
+from yapping.options import CompileOptions
+
+PYPROJECT_FILENAME = "pyproject.toml"
+
+WORKSPACE_KEY = "workspace"
+
+
+class Status:
+    COMPILED = "compiled"
+    DEDUPLICATED = "deduplicated"
+    FAILED = "failed"
+
+
+class ProjectResult(NamedTuple):
+    project: str
+    status: str
+    seconds: float
+    error: str | None = None
+
+
+class Project(NamedTuple):
+    path: str
+    name: str
+    key: tuple[str | None, str | None] | None
+
+
+def workspace_patterns(root_pyproject_filename: str) -> tuple[list[str], list[str]]:
+    workspace = config.read_config(root_pyproject_filename).get(WORKSPACE_KEY, {})
+
+    return workspace.get("members", []), workspace.get("exclude", [])
+
+
+def find_projects(patterns: Sequence[str], exclude: Sequence[str] = ()) -> list[str]:
+    excluded = {
+        os.path.normpath(path) for pattern in exclude for path in glob.glob(pattern)
+    }
+    projects = set()
+
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            if os.path.basename(path) == PYPROJECT_FILENAME:
+                path = os.path.dirname(path) or "."
+
+            path = os.path.normpath(path)
+
+            if path not in excluded and os.path.isfile(
+                os.path.join(path, PYPROJECT_FILENAME)
+            ):
+                projects.add(path)
+
+    return sorted(projects)
+
+
+def _load_project(path: str, test_extra: str) -> Project:
+    pyproject_filename = os.path.join(path, PYPROJECT_FILENAME)
+
+    try:
+        with open(pyproject_filename, "rb") as f:
+            name = tomllib.load(f)["project"]["name"]
+    except tomllib.TOMLDecodeError as e:
+        raise exceptions.YappingException(f"{pyproject_filename}: {e}") from e
+    except (KeyError, TypeError) as e:
+        raise exceptions.YappingException(
+            f"{pyproject_filename}: the project has no name"
+        ) from e
+
+    main_key = commands.inputs_fingerprint(pyproject_filename, None, ())
+    test_key = commands.inputs_fingerprint(pyproject_filename, test_extra, ())
+    key = None if main_key is None else (main_key, test_key)
+
+    return Project(path, name, key)
+
+
+def compile_project(
+    path: str,
+    test_extra: str,
+    test_requirements: str,
+    options: CompileOptions,
+) -> ProjectResult:
+    start = time.perf_counter()
+    cwd = os.getcwd()
+
+    try:
+        os.chdir(path)
+
+        with locking.project_lock(".", options.lock_timeout):
+            commands.compile_dependencies(PYPROJECT_FILENAME, options=options)
+            commands.compile_test_dependencies(
+                PYPROJECT_FILENAME, test_extra, test_requirements, options=options
+            )
+    except (exceptions.YappingException, subprocess.CalledProcessError, OSError) as e:
+        return ProjectResult(path, Status.FAILED, time.perf_counter() - start, str(e))
+    finally:
+        os.chdir(cwd)
+
+    return ProjectResult(path, Status.COMPILED, time.perf_counter() - start)
+
+
+def _copy_locks(
+    source: Project, target: Project, lock_filenames: tuple[str, ...]
+) -> None:
+    for filename in lock_filenames:
+        source_lock = os.path.join(source.path, filename)
+        target_lock = os.path.join(target.path, filename)
+
+        if not os.path.exists(source_lock):
+            continue
+
+        with open(source_lock) as f:
+            text = lockfile.rename_project(f.read(), source.name, target.name)
+
+        if os.path.exists(target_lock):
+            with open(target_lock) as f:
+                if f.read() == text:
+                    continue
+
+        locking.atomic_write(target_lock, text)
+
+
+def _compile_projects(
+    paths: list[str],
+    test_extra: str,
+    test_requirements: str,
+    options: CompileOptions,
+    jobs: int,
+) -> list[ProjectResult]:
+    if jobs == 1 or len(paths) == 1:
+        return [
+            compile_project(path, test_extra, test_requirements, options)
+            for path in paths
+        ]
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+        futures = [
+            executor.submit(
+                compile_project, path, test_extra, test_requirements, options
+            )
+            for path in paths
+        ]
+
+        return [future.result() for future in futures]
+
+
+def compile_workspace(
+    paths: list[str],
+    test_extra: str,
+    test_requirements: str,
+    options: CompileOptions,
+    jobs: int,
+) -> list[ProjectResult]:
+    """Compile every project, resolving each distinct requirement set only once.
+
+    Every project is compiled with `options`, the settings of the root project:
+    the [tool.yapping] settings of the members are not read.
+    """
+    projects = {}
+    results = {}
+
+    for path in paths:
+        try:
+            projects[path] = _load_project(path, test_extra)
+        except exceptions.YappingException as e:
+            results[path] = ProjectResult(path, Status.FAILED, 0, str(e))
+
+    leaders: dict[Any, Project] = {}
+    followers: dict[str, Project] = {}
+
+    for project in projects.values():
+        if project.key is not None and project.key in leaders:
+            followers[project.path] = leaders[project.key]
+        else:
+            leaders[project.key or project.path] = project
+
+    leader_results = _compile_projects(
+        [project.path for project in leaders.values()],
+        test_extra,
+        test_requirements,
+        options,
+        jobs,
+    )
+    results.update((result.project, result) for result in leader_results)
+    lock_filenames = (commands.DEFAULT_OUTPUT_FILENAME, test_requirements)
+    # The copied locks are fresh, the follower compiles only check the fingerprint.
+    follower_options = options._replace(force=False)
+
+    for path, leader in followers.items():
+        if results[leader.path].status == Status.FAILED:
+            results[path] = results[leader.path]._replace(project=path, seconds=0)
+            continue
+
+        try:
+            with locking.project_lock(path, options.lock_timeout):
+                _copy_locks(leader, projects[path], lock_filenames)
+        except exceptions.YappingException as e:
+            results[path] = ProjectResult(path, Status.FAILED, 0, str(e))
+            continue
+
+        result = compile_project(path, test_extra, test_requirements, follower_options)
+
+        if result.status == Status.COMPILED:
+            result = result._replace(status=Status.DEDUPLICATED)
+
+        results[path] = result
+
+    return [results[path] for path in paths]